@@ -7,25 +7,30 @@ Command group for dataset exploration in ravenml.
 
 import click
 import pydoc
+import json
 import yaml
 import shutil
 from pkg_resources import iter_entry_points
 from click_plugins import with_plugins
 from colorama import Fore
 from pathlib import Path
-from ravenml.utils.imageset import get_imageset_names, get_imageset_metadata
-from ravenml.utils.dataset import get_dataset_names, get_dataset_metadata
+from ravenml.utils.imageset import get_imageset_names, get_imageset_metadata, get_imagesets_metadata, \
+    summarize_imageset
+from ravenml.utils.dataset import get_dataset_names, get_dataset_metadata, get_datasets_metadata, get_dataset, \
+    verify_dataset, fetch_dataset_files
+from ravenml.utils.hashing import write_checksum_manifest, CHECKSUM_MANIFEST_NAME
 from ravenml.utils.plugins import LazyPluginGroup
 from ravenml.utils.question import cli_spinner, user_confirms
 from ravenml.data.interfaces import CreateInput
 from ravenml.data.options import pass_create
-from ravenml.data.interfaces import CreateInput, CreateOutput
+from ravenml.data.interfaces import CreateInput, CreateOutput, Dataset
+from ravenml.data.helpers import format_performance_table
 from ravenml.utils.config import get_config, load_yaml_config
 from ravenml.utils.aws import upload_directory
 
 # metedata fields to exclude when printing metadata to the user 
 # these are specific to datasets at the moment
-EXCLUDED_METADATA = ['filters', 'transforms', 'image_ids']
+EXCLUDED_METADATA = ['filters', 'transforms', 'image_ids', 'image_ids_file', 'performance']
 
 ### OPTIONS ###
 explore_details_opt = click.option(
@@ -48,6 +53,12 @@ config_opt = click.option(
     '-c', '--config', type=str, help='Path to config file. Defaults to ~/ravenML_configs/config.yaml'
 )
 
+resume_opt = click.option(
+    '-r', '--resume', is_flag=True,
+    help='Resume an interrupted dataset creation, skipping stages that already completed. '
+         'Stages are only checkpointed with "checkpoint" set in the config.'
+)
+
 
 ### COMMANDS ###
 @click.group(help='Data exploration and dataset creation commands.')
@@ -64,30 +75,35 @@ def data(ctx):
 @data.group(cls=LazyPluginGroup, entry_point_name='ravenml.plugins.data', help='Create a new dataset.')
 @click.pass_context
 @config_opt
-def create(ctx: click.Context, config: str):
+@resume_opt
+def create(ctx: click.Context, config: str, resume: bool):
     """Creates CreateInput from config and sends to plugin
     
     Args:
         ctx (Context): click context object
         config (str): user config
+        resume (bool): T/F resume an interrupted creation of the same dataset
     """
     if config:
         # load config
         # NOTE: this function will raise a click error if there is an issue loading config
         data_config = load_yaml_config(Path(config))
+        if resume:
+            data_config['resume'] = True
         # trigger CreateInput creation, note this may prompt the user depending on the config file used
         ctx.obj = CreateInput(data_config, ctx.invoked_subcommand)
 
 # dataset given by a plugin when create is called, see train.commands.process_result for example
 @create.resultcallback()
 @click.pass_context
-def process_result(ctx: click.Context, result: CreateOutput, config: str):
+def process_result(ctx: click.Context, result: CreateOutput, config: str, resume: bool):
     """Processes output of dataset creation
     
     Args:
         ctx (Context): click context object
         result (CreateOutput): result of dataset creation plugin
         config (str): original config provided by user
+        resume (bool): resume option from create command
     Returns:
         result (CreateOutput): result of dataset creation plugin
     """
@@ -97,8 +113,33 @@ def process_result(ctx: click.Context, result: CreateOutput, config: str):
         dataset_name = ci.metadata['dataset_name']
         dataset_path = ci.dataset_path / dataset_name
 
+        # dataset is complete, so there is nothing left to resume
+        shutil.rmtree(ci.checkpoint_path, ignore_errors=True)
+
+        # print stage performance recorded by the dataset writer, if any
+        metadata_path = dataset_path / 'metadata.json'
+        metadata = {}
+        if metadata_path.exists():
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+            if metadata.get('performance'):
+                click.echo(format_performance_table(metadata['performance']))
+
+        # packing indexes the files, otherwise the index is built on first lookup
+        if ci.pack:
+            dataset = Dataset(dataset_name, metadata, dataset_path)
+            # files already pushed by a pipelined upload are kept, so they stay in step with S3
+            remove_files = ci.pack_remove_files and ci.uploader is None
+            cli_spinner("Packing dataset...", dataset.pack, remove_files=remove_files)
+
+        # checksums let cached copies of the dataset be verified, see `ravenml data verify`
+        cli_spinner("Writing checksum manifest...", write_checksum_manifest, dataset_path)
+
         # Uploads dataset to S3
-        if (ci.upload):
+        if ci.uploader is not None:
+            # most files were uploaded while the dataset was written, metadata.json goes last
+            cli_spinner("Finishing dataset upload to S3...", ci.uploader.finish)
+        elif (ci.upload):
             bucketConfig = get_config()
             bucket = bucketConfig["dataset_bucket_name"]
             cli_spinner("Uploading dataset to S3...", upload_directory, bucket_name=bucket, prefix=dataset_name, local_path=dataset_path)
@@ -149,7 +190,8 @@ def inspect_imageset(imageset_name: str):
         # can check if the metadata returned is for an individual image if it has pose info
         if 'pose' in metadata.keys():
             click.echo(Fore.RED + ('Set-wide metadata not found. '
-                                    'Falling back to sample image metadata.'))
+                                    'Falling back to sample image metadata. '
+                                    'Run summarize-imageset to build it.'))
         click.echo(_stringify_metadata(metadata, colored=True))
     # get_imageset_metadata will raise a value error if imageset name not found
     except ValueError as e:
@@ -158,6 +200,28 @@ def inspect_imageset(imageset_name: str):
     except KeyError as e:
         raise click.exceptions.ClickException(f'Given imageset "{imageset_name}" does not contain any metadata files.')
 
+@data.command('summarize-imageset', help='Build set-wide metadata for an image set from its image metadata files.')
+@click.argument('imageset_name')
+@click.option('-m', '--metadata-prefix', 'metadata_prefix', default='meta_', show_default=True,
+    help='Prefix of image metadata files.')
+@click.option('-u', '--upload', 'upload', is_flag=True, help='Upload the set-wide metadata to S3.')
+def summarize_imageset_command(imageset_name: str, metadata_prefix: str, upload: bool):
+    """Build set-wide metadata (image, file type and tag counts) for an imageset.
+
+    Args:
+        imageset_name (str): string name of the imageset to summarize
+        metadata_prefix (str): prefix of image metadata files
+        upload (bool): T/F upload the set-wide metadata to S3
+    """
+    try:
+        metadata = cli_spinner("Summarizing imageset metadata from S3...", summarize_imageset,
+                                imageset_name, metadata_prefix=metadata_prefix, upload=upload)
+    # summarize_imageset will raise a value error if the imageset has no image metadata files
+    except ValueError as e:
+        raise click.exceptions.BadParameter(imageset_name, param=imageset_name,
+            param_hint='imageset name, imageset must contain image metadata files. Imageset name')
+    click.echo(_stringify_metadata(metadata, colored=True))
+
 
 ## Dataset commands ##
 @data.command(help='List available datasets.')
@@ -202,6 +266,57 @@ def inspect_dataset(dataset_name: str):
     # get_dataset_metadata function
     except ValueError as e:
         raise click.exceptions.BadParameter(dataset_name, param=dataset_name, param_hint='dataset name')
+
+@data.command(help='Verify a locally cached dataset, re-fetching corrupt or missing files.')
+@click.argument('dataset_name')
+@click.option('-n', '--no-fetch', 'no_fetch', is_flag=True, help='Only report corrupt or missing files.')
+def verify(dataset_name: str, no_fetch: bool):
+    """Verify a locally cached dataset against its checksum manifest.
+
+    Args:
+        dataset_name (str): string name of the dataset to verify
+        no_fetch (bool): T/F only report bad files instead of re-fetching them
+    """
+    try:
+        bad_files = cli_spinner("Verifying dataset checksums...", verify_dataset, dataset_name)
+    # verify_dataset will raise a value error if the dataset is not cached or has no checksum manifest
+    except ValueError as e:
+        raise click.exceptions.BadParameter(dataset_name, param=dataset_name,
+            param_hint='dataset name, dataset must be cached locally and have a checksum manifest. Dataset name')
+    if len(bad_files) == 0:
+        click.echo(Fore.GREEN + f'Dataset {dataset_name} verified.')
+        return
+    click.echo(Fore.RED + f'{len(bad_files)} corrupt or missing files:')
+    for bad_file in bad_files:
+        click.echo(bad_file)
+    if not no_fetch:
+        cli_spinner("Re-fetching files from S3...", fetch_dataset_files, dataset_name, bad_files)
+        click.echo(Fore.GREEN + f'Re-fetched {len(bad_files)} files.')
+
+@data.command(help='Pack a dataset\'s files into large blobs for fast local random access.')
+@click.argument('dataset_name')
+@click.option('-b', '--blob-size', 'blob_size', type=int, default=1024, show_default=True,
+    help='Maximum size of each blob in MB.')
+@click.option('--remove-files', 'remove_files', is_flag=True, help='Remove files once they are packed.')
+def pack(dataset_name: str, blob_size: int, remove_files: bool):
+    """Pack a locally cached dataset, downloading it first if necessary.
+
+    Args:
+        dataset_name (str): string name of the dataset to pack
+        blob_size (int): maximum size of each blob in MB
+        remove_files (bool): T/F remove files once they are packed
+    """
+    try:
+        dataset = cli_spinner("Downloading dataset from S3...", get_dataset, dataset_name)
+    # get_dataset will raise a value error if the given dataset name does not exist on S3
+    except ValueError as e:
+        raise click.exceptions.BadParameter(dataset_name, param=dataset_name, param_hint='dataset name')
+    index = cli_spinner("Packing dataset...", dataset.pack, max_blob_bytes=blob_size * 1024 ** 2,
+                        remove_files=remove_files)
+    # keep the local checksums in line with the packed layout
+    if (dataset.path / CHECKSUM_MANIFEST_NAME).exists():
+        write_checksum_manifest(dataset.path)
+    click.echo(f'Packed {len(index["files"])} files into {len(index["blobs"])} blobs.')
         
 
 ### HELPERS ###
@@ -235,9 +350,13 @@ def _get_detailed_dataset_info(datasets: list, filter_str:str=None) -> str:
         str: concatenated and delimited metadata string for each dataset.
     """
     result = ''
+    # one revalidation sweep of the metadata catalog instead of a download per dataset
+    all_metadata = get_datasets_metadata(datasets)
     for dataset in datasets:
         try:
-            metadata = get_dataset_metadata(dataset)
+            metadata = all_metadata[dataset]
+            if metadata is None:
+                raise ValueError(dataset)
             str_metadata = _stringify_metadata(metadata)
             if filter_str:
                 if filter_str in str_metadata:
@@ -263,9 +382,13 @@ def _get_detailed_imageset_info(imagesets: list, filter_str:str=None) -> str:
         str: concatenated and delimited metadata string for each imageset.
     """
     result = ''
+    # one revalidation sweep of the metadata catalog instead of a download per imageset
+    all_metadata = get_imagesets_metadata(imagesets)
     for imageset in imagesets:
         try:
-            metadata = get_imageset_metadata(imageset)
+            metadata = all_metadata[imageset]
+            if metadata is None:
+                raise KeyError(imageset)
             str_metadata = _stringify_metadata(metadata)
             if filter_str:
                 # case sensitive and case insensitive checks
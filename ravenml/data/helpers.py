@@ -1,9 +1,10 @@
 import os
 import shutil
+import numpy as np
 import pandas as pd
 import json
 import sys
-from random import shuffle
+import mmap
 from queue import Queue
 from threading import Thread
 from pathlib import Path
@@ -220,23 +221,29 @@ def copy_associated_files(images: list, destination_dir: Path, associated_files:
             be present, including metadata files
         num_threads (int, optional): Defaults to 20. Number of threads
             performing concurrent copies.
+
+    Returns:
+        int: number of bytes copied
     """
+    # bytes copied by each thread, summed once all threads are done
+    bytes_copied = [0] * num_threads
 
     # function used to copy
-    def copy_object(queue):
+    def copy_object(queue, thread_index):
         while True:
             filepath = queue.get()
             if filepath is None:
                 break
             shutil.copy(filepath, destination_dir.absolute())
+            bytes_copied[thread_index] += os.path.getsize(filepath)
             queue.task_done()
 
     # create a queue for objects that need to be copied
     # and spawn threads to copy them concurrently
     copy_queue = Queue(maxsize=0)
     workers = []
-    for worker in range(num_threads):
-        worker = Thread(target=copy_object, args=(copy_queue, ))
+    for thread_index in range(num_threads):
+        worker = Thread(target=copy_object, args=(copy_queue, thread_index))
         worker.setDaemon(True)
         worker.start()
         workers.append(worker)
@@ -258,31 +265,143 @@ def copy_associated_files(images: list, destination_dir: Path, associated_files:
         copy_queue.put(None)
     for worker in workers:
         worker.join()
+    return sum(bytes_copied)
+
+def format_performance_table(performance: list) -> str:
+    """Formats per-stage performance metrics of dataset creation as a table.
+    
+    Args:
+        performance (list): dicts of metrics for each stage, in order, as
+            recorded by DatasetWriter
+    
+    Returns:
+        str: table with one row per stage
+    """
+    columns = [('stage', 'STAGE', '{}'), ('wall_time_s', 'WALL (s)', '{:.2f}'),
+               ('cpu_time_s', 'CPU (s)', '{:.2f}'), ('peak_rss_delta_mb', 'PEAK RSS +MB', '{:.1f}'),
+               ('image_ids', 'IMAGE IDS', '{}'), ('objects', 'OBJECTS', '{}'),
+               ('objects_cached', 'CACHED', '{}'), ('bytes_copied', 'BYTES COPIED', '{}')]
+    rows = [[header for _, header, _ in columns]]
+    for stage in performance:
+        rows.append(['-' if stage.get(key) is None else fmt.format(stage[key]) for key, _, fmt in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows)
 
-def split_data(obj_list, test_percent=.2):
+def split_data(obj_list, test_percent=.2, seed=None, groups=None):
     """Splits obj_list into test/dev sets
     
     Args:
         obj_list (list): list of objects to divide into test/dev
         test_percent (int): percentage of objects in the test set
+        seed (int or Generator, optional): seed or numpy random generator used
+            to shuffle, the split is reproducible for a given seed
+        groups (list, optional): group label for each object, if given the split
+            is stratified so each group contributes test_percent of its objects
     
     Returns:
         tuple of two lists. The first list is test, second dev
     """
-    if len(obj_list) == 0:
+    test_indices, dev_indices = split_indices(len(obj_list), test_percent=test_percent, seed=seed, groups=groups)
+    test = [obj_list[i] for i in test_indices]
+    dev = [obj_list[i] for i in dev_indices]
+
+    return (test, dev)
+
+def split_indices(num_objects, test_percent=.2, seed=None, groups=None):
+    """Splits the indices 0..num_objects-1 into test/dev index arrays. Only
+        integer arrays are shuffled, so objects never have to be touched.
+    
+    Args:
+        num_objects (int): number of objects being split
+        test_percent (float): percentage of objects in the test set
+        seed (int or Generator, optional): seed or numpy random generator used to shuffle
+        groups (list, optional): group label for each object to stratify on
+    
+    Returns:
+        tuple of two numpy arrays. The first array is test indices, second dev
+    """
+    if num_objects == 0:
         raise Exception("Empty object list passed.")
-    if len(obj_list) == 1:
+    if num_objects == 1:
         raise Exception(
             "Object list of length 1 passed. Can't build test and dev set with this."
         )
 
-    shuffle(obj_list)
-    index_to_split_on = max(1, int(len(obj_list) * test_percent))
+    rng = np.random.default_rng(seed)
+    indices, group_ranks, _ = _shuffled_group_ranks(num_objects, rng, groups)
+    codes = np.zeros(num_objects, dtype=int) if groups is None else _group_codes(groups)[indices]
+    # each object is in the test set if it is among the first of its (shuffled) group,
+    # with the overall test size shared out between groups so small groups still contribute
+    test_counts = _allocate_counts(np.bincount(codes), test_percent, rng)
+    in_test = group_ranks < test_counts[codes]
+    if not in_test.any():
+        in_test[0] = True
+    if in_test.all():
+        in_test[-1] = False
+    return rng.permutation(indices[in_test]), rng.permutation(indices[~in_test])
+
+def assign_splits(num_objects, test_percent=.2, seed=None, groups=None):
+    """Precomputes the split each object will be routed to, without needing
+        the objects themselves. Mirrors the two level split performed by
+        'split_data' in the default dataset writer: a test set is split off
+        first and the remaining dev set is split again into train and validation.
+    
+    Args:
+        num_objects (int): number of objects being split
+        test_percent (float): percentage of objects in the test set, also used
+            as the percentage of the dev set used for validation
+        seed (int or Generator, optional): seed or numpy random generator used to shuffle
+        groups (list, optional): group label for each object to stratify on
+    
+    Returns:
+        numpy array: split name ('test', 'train' or 'validation') for each object index
+    """
+    rng = np.random.default_rng(seed)
+    test_indices, dev_indices = split_indices(num_objects, test_percent=test_percent, seed=rng, groups=groups)
+    dev_groups = None if groups is None else np.asarray(groups)[dev_indices]
+    validation, _ = split_indices(len(dev_indices), test_percent=test_percent, seed=rng, groups=dev_groups)
 
-    test = obj_list[:index_to_split_on]
-    dev = obj_list[index_to_split_on:]
+    assignments = np.full(num_objects, 'train', dtype='<U10')
+    assignments[test_indices] = 'test'
+    assignments[dev_indices[validation]] = 'validation'
+    return assignments
 
-    return (test, dev)
+def assign_folds(num_objects, num_folds, seed=None, groups=None):
+    """Assigns each object to one of num_folds folds for k-fold cross validation.
+        Folds differ in size by at most one object, overall and within each group when
+        stratified. Each group continues from the fold the previous group ended on, so
+        the objects left over by uneven groups are spread across folds.
+    
+    Args:
+        num_objects (int): number of objects being assigned
+        num_folds (int): number of folds
+        seed (int or Generator, optional): seed or numpy random generator used to shuffle
+        groups (list, optional): group label for each object to stratify on
+    
+    Returns:
+        numpy array: fold index for each object index
+    """
+    if num_folds < 2 or num_folds > num_objects:
+        raise Exception(f'Cannot create {num_folds} folds from {num_objects} objects.')
+    rng = np.random.default_rng(seed)
+    indices, _, _ = _shuffled_group_ranks(num_objects, rng, groups)
+    folds = np.empty(num_objects, dtype=int)
+    # indices are ordered group by group, so dealing them out in order rotates each group's first fold
+    folds[indices] = np.arange(num_objects) % num_folds
+    return folds
+
+def write_split_manifest(path: Path, manifest: dict):
+    """Writes a split manifest, a small JSON file listing the image_ids in
+        each split instead of a copy of their data.
+    
+    Args:
+        path (Path): filepath of manifest
+        manifest (dict): split names as keys and lists of image_id tuples as values,
+            plus any additional fields describing the split
+    """
+    os.makedirs(path.parent, exist_ok=True)
+    with open(path, 'w') as outfile:
+        json.dump(manifest, outfile)
 
 def read_json_metadata(dir_entry, image_id):
     """Reads a json metadata file and creates a dataframe
@@ -303,3 +422,82 @@ def read_json_metadata(dir_entry, image_id):
         tag_list = ['untagged']
     
     return pd.DataFrame(dict(zip(tag_list, [True] * len(tag_list))), index=[(Path(os.path.dirname(dir_entry)), image_id)])
+
+def read_file_bytes(path: Path, mmap_threshold: int = 1024 * 1024):
+    """Reads the contents of a file. Files of at least 'mmap_threshold' bytes are
+        memory-mapped rather than read, so their pages are only loaded as they are used.
+
+    Args:
+        path (Path): file to read
+        mmap_threshold (int, optional): Defaults to 1MB. Size from which files are
+            memory-mapped.
+
+    Returns:
+        bytes or mmap: contents of file, a read-only mmap for large files. Both support
+            the buffer protocol
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size >= max(mmap_threshold, 1):
+            # the mapping stays valid after the file is closed
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return f.read()
+
+def _group_codes(groups):
+    """Maps arbitrary group labels to integer codes.
+    
+    Args:
+        groups (list): group label for each object
+    
+    Returns:
+        numpy array: integer code for each object
+    """
+    return np.unique(np.asarray(groups), return_inverse=True)[1].reshape(-1)
+
+def _allocate_counts(group_sizes, fraction, rng):
+    """Shares int(total * fraction) objects out between groups by largest remainder.
+        Every group gets the whole part of its share, and the objects left over go to
+        the groups with the largest fractional parts (ties are broken randomly).
+    
+    Args:
+        group_sizes (numpy array): number of objects in each group
+        fraction (float): fraction of objects to allocate
+        rng (Generator): numpy random generator used to break ties
+    
+    Returns:
+        numpy array: number of objects allocated to each group
+    """
+    exact = group_sizes * fraction
+    counts = np.floor(exact).astype(int)
+    leftover = int(group_sizes.sum() * fraction) - counts.sum()
+    if leftover > 0:
+        order = np.lexsort((rng.random(len(group_sizes)), counts - exact))
+        counts[order[:leftover]] += 1
+    return counts
+
+def _shuffled_group_ranks(num_objects, rng, groups=None):
+    """Shuffles the indices 0..num_objects-1 and ranks every index within its group.
+    
+    Args:
+        num_objects (int): number of objects
+        rng (Generator): numpy random generator used to shuffle
+        groups (list, optional): group label for each object, all objects are
+            in a single group if not given
+    
+    Returns:
+        tuple of three numpy arrays: the shuffled indices, the rank of each shuffled
+            index within its group and the size of that group
+    """
+    indices = rng.permutation(num_objects)
+    if groups is None:
+        return indices, np.arange(num_objects), np.full(num_objects, num_objects)
+    if len(groups) != num_objects:
+        raise Exception("Number of groups does not match number of objects.")
+    codes = _group_codes(groups)[indices]
+    # stable sort keeps the shuffled order inside each group
+    order = np.argsort(codes, kind='stable')
+    indices = indices[order]
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    counts = np.diff(np.r_[starts, num_objects])
+    ranks = np.arange(num_objects) - np.repeat(starts, counts)
+    return indices, ranks, np.repeat(counts, counts)
@@ -0,0 +1,206 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Compact storage of the image_ids selected while creating a dataset.
+"""
+
+import sys
+import gzip
+import json
+import numpy as np
+from pathlib import Path
+
+# name of the compressed image_id manifest stored alongside dataset metadata
+MANIFEST_NAME = 'image_ids.txt.gz'
+
+
+class ImageIdTable(object):
+    """Represents a set of image_ids across imagesets. Instead of one (Path, str)
+    tuple per image, the table keeps one Path per imageset, a small integer array
+    of imageset indices and an array of interned id strings, sorted by imageset so
+    the ids of any imageset are a contiguous slice.
+
+    The table behaves like the list of (Path, str) tuples it replaces: it can be
+    iterated, indexed and measured with len, yielding (imageset path, image_id) tuples.
+
+    Args:
+        imageset_paths (list): paths to every imageset the table may refer to
+        imageset_indices (array): index into imageset_paths for each image
+        ids (array): image_id string for each image
+
+    Attributes:
+        imageset_paths (list): paths to every imageset the table may refer to
+        imageset_indices (numpy array): index into imageset_paths for each image
+        ids (numpy array): interned image_id string for each image
+        offsets (numpy array): start of each imageset's slice, plus the table length
+    """
+
+    def __init__(self, imageset_paths: list, imageset_indices, ids):
+        self.imageset_paths = [Path(path) for path in imageset_paths]
+        index_dtype = np.int16 if len(self.imageset_paths) < 2**15 else np.int32
+        imageset_indices = np.asarray(imageset_indices, dtype=index_dtype)
+        ids = np.array([sys.intern(str(image_id)) for image_id in ids], dtype=object)
+        order = np.argsort(imageset_indices, kind='stable')
+        self.imageset_indices = imageset_indices[order]
+        self.ids = ids[order]
+        self.offsets = np.searchsorted(self.imageset_indices, np.arange(len(self.imageset_paths) + 1))
+
+    @classmethod
+    def from_pairs(cls, pairs, imageset_paths: list=None):
+        """Creates a table from (imageset path, image_id) pairs. Tables are returned as is.
+
+        Args:
+            pairs (iterable): (imageset path, image_id) pairs, or an ImageIdTable
+            imageset_paths (list, optional): paths to every imageset, so imagesets
+                without any image are known to the table too
+
+        Returns:
+            ImageIdTable: table of pairs
+        """
+        if isinstance(pairs, cls):
+            return pairs
+        paths = [Path(path) for path in imageset_paths] if imageset_paths else []
+        path_indices = {path: i for i, path in enumerate(paths)}
+        imageset_indices = []
+        ids = []
+        for path, image_id in pairs:
+            path = Path(path)
+            if path not in path_indices:
+                path_indices[path] = len(paths)
+                paths.append(path)
+            imageset_indices.append(path_indices[path])
+            ids.append(image_id)
+        return cls(paths, imageset_indices, ids)
+
+    @property
+    def imageset_names(self) -> list:
+        """list: names of every imageset the table may refer to"""
+        return [path.name for path in self.imageset_paths]
+
+    def count(self, imageset: str) -> int:
+        """Counts the images of an imageset.
+
+        Args:
+            imageset (str): name of imageset
+
+        Returns:
+            int: number of images in imageset
+        """
+        i = self.imageset_names.index(imageset)
+        return int(self.offsets[i + 1] - self.offsets[i])
+
+    def imageset_slice(self, imageset: str) -> slice:
+        """Gets the slice of the table holding the images of an imageset.
+
+        Args:
+            imageset (str): name of imageset
+
+        Returns:
+            slice: positions of imageset's images in table
+        """
+        i = self.imageset_names.index(imageset)
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def take(self, indices):
+        """Creates a table of a subset of the images.
+
+        Args:
+            indices (array): positions of images to keep
+
+        Returns:
+            ImageIdTable: table of the selected images
+        """
+        indices = np.asarray(indices, dtype=int)
+        return ImageIdTable(self.imageset_paths, self.imageset_indices[indices], self.ids[indices])
+
+    def sample(self, sizes: dict, rng=None):
+        """Samples images from each imageset without replacement.
+
+        Args:
+            sizes (dict): number of images to sample for each imageset name,
+                imagesets not in sizes are left out entirely
+            rng (Generator or int, optional): numpy random generator or seed
+
+        Returns:
+            ImageIdTable: table of the sampled images
+        """
+        rng = np.random.default_rng(rng)
+        selected = []
+        for imageset, size in sizes.items():
+            positions = self.imageset_slice(imageset)
+            selected.append(positions.start + rng.choice(positions.stop - positions.start, size, replace=False))
+        return self.take(np.sort(np.concatenate(selected)) if selected else [])
+
+    def to_pairs(self) -> list:
+        """Gets the images as (imageset name, image_id) pairs, as stored in metadata.
+
+        Returns:
+            list: (imageset name, image_id) pairs
+        """
+        names = self.imageset_names
+        return [(names[i], image_id) for i, image_id in zip(self.imageset_indices.tolist(), self.ids)]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        paths = self.imageset_paths
+        for i, image_id in zip(self.imageset_indices.tolist(), self.ids):
+            yield paths[i], image_id
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(np.arange(len(self))[index])
+        return self.imageset_paths[self.imageset_indices[index]], self.ids[index]
+
+def write_image_id_manifest(path: Path, image_ids):
+    """Writes image_ids as a compact compressed manifest. The first line holds the
+    imageset names as JSON, followed by one line per image sorted by imageset and
+    image_id. Each line is front coded: the imageset index, the length of the prefix
+    shared with the previous image_id of the same imageset and the rest of the id,
+    tab separated. The whole file is gzip compressed.
+
+    Args:
+        path (Path): filepath of manifest
+        image_ids (iterable): (imageset path or name, image_id) pairs, or an ImageIdTable
+    """
+    pairs = sorted((Path(imageset).name, str(image_id)) for imageset, image_id in image_ids)
+    imagesets = sorted(set(imageset for imageset, _ in pairs))
+    imageset_indices = {imageset: i for i, imageset in enumerate(imagesets)}
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps(imagesets) + '\n')
+        previous_imageset, previous_id = None, ''
+        for imageset, image_id in pairs:
+            if imageset != previous_imageset:
+                previous_imageset, previous_id = imageset, ''
+            shared = 0
+            for a, b in zip(previous_id, image_id):
+                if a != b:
+                    break
+                shared += 1
+            f.write(f'{imageset_indices[imageset]}\t{shared}\t{image_id[shared:]}\n')
+            previous_id = image_id
+
+def read_image_id_manifest(path: Path) -> list:
+    """Reads a manifest written by 'write_image_id_manifest'.
+
+    Args:
+        path (Path): filepath of manifest
+
+    Returns:
+        list: (imageset name, image_id) pairs, sorted
+    """
+    pairs = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        imagesets = json.loads(f.readline())
+        previous_index, previous_id = None, ''
+        for line in f:
+            index, shared, rest = line.rstrip('\n').split('\t', 2)
+            index = int(index)
+            if index != previous_index:
+                previous_index, previous_id = index, ''
+            image_id = previous_id[:int(shared)] + rest
+            pairs.append((imagesets[index], image_id))
+            previous_id = image_id
+    return pairs
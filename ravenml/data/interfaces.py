@@ -5,24 +5,46 @@ Date Created:   03/19/2019
 Classes necessary for interfacing with the data command group.
 """
 
+import re
 import glob
 import click
+import random
 import os
 import shutil
 import json
+import queue
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future
 from datetime import datetime
 from ravenml.utils.local_cache import RMLCache
 from ravenml.utils.question import cli_spinner, cli_spinner_wrapper, user_input, user_selects, user_confirms
-from ravenml.utils.imageset import get_imageset_names
+from ravenml.utils.imageset import get_imageset_names, ImagesetStager
 from ravenml.utils.config import get_config
-from ravenml.utils.aws import download_prefix
+from ravenml.utils.aws import download_prefix, BackgroundUploader
+from ravenml.data.image_ids import MANIFEST_NAME, read_image_id_manifest
+from ravenml.data.helpers import read_file_bytes
+from ravenml.utils.pack import PackReader, pack_directory, PACK_DIR, PACK_INDEX_NAME, DEFAULT_BLOB_BYTES
 from colorama import Fore
 
 ### CONSTANTS ###
 # these should be used in all possible situations to protect us
 # in case they change in the future
 FOLD_DIR_PREFIX = 'fold_'
+SPLITS_DIR = 'splits'
+FOLDS_DIR = 'folds'
+SPLIT_MANIFEST_NAME = 'manifest.json'
+DATA_DIR = 'data'
+FILE_INDEX_NAME = 'file_index.json'
+SPLIT_NAMES = ['test', 'train', 'validation']
+# directory the train and validation objects of a dataset without virtual splits are written to
+DEV_DIR = Path(SPLITS_DIR) / 'complete' / 'train'
+# shard directories, '<split_type>-<i>-of-<n>', see DefaultDatasetWriter.write_out_sharded_splits
+SHARD_DIR_PATTERN = re.compile(r'(\w+)-\d+-of-\d+')
+# characters that may separate an image_id from the rest of a file name
+FILE_NAME_SEPARATORS = re.compile(r'([._-])')
+STRATIFY_OPTIONS = ['imageset', 'tag']
+DEDUP_OPTIONS = ['drop', 'report']
 
 class CreateInput(object):
     """Represents a dataset creation input. Contains all plugin-independent
@@ -36,12 +58,38 @@ class CreateInput(object):
         imageset_cache (RMLCache): cache that stores imagesets locally
         dataset_path (Path): path to where dataset should be written to
         imageset_paths (list): list of paths to imagesets being used
+        stager (ImagesetStager): fetches the files of selected images when imagesets are
+            downloaded with only their metadata files ('metadata_only' in the config, with
+            the files matched by 'metadata_pattern', 'meta_*' by default), otherwise None
         metadata (dict): holds dataset metadata, currently: created_by, comments,
             dataset_name, date_started_at, imagesets_used, plugin_metadata
         plugin_metadata (dict): holds plugin metadata, currently: plugin_name
         kfolds (int): number of folds user wants in dataset
         test_percent (float): percentage of data should be in test set
+        seed (int): seed used for all random splitting, randomly chosen if not
+            provided so it can still be recorded and reproduced
+        stratify (str): what splits are stratified by, 'imageset', 'tag' or None
+        virtual_splits (bool): whether to store raw files once alongside split
+            manifests instead of writing a data tree per split
+        dedup (str): what is done with byte-identical duplicate images, 'drop',
+            'report' or None to skip duplicate detection
+        construction_cache (bool): whether constructed objects are cached across
+            builds so only new or changed images are reconstructed
+        num_shards (int): number of shards each split is written in, only used
+            by plugins that support sharded writing
+        num_workers (int): number of processes used to write shards
+        pack (bool): whether the finished dataset's files are packed into blobs
+        pack_remove_files (bool): whether packed files are removed, leaving only the
+            blobs ('pack_remove_files' in the config). Never done with a pipelined upload,
+            which has already uploaded the files
+        resume (bool): whether to resume an interrupted build of the dataset,
+            skipping its completed stages instead of starting over
+        checkpoint (bool): whether each completed stage of the build is checkpointed
+            so it can be resumed ('checkpoint' in the config, always on when resuming)
+        checkpoint_path (Path): path stage checkpoints of the build are stored in
         upload (bool): whether the user wants to upload to s3 or not
+        uploader (BackgroundUploader): uploads dataset files while they are written
+            when uploading with 'pipelined_upload' set in the config, otherwise None
         delete_local (bool): whether the user wants to delete the local dataset
             or not
     """
@@ -52,6 +100,8 @@ class CreateInput(object):
                 'on `ravenml create` when using this plugin command.'))
         
         self.config = config
+        self.resume = bool(config.get('resume'))
+        self.checkpoint = bool(config.get('checkpoint')) or self.resume
         
         ## Set up Local Cache
         # currently the cache_name subdir is only created IF the plugin places files there
@@ -64,8 +114,8 @@ class CreateInput(object):
             self.dataset_path = Path(self.imageset_cache.path / 'datasets')
         else:
             dp = Path(os.path.expanduser(dp))
-            # check if local path contains data
-            if os.path.exists(dp) and os.path.isdir(dp) and len(os.listdir(dp)) > 0:
+            # check if local path contains data, which is kept when resuming
+            if not self.resume and os.path.exists(dp) and os.path.isdir(dp) and len(os.listdir(dp)) > 0:
                 if config.get('overwrite_local') or user_confirms('Local artifact storage location contains old data. Overwrite?'):
                     shutil.rmtree(dp)
                 else:
@@ -78,6 +128,7 @@ class CreateInput(object):
             self.dataset_path = dp
         
         ## Set up Imageset
+        self.stager = None
         # s3 download imagesets
         if not config.get('local'):
             imageset_list = config.get('imageset')
@@ -92,6 +143,9 @@ class CreateInput(object):
                         raise click.exceptions.BadParameter(imageset, param=imageset_list, param_hint=hint)
 
             ## Download imagesets
+            # images are filtered on their metadata, so only the files of selected images are fetched later
+            if config.get('metadata_only'):
+                self.stager = ImagesetStager(get_config().get('image_bucket_name'))
             self.imageset_cache.ensure_subpath_exists('imagesets')
             self.imageset_paths = []
             self.download_imagesets(imageset_list)
@@ -123,11 +177,27 @@ class CreateInput(object):
         # handle non-metadata user defined fields
         self.kfolds = config['kfolds'] if config.get('kfolds') else 0
         self.test_percent = config['test_percent'] if config.get('test_percent') else .2
+        self.seed = config['seed'] if config.get('seed') is not None else random.randrange(2**32)
+        self.stratify = config.get('stratify')
+        if self.stratify is not None and self.stratify not in STRATIFY_OPTIONS:
+            raise click.exceptions.BadParameter(config, param=config, param_hint=f'config, "stratify" must be one of {STRATIFY_OPTIONS}. Config was')
+        self.virtual_splits = bool(config.get('virtual_splits'))
+        self.dedup = config.get('dedup')
+        if self.dedup is not None and self.dedup not in DEDUP_OPTIONS:
+            raise click.exceptions.BadParameter(config, param=config, param_hint=f'config, "dedup" must be one of {DEDUP_OPTIONS}. Config was')
+        self.construction_cache = bool(config.get('construction_cache'))
+        self.num_shards = config['num_shards'] if config.get('num_shards') else 1
+        self.num_workers = config['num_workers'] if config.get('num_workers') else os.cpu_count()
+        self.pack = bool(config.get('pack'))
+        self.pack_remove_files = bool(config.get('pack_remove_files'))
 
         # Initialize Directory for Dataset    
         self.metadata['dataset_name'] = config['dataset_name'] if config.get('dataset_name') else user_input(message="What would you like to name this dataset?")
         dir_name = self.dataset_path / self.metadata['dataset_name']
-        if os.path.isdir(dir_name):
+        self.checkpoint_path = self.dataset_path / '.checkpoints' / self.metadata['dataset_name']
+        if self.resume:
+            os.makedirs(dir_name, exist_ok=True)
+        elif os.path.isdir(dir_name):
             if config.get('overwrite_local') or user_confirms('Local artifact storage location contains old data. Overwrite?'):
                 print("WARNING: Deleting existing dataset in cache")
                 shutil.rmtree(dir_name)
@@ -153,6 +223,10 @@ class CreateInput(object):
         # Set up what should be done after dataset creation
         self.upload = config["upload"] if 'upload' in config.keys() else user_confirms(message="Would you like to upload the dataset to S3?")
         self.delete_local = config["delete_local"] if 'delete_local' in config.keys() else user_confirms(message="Would you like to delete your " + self.metadata['dataset_name'] + " dataset?")
+        self.uploader = None
+        if self.upload and config.get('pipelined_upload'):
+            self.uploader = BackgroundUploader(get_config()['dataset_bucket_name'],
+                                                self.metadata['dataset_name'], dir_name)
 
     @cli_spinner_wrapper("Downloading imagesets from S3...")
     def download_imagesets(self, imageset_list):
@@ -164,11 +238,12 @@ class CreateInput(object):
         # Get image bucket name
         bucketConfig = get_config()
         image_bucket_name = bucketConfig.get('image_bucket_name')
+        include = self.config.get('metadata_pattern', 'meta_*') if self.stager else None
         # Downloads each imageset and appends local path to 'self.imageset_paths'
         for imageset in imageset_list:
             imageset_path = 'imagesets/'
             self.imageset_cache.ensure_subpath_exists(imageset_path)
-            download_prefix(image_bucket_name, imageset, self.imageset_cache, imageset_path)
+            download_prefix(image_bucket_name, imageset, self.imageset_cache, imageset_path, include=include)
             self.imageset_paths.append(self.imageset_cache.path / 'imagesets' / imageset)
 
 class CreateOutput(object): pass
@@ -184,17 +259,363 @@ class Dataset(object):
         name (str): name of dataset 
         metadata (dict): metadata of dataset
         path (Path): filepath to dataset
+        ready (Future, optional): download of the dataset still in progress, if any
 
     Attributes:
         name (str): name of the dataset 
         metadata (dict): metadata of dataset
-        path (Path): filepath to dataset
+        path (Path): filepath to dataset, accessing it waits until the dataset is ready
+        image_ids (list): (imageset, image_id) pairs in dataset, loaded lazily
+        file_index (list): [relative path, size, split, image_id] entries for every
+            file in dataset, loaded or built lazily
+        is_packed (bool): whether the dataset's files are packed into blobs
     """
-    def __init__(self, name: str, metadata: dict, path: Path):
+    def __init__(self, name: str, metadata: dict, path: Path, ready: Future=None):
         self.name = name
         self.metadata = metadata
-        self.path = path
+        self._path = path
+        self._ready = ready
+        self._split_manifest = None
+        self._image_ids = None
+        self._file_index = None
+        self._pack_reader = None
+        self._files_by_image_id = None
+        self._files_by_split = None
         
+    @property
+    def path(self) -> Path:
+        """Path: filepath to dataset. Waits until the dataset is ready, so files are only
+        read from it once they are downloaded.
+        """
+        self.wait_ready()
+        return self._path
+
+    @path.setter
+    def path(self, path: Path):
+        self._path = path
+
+    def wait_ready(self, timeout: float=None):
+        """Waits until the dataset is completely downloaded, if it is being downloaded
+        in the background. Returns immediately otherwise.
+
+        Args:
+            timeout (float, optional): seconds to wait at most, waits indefinitely if None
+
+        Raises:
+            click.exceptions.BadParameter: if the dataset could not be downloaded
+            TimeoutError: if the dataset is not ready within the timeout
+        """
+        if self._ready is not None:
+            try:
+                self._ready.result(timeout)
+            except ValueError as e:
+                hint = 'dataset name, no such dataset exists on S3'
+                raise click.exceptions.BadParameter(self.name, param=self.name, param_hint=hint) from e
+
+    @property
+    def image_ids(self) -> list:
+        """list: (imageset, image_id) pairs of every image in the dataset. Loaded from
+        the compressed image_id manifest the first time they are accessed, or taken
+        from metadata for datasets that predate the manifest.
+        """
+        if self._image_ids is None:
+            if 'image_ids' in self.metadata:
+                self._image_ids = self.metadata['image_ids']
+            else:
+                self._image_ids = read_image_id_manifest(self.path / self.metadata.get('image_ids_file', MANIFEST_NAME))
+        return self._image_ids
+
+    @property
+    def file_index(self) -> list:
+        """list: [relative path, size, split, image_id] entries for every file in the
+        dataset. Loaded from the file index stored in the dataset the first time it is
+        accessed, or built with 'build_file_index' if there is none.
+        """
+        return self._load_file_index()
+
+    def build_file_index(self) -> list:
+        """Scans the dataset once and stores the result in its file index, so later
+        lookups never touch the directory tree. A file's split is its split in the split
+        manifest for datasets written with virtual splits, otherwise the deepest directory
+        named after a split or a shard of one (e.g. 'train-00000-of-00004'). Objects written
+        to 'splits/complete/train' belong to 'train', or 'validation' for shards written
+        with split type 'test', and have no split when not sharded as both are written
+        together. A file's image_id is taken from its name, '<prefix><image_id><suffix>',
+        using the prefix-suffix pairs recorded by the writer (in the split manifest or
+        metadata), or for datasets without them, when a part of the name between
+        separators ('.', '_', '-') is one of the dataset's image_ids. Files in shard
+        directories belong to no image. Either is None if it cannot be determined.
+
+        Returns:
+            list: [relative path, size, split, image_id] entries for every file in dataset
+        """
+        try:
+            image_ids = {image_id for _, image_id in self.image_ids}
+        except (OSError, ValueError):
+            image_ids = set()
+        try:
+            manifest = self.get_split_manifest()
+            virtual_splits = {image_id: split for split, pairs in manifest['splits'].items()
+                                for _, image_id in pairs}
+            associated_files = manifest.get('associated_files')
+        except ValueError:
+            virtual_splits = {}
+            associated_files = self.metadata.get('associated_files')
+        image_ids.update(virtual_splits)
+
+        sizes = {}
+        for root, dirs, names in os.walk(self.path):
+            dirs.sort()
+            relative_root = Path(root).relative_to(self.path)
+            # blobs are indexed through the files packed in them
+            if relative_root == Path('.') and PACK_DIR in dirs:
+                dirs.remove(PACK_DIR)
+            for name in sorted(names):
+                if relative_root == Path('.') and name == FILE_INDEX_NAME:
+                    continue
+                sizes[(relative_root / name).as_posix()] = os.path.getsize(Path(root) / name)
+        if self.is_packed:
+            for relative_path in self._get_pack_reader().index['files']:
+                sizes.setdefault(relative_path, self._get_pack_reader().size(relative_path))
+
+        files = []
+        for relative_path in sorted(sizes):
+            relative_root = Path(relative_path).parent
+            # split and fold manifests, and shards of many objects belong to no image
+            image_id = None
+            if relative_root not in [Path(SPLITS_DIR), Path(SPLITS_DIR) / FOLDS_DIR] and \
+                    not any(SHARD_DIR_PATTERN.fullmatch(part) for part in relative_root.parts):
+                image_id = _match_image_id(Path(relative_path).name, image_ids, associated_files)
+            split = virtual_splits.get(image_id, _directory_split(relative_root))
+            files.append([relative_path, sizes[relative_path], split, image_id])
+        self._set_file_index(files)
+        # the index is only an optimization, read-only datasets are simply scanned each time
+        try:
+            temp_path = self.path / f'{FILE_INDEX_NAME}.{os.getpid()}.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump({'files': files}, f)
+            os.replace(temp_path, self.path / FILE_INDEX_NAME)
+        except OSError:
+            pass
+        return files
+
+    @property
+    def is_packed(self) -> bool:
+        """bool: whether the dataset's files have been packed into blobs, see 'ravenml.utils.pack'"""
+        return (self.path / PACK_DIR / PACK_INDEX_NAME).exists()
+
+    def pack(self, max_blob_bytes: int=DEFAULT_BLOB_BYTES, remove_files: bool=False) -> dict:
+        """Packs the dataset's files into a few large blobs with an offset index, see
+        'ravenml.utils.pack.pack_directory', and rebuilds the file index. Top level files
+        (metadata, manifests, indexes) and split and fold manifests are left unpacked so
+        they can still be read on their own.
+
+        Args:
+            max_blob_bytes (int, optional): Defaults to 1GB. Maximum size of a blob
+            remove_files (bool, optional): Defaults to False. Whether to remove files
+                once they are packed
+
+        Returns:
+            dict: pack index
+        """
+        exclude = [entry.name for entry in os.scandir(self.path) if entry.is_file()]
+        exclude.append(f'{SPLITS_DIR}/{SPLIT_MANIFEST_NAME}')
+        folds_path = self.path / SPLITS_DIR / FOLDS_DIR
+        if folds_path.exists():
+            exclude += [f'{SPLITS_DIR}/{FOLDS_DIR}/{entry.name}' for entry in os.scandir(folds_path)]
+        index = pack_directory(self.path, max_blob_bytes=max_blob_bytes, remove_files=remove_files, exclude=exclude)
+        self._pack_reader = None
+        self.build_file_index()
+        return index
+
+    def read_file(self, relative_path: str) -> memoryview:
+        """Reads a file of the dataset without copying it. Packed files are sliced out of
+        their memory-mapped blob, other files are memory-mapped directly.
+
+        Args:
+            relative_path (str): path of file relative to the dataset root
+
+        Returns:
+            memoryview: read-only view of the file's contents
+
+        Raises:
+            FileNotFoundError: if the dataset has no such file
+        """
+        if self.is_packed and relative_path in self._get_pack_reader():
+            return self._get_pack_reader().read(relative_path)
+        return memoryview(read_file_bytes(self.path / relative_path, mmap_threshold=0))
+
+    def read_image_files(self, image_id: str) -> dict:
+        """Reads all files of an image without copying them, found through the file index.
+
+        Args:
+            image_id (str): id of image
+
+        Returns:
+            dict: paths of files relative to the dataset root mapped to read-only views
+                of their contents
+        """
+        self._load_file_index()
+        return {relative_path: self.read_file(relative_path)
+                    for relative_path in self._files_by_image_id.get(image_id, [])}
+
+    def lookup_files(self, image_id: str) -> list:
+        """Gets the files of an image from the file index.
+
+        Args:
+            image_id (str): id of image
+
+        Returns:
+            list: paths to files of the image. In a packed dataset they may only exist
+                in the pack, read them with 'read_file'
+        """
+        self._load_file_index()
+        return [self.path / relative_path for relative_path in self._files_by_image_id.get(image_id, [])]
+
+    def list_files(self, split: str=None) -> list:
+        """Lists files from the file index.
+
+        Args:
+            split (str, optional): name of split to list files of, all files if None
+
+        Returns:
+            list: paths to files. In a packed dataset they may only exist in the pack,
+                read them with 'read_file'
+        """
+        if split is None:
+            return [self.path / entry[0] for entry in self.file_index]
+        self._load_file_index()
+        return [self.path / relative_path for relative_path in self._files_by_split.get(split, [])]
+
+    def count_files(self, split: str=None) -> int:
+        """Counts files in the file index.
+
+        Args:
+            split (str, optional): name of split to count files of, all files if None
+
+        Returns:
+            int: number of files
+        """
+        if split is None:
+            return len(self.file_index)
+        self._load_file_index()
+        return len(self._files_by_split.get(split, []))
+
+    def iter_examples(self, split: str, batch_size: int=32, shuffle_seed: int=None, num_threads: int=8,
+                        prefetch: int=4, mmap_threshold: int=1024 * 1024):
+        """Iterates over batches of the raw files of each image in a split, found through the
+        file index. Files are read ahead of the consumer by a background thread pool, with at
+        most 'prefetch' batches waiting, so reading overlaps with whatever is done with each
+        batch. Large files are memory-mapped instead of read.
+
+        Args:
+            split (str): name of split, 'test', 'train' or 'validation'
+            batch_size (int, optional): Defaults to 32. Number of images per batch, the
+                last batch may be smaller
+            shuffle_seed (int, optional): seed to shuffle images with, images are in
+                image_id order if None
+            num_threads (int, optional): Defaults to 8. Number of threads reading files
+            prefetch (int, optional): Defaults to 4. Number of batches read ahead
+            mmap_threshold (int, optional): Defaults to 1MB. Size from which files are
+                memory-mapped, see 'read_file_bytes'
+
+        Yields:
+            list: (image_id, files) pairs, where files maps each file's path relative to the
+                dataset root to its contents (bytes, or a read-only mmap for large files, or a
+                memoryview of its blob for packed datasets)
+        """
+        examples = {}
+        for relative_path, _, file_split, image_id in self._load_file_index():
+            if file_split == split and image_id is not None:
+                examples.setdefault(image_id, []).append(relative_path)
+        image_ids = sorted(examples)
+        if shuffle_seed is not None:
+            random.Random(shuffle_seed).shuffle(image_ids)
+        batches = [image_ids[i:i + batch_size] for i in range(0, len(image_ids), batch_size)]
+
+        pack_reader = self._get_pack_reader() if self.is_packed else None
+        def read_file(relative_path):
+            if pack_reader is not None and relative_path in pack_reader:
+                return pack_reader.read(relative_path)
+            return read_file_bytes(self.path / relative_path, mmap_threshold)
+
+        def read_example(image_id):
+            return image_id, {relative_path: read_file(relative_path) for relative_path in examples[image_id]}
+
+        ready = queue.Queue(maxsize=max(prefetch, 1))
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=num_threads)
+
+        def put(item):
+            # the queue is bounded, so at most 'prefetch' batches are read ahead
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            for batch in batches:
+                if not put([executor.submit(read_example, image_id) for image_id in batch]):
+                    return
+            # the end of the batches is signalled the same way, a stopped consumer never takes it
+            put(None)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                futures = ready.get()
+                if futures is None:
+                    break
+                yield [future.result() for future in futures]
+        finally:
+            # runs when the consumer stops early too
+            stop.set()
+            producer.join()
+            executor.shutdown(wait=True)
+
+    def _get_pack_reader(self) -> PackReader:
+        """Gets the reader of the dataset's packed blobs, created once.
+
+        Returns:
+            PackReader: reader of packed files
+        """
+        if self._pack_reader is None:
+            self._pack_reader = PackReader(self.path)
+        return self._pack_reader
+
+    def _load_file_index(self) -> list:
+        """Loads the file index stored in the dataset once, building it if there is none.
+
+        Returns:
+            list: [relative path, size, split, image_id] entries for every file in dataset
+        """
+        if self._file_index is None:
+            try:
+                with open(self.path / FILE_INDEX_NAME, 'r') as f:
+                    self._set_file_index(json.load(f)['files'])
+            except (OSError, ValueError, KeyError):
+                self.build_file_index()
+        return self._file_index
+
+    def _set_file_index(self, files: list):
+        """Sets the file index and the lookup tables built from it.
+
+        Args:
+            files (list): [relative path, size, split, image_id] entries
+        """
+        self._file_index = files
+        self._files_by_image_id = {}
+        self._files_by_split = {}
+        for relative_path, _, split, image_id in files:
+            if image_id is not None:
+                self._files_by_image_id.setdefault(image_id, []).append(relative_path)
+            if split is not None:
+                self._files_by_split.setdefault(split, []).append(relative_path)
+
     def get_num_folds(self) -> int:
         """Gets the number of folds this dataset supports for 
         k-fold cross validation.
@@ -202,6 +623,144 @@ class Dataset(object):
         Returns:
             int: number of folds
         """
-        path = self.path / Path('dev')
-        return len(glob.glob(str(path) + FOLD_DIR_PREFIX + '*'))
-    
+        path = self.path / SPLITS_DIR / FOLDS_DIR
+        return len(glob.glob(str(path / FOLD_DIR_PREFIX) + '*.json'))
+
+    def get_split_manifest(self) -> dict:
+        """Gets the split manifest of a dataset written with virtual splits.
+        Loaded once and cached.
+
+        Returns:
+            dict: split manifest, with the directory raw files are stored in ('data_dir'),
+                the prefix-suffix pairs of files associated with each image ('associated_files')
+                and split names mapped to lists of (imageset, image_id) pairs ('splits')
+
+        Raises:
+            ValueError: if the dataset has no split manifest
+        """
+        if self._split_manifest is None:
+            manifest_path = self.path / SPLITS_DIR / SPLIT_MANIFEST_NAME
+            if not manifest_path.exists():
+                raise ValueError(f'Dataset "{self.name}" was not written with virtual splits.')
+            with open(manifest_path, 'r') as f:
+                self._split_manifest = json.load(f)
+        return self._split_manifest
+
+    def get_fold(self, fold: int) -> dict:
+        """Gets the manifest of a k-fold cross validation fold.
+
+        Args:
+            fold (int): index of fold
+
+        Returns:
+            dict: fold manifest with 'train' and 'validation' lists of (imageset, image_id) pairs
+
+        Raises:
+            ValueError: if the dataset has no such fold
+        """
+        fold_path = self.path / SPLITS_DIR / FOLDS_DIR / f'{FOLD_DIR_PREFIX}{fold}.json'
+        if not fold_path.exists():
+            raise ValueError(f'Dataset "{self.name}" has no fold {fold}.')
+        with open(fold_path, 'r') as f:
+            return json.load(f)
+
+    def get_split_image_ids(self, split: str, fold: int=None) -> list:
+        """Gets the image_ids in a split, either of the dataset itself or of one of its folds.
+
+        Args:
+            split (str): name of split, 'test', 'train' or 'validation'
+            fold (int, optional): index of fold to take the split from
+
+        Returns:
+            list: (imageset, image_id) pairs in split
+
+        Raises:
+            ValueError: if the dataset has no manifest containing the split
+        """
+        splits = self.get_split_manifest()['splits'] if fold is None else self.get_fold(fold)
+        if split not in splits:
+            raise ValueError(f'Dataset "{self.name}" has no split "{split}".')
+        return [tuple(image_id) for image_id in splits[split]]
+
+    def get_split_files(self, split: str, fold: int=None) -> list:
+        """Resolves the image_ids in a split to paths of their files in the dataset.
+        Only works for datasets written with virtual splits, where every raw file
+        is stored once in the data directory.
+
+        Args:
+            split (str): name of split, 'test', 'train' or 'validation'
+            fold (int, optional): index of fold to take the split from
+
+        Returns:
+            list: paths to all existing files associated with the split's images. In a
+                packed dataset they may only exist in the pack, read them with 'read_file'
+
+        Raises:
+            ValueError: if the dataset has no manifest containing the split
+        """
+        manifest = self.get_split_manifest()
+        data_path = self.path / manifest['data_dir']
+        pack_reader = self._get_pack_reader() if self.is_packed else None
+        files = []
+        for _, image_id in self.get_split_image_ids(split, fold=fold):
+            for prefix, suffix in manifest['associated_files']:
+                filepath = data_path / f'{prefix}{image_id}{suffix}'
+                # packed files may have been removed once packed
+                if filepath.exists() or (pack_reader is not None and
+                        filepath.relative_to(self.path).as_posix() in pack_reader):
+                    files.append(filepath)
+        return files
+
+def _directory_split(relative_root: Path):
+    """Finds the split of a file from the directory it is in, relative to the dataset root.
+
+    Args:
+        relative_root (Path): directory of the file relative to the dataset root
+
+    Returns:
+        str: split name, None if the directory belongs to no single split
+    """
+    if relative_root == DEV_DIR or DEV_DIR in relative_root.parents:
+        shard = SHARD_DIR_PATTERN.fullmatch(relative_root.parts[len(DEV_DIR.parts)]) \
+            if relative_root != DEV_DIR else None
+        # validation objects are written with split type 'test'
+        return {'train': 'train', 'test': 'validation'}.get(shard.group(1)) if shard else None
+    split = None
+    for part in relative_root.parts:
+        shard = SHARD_DIR_PATTERN.fullmatch(part)
+        name = shard.group(1) if shard else part
+        if name in SPLIT_NAMES:
+            split = name
+    return split
+
+def _match_image_id(name: str, image_ids: set, associated_files: list = None):
+    """Finds the image_id in a file name of the form '<prefix><image_id><suffix>'. When
+    the prefix-suffix pairs of the files stored for each image are known only they are
+    matched, otherwise the longest run of separator delimited parts of the name that is
+    an image_id is used, leftmost first.
+
+    Args:
+        name (str): file name
+        image_ids (set): every image_id in the dataset
+        associated_files (list, optional): prefix-suffix pairs recorded by the writer
+
+    Returns:
+        str: image_id, None if the name contains no image_id
+    """
+    if associated_files is not None:
+        for prefix, suffix in associated_files:
+            if name.startswith(prefix) and name.endswith(suffix) and len(name) > len(prefix) + len(suffix):
+                image_id = name[len(prefix):len(name) - len(suffix)]
+                if image_id in image_ids:
+                    return image_id
+        return None
+    # parts at even indices, separators at odd indices
+    parts = FILE_NAME_SEPARATORS.split(name)
+    for start in range(0, len(parts), 2):
+        found = None
+        for end in range(start + 1, len(parts) + 1, 2):
+            if ''.join(parts[start:end]) in image_ids:
+                found = ''.join(parts[start:end])
+        if found is not None:
+            return found
+    return None
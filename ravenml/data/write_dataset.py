@@ -1,13 +1,47 @@
-import os, inspect, shutil, time, json
+import os, sys, shutil, time, json, contextlib
+import multiprocessing
+import click
+import numpy as np
 import pandas as pd
 import ravenml.utils.git as git
-from random import sample
 from pathlib import Path
 from datetime import datetime
-from ravenml.data.interfaces import CreateInput
-from ravenml.utils.question import cli_spinner, cli_spinner_wrapper, DecoratorSuperClass, user_input
+try:
+    import resource
+except ImportError:
+    # resource is unavailable on Windows, peak RSS is then not recorded
+    resource = None
+from ravenml.data.image_ids import ImageIdTable, MANIFEST_NAME, write_image_id_manifest
+from ravenml.data.interfaces import CreateInput, SPLITS_DIR, FOLDS_DIR, FOLD_DIR_PREFIX, SPLIT_MANIFEST_NAME, DATA_DIR
+from ravenml.utils.question import cli_spinner, DecoratorSuperClass, user_input
 from ravenml.utils.config import get_config
-from ravenml.data.helpers import default_filter, copy_associated_files, split_data, read_json_metadata
+from ravenml.utils.construction_cache import ConstructionCache
+from ravenml.utils.checkpoints import StageCheckpoints
+from ravenml.utils.hashing import hash_files
+from ravenml.data.helpers import default_filter, copy_associated_files, split_data, assign_splits, \
+    assign_folds, write_split_manifest, read_json_metadata
+
+def dataset_stage(text):
+    """Decorator for DatasetWriter stages. Runs the stage inside a cli spinner
+        and checkpoints it, so it is skipped when a build is resumed (see
+        'DatasetWriter.run_stage'). Inherited by overriding methods of subclasses
+        through DecoratorSuperClass.
+
+    Args:
+        text (str): text to display in spinner while the stage runs, no spinner
+            is shown if falsy (e.g. for stages prompting the user)
+    """
+    def stage(func):
+        def wrapper(self, *args, **kwargs):
+            return self.run_stage(func, text, *args, **kwargs)
+        wrapper.inherit_decorator = dataset_stage
+        wrapper.args = text
+        return wrapper
+    return stage
+
+# writer and shards being written by the current process pool. Set before the pool
+# forks so workers inherit them instead of having every object pickled to them
+_shard_state = {}
 
 class DatasetWriter(DecoratorSuperClass):
     """Interface for creating datasets, methods are in order of what is expected to be 
@@ -22,14 +56,29 @@ class DatasetWriter(DecoratorSuperClass):
             user to filter by amount of images per imageset being used
         interactive_tag_filter (): takes the current image_ids and allows the user to create
             sets through interactive filtering using the image_id tags
+        construct (image_id): plugin specific method to generate the object for a single
+            image_id, used by 'construct_cached'
         construct_all (): plugin specific method to generate objects which will be used
             in writing the dataset
+        load_data (): copies files needed by the plugin for the selected image_ids
         write_dataset (): main driver for writing the dataset locally
         write_metadata (): writes dataset metadata file(s)
         write_additional_files (): writes any plugin_specific files not covered in
             write_dataset, write_metadata
+        run_stage (func, text): runs a stage, used by the 'dataset_stage' decorator
+            all of the above methods are decorated with
+        copy_files (image_ids, destination_dir, associated_files): copies associated files,
+            counting bytes copied in stage metrics
+        publish (path): hands finalised files to the background uploader, if any
+        fetch_files (image_ids, associated_files): downloads the files of selected images
+            when imagesets were staged with only their metadata
+        remove_duplicates (associated_files): finds byte-identical duplicate images
+            and drops or reports them
     """
 
+    # attributes that are never saved to or restored from stage checkpoints
+    checkpoint_exclude = ['checkpoints', 'construction_cache', 'uploader', 'stager', '_stage_count', '_active_stage', '_bytes_copied']
+
     def __init__(self, create: CreateInput, **kwargs):
         """Initialization for interface, tags_df, image_ids, and
             filter_metadata are initialized with dummy values and
@@ -42,6 +91,13 @@ class DatasetWriter(DecoratorSuperClass):
         Initializations:
             num_folds (int): number of folds in dataset
             test_percent (float): percentage of dataset to be used in test set
+            seed (int): seed used for all random splitting
+            stratify (str): what splits are stratified by, 'imageset', 'tag' or None
+            rng (Generator): numpy random generator seeded with seed, shared by all splits
+            virtual_splits (bool): whether splits are written as manifests over raw files stored once
+            dedup (str): what is done with duplicate images, 'drop', 'report' or None
+            num_shards (int): number of shards each split is written in
+            num_workers (int): number of processes used to write shards
             dataset_path (Path): path to where dataset should be written
             dataset_name (String): name of dataset
             created_by (String): name of person creating dataset
@@ -50,19 +106,38 @@ class DatasetWriter(DecoratorSuperClass):
             imageset_paths (list): list of paths to all imagesets being used
             tags_df (pandas dataframe): after load_image_ids() is run, holds 
                 tags associated with each image_id
-            image_ids (list): list of tuples containing a path to an imageset
-                and an image_id in that imageset
+            image_ids (ImageIdTable): table of image_ids, iterates as tuples containing
+                a path to an imageset and an image_id in that imageset
             filter_metadata (dict): holds the groups of different subsets of
                 image_ids
             obj_dict (dict): holds image_id-constructed object pairs which will
                 be used to write the dataset
             metadata_foramt (tuple): holds a prefix-suffix pair for the format
                 of metadata files
+            stored_file_formats (list): prefix-suffix pairs of the files stored for
+                each image_id in the written dataset, recorded in its metadata
+            construction_cache (ConstructionCache): persistent cache of constructed
+                objects, None unless enabled in the create config
+            checkpoints (StageCheckpoints): completion checkpoints of each stage,
+                reused if resuming, None unless checkpointing is enabled in the
+                create config
+            performance (list): metrics recorded for each stage that has run, in order
+            uploader (BackgroundUploader): uploads finalised files while the dataset is
+                still being written, None unless pipelined upload is enabled
+            stager (ImagesetStager): fetches the files of selected images when imagesets
+                were downloaded metadata only, otherwise None
         """
 
         metadata = create.metadata
         self.num_folds = create.kfolds
         self.test_percent = create.test_percent
+        self.seed = create.seed
+        self.stratify = create.stratify
+        self.rng = np.random.default_rng(self.seed)
+        self.virtual_splits = create.virtual_splits
+        self.dedup = create.dedup
+        self.num_shards = create.num_shards
+        self.num_workers = create.num_workers
         self.dataset_path = create.dataset_path
         self.dataset_name = metadata['dataset_name']
         self.created_by = metadata['created_by']
@@ -74,8 +149,176 @@ class DatasetWriter(DecoratorSuperClass):
         self.filter_metadata = {"groups": []}
         self.obj_dict = {}
         self.metadata_format = None
+        self.stored_file_formats = []
+        self.construction_cache = ConstructionCache(self.plugin_name, create.plugin_config) \
+            if create.construction_cache else None
+        self.checkpoints = StageCheckpoints(create.checkpoint_path, resume=create.resume) \
+            if create.checkpoint else None
+        self.performance = []
+        self.uploader = create.uploader
+        self.stager = create.stager
+        self._stage_count = 0
+        self._active_stage = None
+        self._bytes_copied = 0
+
+    def run_stage(self, func, text, *args, **kwargs):
+        """Runs a stage of dataset creation. Stages are numbered in the order they are
+            called. Wall time, CPU time (including child processes), peak RSS growth, item
+            counts, objects reused from the construction cache and bytes copied are recorded
+            for every stage in 'performance'. With
+            checkpointing enabled, once a stage completes the writer state (every picklable
+            attribute not in 'checkpoint_exclude') and its return value are checkpointed,
+            replacing the state of the previous stage. When resuming, a
+            stage with a checkpoint is skipped and the state restored instead, so a build
+            continues from the first stage that did not complete. Stages called from inside
+            another stage (e.g. through super()) run as part of it.
+
+        Args:
+            func (function): undecorated stage method
+            text (str): text to display in spinner while the stage runs, no spinner if falsy
+            *args (tuple, optional): ordered arguments of stage
+            **kwargs (dict, optional): keyword arguments of stage
+
+        Returns:
+            object: return value of stage
+        """
+        if self._active_stage is not None:
+            return func(self, *args, **kwargs)
+
+        checkpoints = self.checkpoints
+        stage = f'{self._stage_count:02d}_{func.__name__}'
+        self._stage_count += 1
+        if checkpoints is not None and checkpoints.is_complete(stage):
+            state, result = checkpoints.load(stage)
+            self.__dict__.update(state)
+            click.echo(f'{text or func.__name__} Skipped, completed in previous run.')
+            return result
+
+        self._active_stage = stage
+        self._bytes_copied = 0
+        cache_hits = self.construction_cache.hits if self.construction_cache is not None else 0
+        start = _resource_usage()
+        try:
+            result = cli_spinner(text, func, self, *args, **kwargs) if text else func(self, *args, **kwargs)
+        finally:
+            self._active_stage = None
+        end = _resource_usage()
+        self.performance.append({
+            'stage': func.__name__,
+            'wall_time_s': round(end[0] - start[0], 3),
+            'cpu_time_s': round(end[1] - start[1], 3),
+            'peak_rss_delta_mb': None if end[2] is None else round(end[2] - start[2], 1),
+            'image_ids': len(self.image_ids),
+            'objects': len(self.obj_dict),
+            'objects_cached': None if self.construction_cache is None else self.construction_cache.hits - cache_hits,
+            'bytes_copied': self._bytes_copied
+        })
+        if checkpoints is not None:
+            state = {name: value for name, value in self.__dict__.items() if name not in self.checkpoint_exclude}
+            checkpoints.save(stage, state, result)
+        return result
+
+    def copy_files(self, image_ids, destination_dir, associated_files):
+        """Copies the associated files of image_ids with 'copy_associated_files', and
+            counts the bytes copied towards the metrics of the running stage.
+
+        Args:
+            image_ids (list): image_ids whose files should be copied
+            destination_dir (Path): directory where data will be copied to
+            associated_files (list): prefix-suffix pairs of files to copy
+
+        Returns:
+            int: number of bytes copied
+        """
+        self.fetch_files(image_ids, associated_files)
+        bytes_copied = copy_associated_files(image_ids, destination_dir, associated_files)
+        self._bytes_copied += bytes_copied
+        return bytes_copied
+
+    def remove_duplicates(self, associated_files):
+        """Finds images whose files are byte-identical to an earlier image, e.g. the same
+            capture present in two overlapping imagesets. Images are compared by the content
+            hashes of all their associated files except the metadata file, which often differs
+            between copies (hashes are reused from the persistent hash index when files are
+            unchanged). With 'dedup' set to 'drop', every duplicate is removed from 'image_ids'
+            keeping the first occurrence, otherwise they are only reported. Duplicates are
+            recorded in 'filter_metadata' under 'duplicates'.
+
+        Args:
+            associated_files (list): prefix-suffix pairs of the files of each image
+
+        Returns:
+            list: (duplicate image_id, kept image_id) pairs
+        """
+        file_types = [pair for pair in dict.fromkeys(associated_files) if pair != self.metadata_format] \
+                        or list(dict.fromkeys(associated_files))
+        image_ids = list(self.image_ids)
+        self.fetch_files(image_ids, file_types)
+        paths = [imageset / (prefix + image_id + suffix)
+                    for imageset, image_id in image_ids for prefix, suffix in file_types]
+        digests = hash_files(paths)
+
+        first_seen = {}
+        duplicates = []
+        keep = []
+        for i, image_id in enumerate(image_ids):
+            content = tuple(digests[i * len(file_types):(i + 1) * len(file_types)])
+            # images without any files cannot be compared
+            if all(digest is None for digest in content):
+                keep.append(i)
+                continue
+            if content in first_seen:
+                duplicates.append((image_id, image_ids[first_seen[content]]))
+            else:
+                first_seen[content] = i
+                keep.append(i)
+
+        if self.dedup == 'drop' and duplicates:
+            self.image_ids = self.image_ids.take(keep) if isinstance(self.image_ids, ImageIdTable) \
+                                else [image_ids[i] for i in keep]
+        self.filter_metadata['duplicates'] = {
+            'mode': self.dedup,
+            'num_duplicates': len(duplicates),
+            'duplicates': [[dup[0].name, dup[1], kept[0].name, kept[1]] for dup, kept in duplicates]
+        }
+        if duplicates:
+            action = 'Dropped' if self.dedup == 'drop' else 'Found'
+            click.echo(f'{action} {len(duplicates)} duplicate images.')
+        return duplicates
+
+    def publish(self, path):
+        """Marks files as final so they are uploaded in the background while the rest
+            of the dataset is written. Does nothing unless pipelined upload is enabled.
+            Files must not be modified after being published, any that are get uploaded
+            again when the upload finishes.
+
+            Only paths inside the dataset directory are published, scratch files such as
+            those in 'temp_dir' never are.
+
+        Args:
+            path (Path): finalised file, or directory of finalised files
+        """
+        if self.uploader is None:
+            return
+        path = Path(path).resolve()
+        dataset_dir = (self.dataset_path / self.dataset_name).resolve()
+        if path == dataset_dir or dataset_dir in path.parents:
+            self.uploader.submit(path)
     
-    @cli_spinner_wrapper("Loading Image Ids...")
+    def fetch_files(self, image_ids, associated_files):
+        """Downloads the associated files of image_ids that are not present locally, when
+            imagesets were staged with only their metadata files. Does nothing otherwise.
+            Plugins that read image files outside of 'copy_files' (e.g. in 'construct')
+            should call this on their selected image_ids first.
+
+        Args:
+            image_ids (list): image_ids whose files are needed
+            associated_files (list): prefix-suffix pairs of files needed
+        """
+        if self.stager is not None:
+            self.stager.fetch(image_ids, associated_files)
+
+    @dataset_stage("Loading Image Ids...")
     def load_image_ids(self):
         """Method goes through imagesets and is expected to populate the 'tags_df'
             dataframe with image_ids and tags related to each image_id, as well
@@ -85,6 +328,7 @@ class DatasetWriter(DecoratorSuperClass):
         """
         raise NotImplementedError
 
+    @dataset_stage(None)
     def set_size_filter(self, set_sizes: dict=None):
         """Method assumes that 'image_ids' has already been found and allows
             user to filter through them based on how many images in each imageset
@@ -96,6 +340,7 @@ class DatasetWriter(DecoratorSuperClass):
         """
         raise NotImplementedError
 
+    @dataset_stage(None)
     def interactive_tag_filter(self):
         """Method assumes that 'image_ids' has already been found and allows
             user to filter through them for subsets they choose to use based on tags
@@ -104,7 +349,15 @@ class DatasetWriter(DecoratorSuperClass):
         """
         raise NotImplementedError
 
-    @cli_spinner_wrapper("Constructing data...")
+    @dataset_stage("Loading data...")
+    def load_data(self):
+        """Method copies all files the plugin needs for the selected image_ids
+
+        Args:
+        """
+        raise NotImplementedError
+
+    @dataset_stage("Constructing data...")
     def construct_all(self):
         """Method should create objects from the image_ids given with whatever
             information is needed for the write_dataset method to use. Is required 
@@ -115,7 +368,48 @@ class DatasetWriter(DecoratorSuperClass):
         """
         raise NotImplementedError
 
-    @cli_spinner_wrapper("Writing out dataset locally...")
+    def construct(self, image_id):
+        """Method should create the object for a single image_id. Used through
+            'construct_cached' so constructed objects can be reused across builds,
+            which requires them to be picklable.
+
+        Args:
+            image_id (tuple): path to an imageset paired with an image_id in that imageset
+        
+        Returns:
+            object: constructed object
+        """
+        raise NotImplementedError
+
+    def construct_cached(self, image_id):
+        """Method gets the constructed object for an image_id from 'construction_cache',
+            calling 'construct' only if the image is new, its metadata file changed or the
+            plugin config changed. Simply calls 'construct' if the cache is disabled.
+
+        Args:
+            image_id (tuple): path to an imageset paired with an image_id in that imageset
+        Variables Needed:
+            construction_cache (ConstructionCache): cache to use (provided by 'create' input)
+            metadata_format (tuple): needed to find the metadata file that is hashed into the key
+
+        Returns:
+            object: constructed object
+        """
+        if self.construction_cache is None:
+            return self.construct(image_id)
+        metadata_path = None
+        if self.metadata_format is not None:
+            metadata_path = image_id[0] / f'{self.metadata_format[0]}{image_id[1]}{self.metadata_format[1]}'
+            if not metadata_path.exists():
+                metadata_path = None
+        key = self.construction_cache.key(image_id[0].name, image_id[1], metadata_path)
+        found, obj = self.construction_cache.get(key)
+        if not found:
+            obj = self.construct(image_id)
+            self.construction_cache.put(key, obj)
+        return obj
+
+    @dataset_stage("Writing out dataset locally...")
     def write_dataset(self):
         """Main driver, writes dataset based on objects passed from construct_all
 
@@ -123,7 +417,7 @@ class DatasetWriter(DecoratorSuperClass):
         """
         raise NotImplementedError
 
-    @cli_spinner_wrapper("Writing out metadata locally...")
+    @dataset_stage("Writing out metadata locally...")
     def write_metadata(self):
         """Writes out a metadata file
 
@@ -131,7 +425,7 @@ class DatasetWriter(DecoratorSuperClass):
         """
         raise NotImplementedError
     
-    @cli_spinner_wrapper("Writing out additional files...")
+    @dataset_stage("Writing out additional files...")
     def write_additional_files(self):
         """Writes out additional files
 
@@ -152,8 +446,17 @@ class DefaultDatasetWriter(DatasetWriter):
             'write_dataset', writes out test set   
         write_out_complete_set (path (Path), data (list)): helper method for this implementation of
             'write_dataset', creates test and train groups and corresponding paths for plugin to write to        
+        write_out_sharded_splits (path (Path), splits (dict)): helper method for 'write_out_complete_set',
+            writes each split in shards across a process pool if the plugin supports it
+
+    Attributes:
+        supports_sharding (bool): plugins set this to True to opt in to sharded writing. Their
+            'write_out_train_split' is then called once per shard, each in a separate process,
+            with a shard-specific directory as its path, so serialization code does not change.
     """
 
+    supports_sharding = False
+
     def __init__(self, create: CreateInput):
         """Method calls DatasetWriter's initialization to get all variables it needs
 
@@ -184,7 +487,7 @@ class DefaultDatasetWriter(DatasetWriter):
             supported in this default implementation.
 
             If overridden 'self.image_ids' is expected to be set to a list of 
-            image_ids if any other methods need to be used (including filtering).
+            image_ids (or an ImageIdTable) if any other methods need to be used (including filtering).
         
         Args:
             metadata_format (tuple): prefix-suffix pair of what metadata files look like
@@ -200,12 +503,28 @@ class DefaultDatasetWriter(DatasetWriter):
         
         # Goes through each file in each imageset to search for metadata files
         # metadata files are parsed for tags and filename is parsed for image_id 
-        for data_dir in self.imageset_paths:
+        imageset_indices = []
+        ids = []
+        for i, data_dir in enumerate(self.imageset_paths):
             for dir_entry in os.scandir(data_dir):
                 if not (dir_entry.name.startswith(metadata_prefix) and dir_entry.name.endswith(metadata_suffix)):
                     continue
-                image_id = dir_entry.name.replace(metadata_prefix, '').replace(metadata_suffix, '')
-                self.image_ids.append((data_dir, image_id))
+                imageset_indices.append(i)
+                ids.append(dir_entry.name[len(metadata_prefix):len(dir_entry.name) - len(metadata_suffix)])
+        self.image_ids = ImageIdTable(self.imageset_paths, imageset_indices, ids)
+
+    def construct_all(self):
+        """Method constructs an object for every image_id with 'construct_cached' and
+            stores them in 'obj_dict'. Plugins implementing 'construct' get cached
+            incremental rebuilds from this default.
+
+            If overridden, method is expected to set 'obj_dict' to a dictionary with
+            image_id keys and the constructed objects as values.
+
+        Variables Needed:
+            image_ids (list): image_ids to construct (provided by 'load_image_ids'/filtering)
+        """
+        self.obj_dict = {image_id: self.construct_cached(image_id) for image_id in self.image_ids}
 
     def set_size_filter(self, set_sizes: dict=None):
         """Method is expected to only be called after 'load_image_ids' is called, as it relies on 
@@ -222,25 +541,21 @@ class DefaultDatasetWriter(DatasetWriter):
         Variables Needed:
             image_ids (list): needed for filtering
         """
-        # Gets dict of image_ids associated with each imageset
-        imageset_names = [os.path.basename(path) for path in self.imageset_paths ]
-        imageset_to_image_ids_dict = { name: [] for name in imageset_names}
-        for image_id in self.image_ids:
-            if os.path.basename(image_id[0]) in imageset_names:
-                imageset_to_image_ids_dict[os.path.basename(image_id[0])].append(image_id)
+        set_sizes = set_sizes if set_sizes else {}
+        image_ids = ImageIdTable.from_pairs(self.image_ids, imageset_paths=self.imageset_paths)
              
         # Goes through specified filtering amounts for each imageset and prompts for missing values
-        filtered_image_ids = []
-        for imageset in imageset_names:
+        sizes = {}
+        for imageset in [os.path.basename(path) for path in self.imageset_paths]:
             subset_size = set_sizes[imageset] if set_sizes.get(imageset) else int(user_input(
                 message=f'How many images from {imageset} would you like to use?'))
-            if subset_size < 0 or subset_size > len(imageset_to_image_ids_dict[imageset]):
+            if subset_size < 0 or subset_size > image_ids.count(imageset):
                 raise Exception(f'Invalid number ({subset_size}) of images to use from {imageset}')
-            filtered_image_ids += sample(imageset_to_image_ids_dict[imageset],subset_size)
+            sizes[imageset] = subset_size
             self.filter_metadata[imageset] = subset_size
 
         # Updates image_ids with the new information
-        self.image_ids = filtered_image_ids
+        self.image_ids = image_ids.sample(sizes, self.rng)
 
     def interactive_tag_filter(self):
         """Method is expected to only be called after 'load_image_ids' is called, as it relies on 
@@ -255,18 +570,12 @@ class DefaultDatasetWriter(DatasetWriter):
             image_ids (list): needed for filtering
             metadata_format (tuple): needed to read the metadata files and get the associated tags for each image_id
         """
-        # Gets dict of image_ids associated with each imageset
-        imageset_names = [os.path.basename(path) for path in self.imageset_paths ]
-        imageset_to_image_ids_dict = { name: [] for name in imageset_names}
-        for image_id in self.image_ids:
-            if os.path.basename(image_id[0]) in imageset_names:
-                imageset_to_image_ids_dict[os.path.basename(image_id[0])].append(image_id)
-
-        for image_id in self.image_ids:
-            temp = read_json_metadata(image_id[0] / f'meta_{image_id[1]}{self.metadata_format[1]}', image_id[1])
-            self.tags_df = pd.concat((self.tags_df, temp), sort=False)
+        tags = [read_json_metadata(image_id[0] / f'meta_{image_id[1]}{self.metadata_format[1]}', image_id[1])
+                for image_id in self.image_ids]
+        self.tags_df = pd.concat([self.tags_df] + tags, sort=False)
         self.tags_df = self.tags_df.fillna(False)
-        self.image_ids = default_filter(self.tags_df, self.filter_metadata)
+        self.image_ids = ImageIdTable.from_pairs(default_filter(self.tags_df, self.filter_metadata),
+                                                 imageset_paths=self.imageset_paths)
 
     def load_data(self):
         """Method is expected to be called after 'load_image_ids' and filtering methods if filtering is
@@ -279,8 +588,11 @@ class DefaultDatasetWriter(DatasetWriter):
             image_ids (list): needed to find what needs to be copied (provided by 'load_image_ids'/filtering)
             temp_dir (Path): needed to know where to copy to (provided by 'create' input)
             associated_files (dict): needed to know what files need to be copied (provided by plugin)
+            dedup (str): whether duplicate images are dropped or reported before copying (provided by 'create' input)
         """
-        copy_associated_files(self.image_ids, self.temp_dir, self.associated_files)
+        if self.dedup:
+            self.remove_duplicates(self.associated_files)
+        self.copy_files(self.image_ids, self.temp_dir, self.associated_files)
     
     def write_metadata(self):
         """Method writes out metadata in JSON format in file 'metadata.json',
@@ -295,8 +607,12 @@ class DefaultDatasetWriter(DatasetWriter):
                 dataset produced by this tool ((provided by 'create' input))
             training_type (str): the training type selected by the user (provided by 'create' input)
             image_ids (list): a list of image IDs that ended up in the final
-                dataset (either dev or test) (provided by 'create' input)
+                dataset (either dev or test), written to a compressed manifest next
+                to metadata.json (provided by 'create' input)
             filters (dict): a dictionary representing filter metadata (provided by filtering methods)
+            performance (list): metrics of each stage run so far (provided by 'run_stage')
+            stored_file_formats (list): prefix-suffix pairs of the files stored per image_id,
+                used to match files to image_ids (provided by 'write_dataset')
             dataset_path (Path): where metadata will be written (provided by 'create' input)
         """
         dataset_path = self.dataset_path / self.dataset_name
@@ -308,33 +624,25 @@ class DefaultDatasetWriter(DatasetWriter):
         metadata["created_by"] = self.created_by
         metadata["comments"] = self.comments
         metadata["training_type"] = self.plugin_name
-        metadata["image_ids"] = [(image_id[0].name, image_id[1]) for image_id in self.image_ids]
+        # image_ids are kept out of metadata.json in a compressed sidecar so listings stay fast
+        write_image_id_manifest(dataset_path / MANIFEST_NAME, self.image_ids)
+        metadata["image_ids_file"] = MANIFEST_NAME
+        metadata["num_images"] = len(self.image_ids)
         metadata["filters"] = self.filter_metadata
+        metadata["performance"] = self.performance
+        metadata["associated_files"] = self.stored_file_formats
+        metadata["splits"] = {
+            "seed": self.seed,
+            "test_percent": self.test_percent,
+            "stratify": self.stratify,
+            "num_folds": self.num_folds,
+            "virtual": self.virtual_splits
+        }
         
-        # find ravenml directory
-        rml_dir = Path(__file__).resolve().parent
-        repo_root = git.is_repo(rml_dir)
-        git_info = {}
-        if repo_root:
-            git_info["ravenml_git_sha"] = git.git_sha(repo_root)
-            git_info["ravenml_tracked_git_patch"] = git.git_patch_tracked(repo_root)
-            git_info["ravenml_untracked_git_patch"] = git.git_patch_untracked(repo_root)
-        else:
-            git_info = git.retrieve_from_pkg(rml_dir)
-        metadata.update(git_info)
-
-        # Find file 'write_metadata' calling file, which must be somewhere in the plugin 
-        plugin_dir = Path(inspect.getmodule(inspect.stack()[3][0]).__file__).resolve().parent
-        repo_root = git.is_repo(plugin_dir)
-        git_info = {}
-        if repo_root:
-            git_info["plugin_git_sha"] = git.git_sha(repo_root)
-            # note running the patch commands in the repo root will include patches for other plugins
-            git_info["plugin_tracked_git_patch"] = git.git_patch_tracked(repo_root)
-            git_info["plugin_untracked_git_patch"] = git.git_patch_untracked(repo_root)
-        else:
-            git_info = git.retrieve_from_pkg(plugin_dir)
-        metadata.update(git_info)
+        # ravenml and plugin git info are collected once per repo state, see collect_git_info
+        metadata.update(git.collect_git_info(Path(__file__).resolve().parent, 'ravenml'))
+        # writer subclasses live in the plugin, otherwise the plugin is the code driving the writer
+        metadata.update(git.collect_git_info(git.find_module_dir(self), 'plugin'))
         
         with open(metadata_filepath, 'w') as outfile:
             json.dump(metadata, outfile, indent=2)
@@ -343,11 +651,14 @@ class DefaultDatasetWriter(DatasetWriter):
         """Method is parent function for writing out complete dataset. Method first
             creates 'test' and 'dev' subsets. The 'test' subset gets all related files
             to it copied into a test folder. The 'dev' subset calls 'write_out_complete_set'
-            in the 'splits/complete' directory. Note that prior to this method, obj_dict
-            should be set to a list of objects that are meant to be written.
+            in the 'splits/complete' directory. If 'num_folds' is at least 2, fold manifests
+            of the 'dev' subset are written by 'write_fold_manifests'. Note that prior to this
+            method, obj_dict should be set to a list of objects that are meant to be written.
+            If 'virtual_splits' is set, 'write_virtual_splits' is called instead and obj_dict
+            is not used.
 
-            If overridden, there are no expectations, but note that the variables 'kfolds'
-            and 'test_percent' are provided for use.
+            If overridden, there are no expectations, but note that the variables 'kfolds',
+            'test_percent', 'rng' and 'stratify' are provided for use.
         
         Args:
             associated_files (list): decides what files are to be copied for the test set
@@ -357,22 +668,123 @@ class DefaultDatasetWriter(DatasetWriter):
             dataset_path (Path): where dataset will be written (provided by 'create' input)
             dataset_name (str): the name of the dataset (provided by 'create' input)
         """
+        if self.virtual_splits:
+            self.write_virtual_splits(associated_files)
+            return
         dataset_path = self.dataset_path / self.dataset_name
         print(dataset_path)
 
-        test_subset, dev_subset = split_data(list(self.obj_dict.items()), test_percent=self.test_percent)
+        items = list(self.obj_dict.items())
+        test_subset, dev_subset = split_data(items, test_percent=self.test_percent, seed=self.rng,
+                                             groups=self.get_split_groups([item[0] for item in items]))
         
         # Test subset
         test_path = dataset_path / 'test'
         self.write_out_test_set(test_path, test_subset, associated_files)
 
-        dev_path = dataset_path / 'splits'
+        dev_path = dataset_path / SPLITS_DIR
 
         # standard_path = dev_path / 'standard'
         # write_out_fold(standard_path, fold, is_standard=True)
 
         complete_path = dev_path / 'complete'
-        self.write_out_complete_set(complete_path, [data[1] for data in dev_subset])
+        dev_image_ids = [data[0] for data in dev_subset]
+        self.write_out_complete_set(complete_path, [data[1] for data in dev_subset],
+                                    groups=self.get_split_groups(dev_image_ids))
+        self.write_fold_manifests(dev_image_ids)
+
+    def write_virtual_splits(self, associated_files):
+        """Method writes the dataset with virtual splits. All associated files of every
+            image_id are copied once into the 'data' directory, and the test, train and
+            validation splits are written as a single manifest at 'splits/manifest.json'
+            listing (imageset, image_id) pairs, alongside any fold manifests. Adding splits
+            or folds therefore costs kilobytes rather than another copy of the data. The
+            manifest is read back through Dataset.get_split_image_ids/get_split_files.
+
+            If overridden, there are no expectations.
+
+        Args:
+            associated_files (list): decides what files are stored for each image_id
+        Variables Needed:
+            image_ids (list): image_ids to write (provided by 'load_image_ids'/filtering)
+            dataset_path (Path): where dataset will be written (provided by 'create' input)
+            dataset_name (str): the name of the dataset (provided by 'create' input)
+        """
+        dataset_path = self.dataset_path / self.dataset_name
+        data_path = dataset_path / DATA_DIR
+        os.makedirs(data_path, exist_ok=True)
+        self.copy_files(self.image_ids, data_path, associated_files)
+        self.stored_file_formats = sorted(set(associated_files))
+        self.publish(data_path)
+
+        assignments = assign_splits(len(self.image_ids), test_percent=self.test_percent, seed=self.rng,
+                                    groups=self.get_split_groups(self.image_ids))
+        pairs = np.array([(image_id[0].name, image_id[1]) for image_id in self.image_ids], dtype=object)
+        manifest = {
+            'data_dir': DATA_DIR,
+            'associated_files': sorted(set(associated_files)),
+            'splits': {split: pairs[assignments == split].tolist() for split in ['test', 'train', 'validation']}
+        }
+        write_split_manifest(dataset_path / SPLITS_DIR / SPLIT_MANIFEST_NAME, manifest)
+        self.write_fold_manifests([image_id for image_id, split in zip(self.image_ids, assignments) if split != 'test'])
+
+    def get_split_groups(self, image_ids):
+        """Method gets the label each image_id is stratified on when splitting, based
+            on 'stratify'. Images are grouped by imageset, or by their exact set of tags.
+
+            If overridden, method is expected to return one hashable label per image_id,
+            or None for an unstratified split.
+
+        Args:
+            image_ids (list): image_ids being split
+        Variables Needed:
+            stratify (str): what to stratify on (provided by 'create' input)
+            metadata_format (tuple): needed to read image tags when stratifying by tag
+
+        Returns:
+            list: group label for each image_id, None if splits are not stratified
+        """
+        if self.stratify == 'imageset':
+            return [image_id[0].name for image_id in image_ids]
+        if self.stratify == 'tag':
+            groups = []
+            for image_id in image_ids:
+                metadata_path = image_id[0] / f'{self.metadata_format[0]}{image_id[1]}{self.metadata_format[1]}'
+                with open(metadata_path, 'r') as metadata_file:
+                    tags = json.load(metadata_file).get('tags') or ['untagged']
+                groups.append('|'.join(sorted(tags)))
+            return groups
+        return None
+
+    def write_fold_manifests(self, image_ids):
+        """Method writes k-fold cross validation folds of the given (dev) image_ids as
+            manifests at 'splits/folds/fold_<k>.json', rather than copying the data for
+            every fold. Each manifest lists the 'train' and 'validation' image_ids of its
+            fold as (imageset, image_id) pairs. Nothing is written if 'num_folds' < 2.
+
+            If overridden, there are no expectations.
+
+        Args:
+            image_ids (list): image_ids to divide into folds
+        Variables Needed:
+            num_folds (int): number of folds (provided by 'create' input)
+        """
+        if self.num_folds < 2:
+            return
+        folds = assign_folds(len(image_ids), self.num_folds, seed=self.rng,
+                             groups=self.get_split_groups(image_ids))
+        pairs = np.array([(image_id[0].name, image_id[1]) for image_id in image_ids], dtype=object)
+        folds_path = self.dataset_path / self.dataset_name / SPLITS_DIR / FOLDS_DIR
+        for fold in range(self.num_folds):
+            manifest = {
+                'fold': fold,
+                'num_folds': self.num_folds,
+                'seed': self.seed,
+                'stratify': self.stratify,
+                'train': pairs[folds != fold].tolist(),
+                'validation': pairs[folds == fold].tolist()
+            }
+            write_split_manifest(folds_path / f'{FOLD_DIR_PREFIX}{fold}.json', manifest)
 
     def write_out_test_set(self, path, data, associated_files):
         """Method is helper function for writing out dataset. Writes
@@ -387,11 +799,13 @@ class DefaultDatasetWriter(DatasetWriter):
             data (list): data that should be written
             associated_files (list): decides what files are to be copied for the test set
         """
-        os.mkdir(path)
+        os.makedirs(path, exist_ok=True)
         test_image_ids = [id[0] for id in data]
-        copy_associated_files(test_image_ids, path, associated_files)
+        self.copy_files(test_image_ids, path, associated_files)
+        self.stored_file_formats = sorted(set(associated_files))
+        self.publish(path)
 
-    def write_out_complete_set(self, path, data):
+    def write_out_complete_set(self, path, data, groups=None):
         """Method is helper function for writing out dataset. Creates a 
             'train' subdirectory and calls for 'write_out_train_split' to write
             test_data and train_data. test_data is not the test set, but a validation
@@ -402,12 +816,227 @@ class DefaultDatasetWriter(DatasetWriter):
         Args:
             path (Path): Path to where data should be written
             data (list): data that should be written
+            groups (list, optional): group label for each item of data to stratify on
         """
         data_path = path / 'train'
         if not os.path.exists(data_path):
             os.makedirs(data_path)
 
-        test_data, train_data = split_data(data, test_percent=self.test_percent)
+        test_data, train_data = split_data(data, test_percent=self.test_percent, seed=self.rng, groups=groups)
+
+        self.write_out_sharded_splits(data_path, {'train': train_data, 'test': test_data})
+
+    def write_out_sharded_splits(self, path, splits):
+        """Method is helper function for writing out dataset. Calls 'write_out_train_split'
+            for each split. If the plugin sets 'supports_sharding' and more than one shard
+            is requested, every split is divided into 'num_shards' contiguous shards which are
+            all written concurrently across a pool of 'num_workers' processes. Shard i of n
+            for a split is written into 'path/<split_type>-<i>-of-<n>', zero padded so shard
+            directories sort in order. With checkpointing enabled, each completed split or
+            shard is checkpointed, so resumed builds only write the ones that did not complete.
+
+            Sharded writing relies on forking so workers inherit the objects being written,
+            it falls back to serial writing on platforms that cannot fork.
+
+            If overridden, there are no expectations.
+
+        Args:
+            path (Path): Path to where data should be written
+            splits (dict): split_type keys with lists of objects to write as values
+        """
+        checkpoints = self.checkpoints
+        if not self.supports_sharding or self.num_shards <= 1 \
+                or 'fork' not in multiprocessing.get_all_start_methods():
+            for split_type, objects in splits.items():
+                if checkpoints is not None and checkpoints.is_done(split_type):
+                    continue
+                self.write_out_train_split(objects, path, split_type=split_type)
+                if checkpoints is not None:
+                    checkpoints.mark_done(split_type)
+                self.publish(path)
+            return
+
+        shards = []
+        for split_type, objects in splits.items():
+            num_shards = max(1, min(self.num_shards, len(objects)))
+            shard_size, remainder = divmod(len(objects), num_shards)
+            start = 0
+            for i in range(num_shards):
+                end = start + shard_size + (1 if i < remainder else 0)
+                shard_path = path / f'{split_type}-{i:05d}-of-{num_shards:05d}'
+                # shards completed before an interrupted build are not rewritten on resume
+                if checkpoints is None or not checkpoints.is_done(shard_path.name):
+                    os.makedirs(shard_path, exist_ok=True)
+                    shards.append((objects[start:end], shard_path, split_type))
+                start = end
+        if len(shards) == 0:
+            return
+
+        _shard_state['writer'] = self
+        _shard_state['shards'] = shards
+        try:
+            context = multiprocessing.get_context('fork')
+            # workers are forked when the pool starts, never while an upload is in flight
+            with self.uploader.paused() if self.uploader else contextlib.suppress():
+                pool = context.Pool(processes=min(self.num_workers, len(shards)))
+            with pool:
+                for shard_index in pool.imap_unordered(_write_shard, range(len(shards))):
+                    self.publish(shards[shard_index][1])
+        finally:
+            _shard_state.clear()
+
+class StreamingDatasetWriter(DefaultDatasetWriter):
+    """Streaming interface for creating datasets. Produces the same layout as
+        DefaultDatasetWriter, but never holds every constructed object in memory.
+        Split assignments are computed up front from 'image_ids', then each object
+        is constructed and immediately routed to the writer for its split, so peak
+        memory is bounded by a single object regardless of dataset size.
+
+        Plugin is expected to override 'construct' and 'write_object' instead of
+        'construct_all' and 'write_out_train_split'. 'construct_all' is a no-op
+        so plugins can keep the standard call order.
+
+    Methods (not in DefaultDatasetWriter):
+        construct_stream (): generator yielding (image_id, object) pairs for all image_ids
+        open_split (path, split_type): optional hook called before any object of a split is written
+        write_object (obj, path, split_type): plugin specific method to write a single constructed object
+        close_split (path, split_type): optional hook called once all objects of a split are written
+    """
+
+    def __init__(self, create: CreateInput):
+        """Method calls DefaultDatasetWriter's initialization to get all variables it needs
+
+        Args:
+            create (CreateInput): what is passed to the plugin,
+                containing configuration information
+        """
+        super().__init__(create)
+
+    def construct_stream(self, image_ids=None):
+        """Method lazily constructs objects for the given image_ids, in order.
+
+            If overridden, method is expected to yield exactly one pair per given
+            image_id, in the same order.
+
+        Args:
+            image_ids (list, optional): image_ids to construct, defaults to 'image_ids'
+        
+        Yields:
+            tuple: image_id paired with its constructed object
+        """
+        for image_id in (self.image_ids if image_ids is None else image_ids):
+            yield image_id, self.construct_cached(image_id)
+
+    def construct_all(self):
+        """Construction is deferred to 'write_dataset' when streaming, so nothing
+            is constructed or stored here.
+        """
+        pass
+
+    def open_split(self, path, split_type):
+        """Hook called before the first object of a split is written, e.g. to open
+            a record writer. Does nothing by default.
+
+        Args:
+            path (Path): filepath to where data should be written
+            split_type (String): type of split being written, 'train' or 'test'
+        """
+        pass
+
+    def write_object(self, obj, path, split_type):
+        """Method should be overridden by plugin. Writes a single constructed object
+            in plugin-specific way.
+
+        Args:
+            obj (object): object made by 'construct'
+            path (Path): filepath to where data should be written
+            split_type (String): type of split being written, 'train' or 'test'
+        """
+        raise NotImplementedError
+
+    def close_split(self, path, split_type):
+        """Hook called after the last object of a split is written, e.g. to flush
+            and close a record writer. Does nothing by default.
+
+        Args:
+            path (Path): filepath to where data should be written
+            split_type (String): type of split being written, 'train' or 'test'
+        """
+        pass
+
+    def write_dataset(self, associated_files):
+        """Method is parent function for streaming out complete dataset. Split assignments
+            are precomputed for 'image_ids' and each constructed object is routed as soon
+            as it is produced to 'write_object' under 'splits/complete/train'. Test set
+            image_ids are never constructed, their associated files are copied into the
+            test folder just as in DefaultDatasetWriter. If 'virtual_splits' is set,
+            'write_virtual_splits' is called instead and nothing is constructed.
+
+        Args:
+            associated_files (list): decides what files are to be copied for the test set
+
+        Variables Needed:
+            image_ids (list): image_ids objects are constructed from
+            dataset_path (Path): where dataset will be written (provided by 'create' input)
+            dataset_name (str): the name of the dataset (provided by 'create' input)
+        """
+        if self.virtual_splits:
+            self.write_virtual_splits(associated_files)
+            return
+        dataset_path = self.dataset_path / self.dataset_name
+        assignments = assign_splits(len(self.image_ids), test_percent=self.test_percent, seed=self.rng,
+                                    groups=self.get_split_groups(self.image_ids))
+
+        # validation objects are written with split_type 'test' to match write_out_complete_set
+        split_types = {'train': 'train', 'validation': 'test'}
+        test_subset = [(image_id, None) for image_id, split in zip(self.image_ids, assignments) if split == 'test']
+        dev_image_ids = [image_id for image_id, split in zip(self.image_ids, assignments) if split != 'test']
+        dev_split_types = [split_types[split] for split in assignments if split != 'test']
+
+        data_path = dataset_path / SPLITS_DIR / 'complete' / 'train'
+        if not os.path.exists(data_path):
+            os.makedirs(data_path)
+        for split_type in split_types.values():
+            self.open_split(data_path, split_type)
+        try:
+            for (image_id, obj), split_type in zip(self.construct_stream(dev_image_ids), dev_split_types):
+                self.write_object(obj, data_path, split_type)
+        finally:
+            for split_type in split_types.values():
+                self.close_split(data_path, split_type)
+        self.publish(data_path)
+
+        self.write_out_test_set(dataset_path / 'test', test_subset, associated_files)
+        self.write_fold_manifests(dev_image_ids)
+
+def _write_shard(shard_index: int):
+    """Writes a single shard inside a worker process of 'write_out_sharded_splits'.
+
+    Args:
+        shard_index (int): index of the shard in the forked shard state
 
-        self.write_out_train_split(train_data, data_path, split_type='train')
-        self.write_out_train_split(test_data, data_path, split_type='test')
+    Returns:
+        int: index of the shard written
+    """
+    objects, path, split_type = _shard_state['shards'][shard_index]
+    writer = _shard_state['writer']
+    writer.write_out_train_split(objects, path, split_type=split_type)
+    if writer.checkpoints is not None:
+        writer.checkpoints.mark_done(path.name)
+    return shard_index
+
+def _resource_usage() -> tuple:
+    """Gets the resource usage of this process, used to measure stages.
+
+    Returns:
+        tuple: wall clock time (s), CPU time of this process and its reaped children (s),
+            and peak RSS (MB, None if unavailable on this platform)
+    """
+    cpu_time = time.process_time()
+    if resource is None:
+        return time.perf_counter(), cpu_time, None
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_time += children.ru_utime + children.ru_stime
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform == 'darwin' else 1)
+    return time.perf_counter(), cpu_time, peak_rss / 1024
@@ -0,0 +1,144 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Tests the ravenml S3 upload utilities.
+"""
+
+import pytest
+import json
+import boto3
+from moto import mock_s3
+import ravenml.utils.aws as aws
+import ravenml.utils.local_cache as local_cache
+from ravenml.utils.aws import BackgroundUploader, ArtifactWatcher
+from ravenml.utils.imageset import ImagesetStager
+
+### SETUP ###
+mock = mock_s3()
+bucket_name = 'test-dataset-bucket'
+
+def setup_module():
+    """ Sets up the module for testing.
+    """
+    mock.start()
+    boto3.resource('s3', region_name='us-east-1').create_bucket(Bucket=bucket_name)
+
+def teardown_module():
+    """ Tears down the module after testing.
+    """
+    mock.stop()
+
+def list_keys(prefix):
+    bucket = boto3.resource('s3', region_name='us-east-1').Bucket(bucket_name)
+    return sorted(obj.key for obj in bucket.objects.filter(Prefix=prefix))
+
+### TESTS ###
+def test_background_upload(tmp_path):
+    """Tests files are uploaded as they are submitted and metadata.json only on finish.
+    """
+    (tmp_path / 'test').mkdir()
+    (tmp_path / 'test' / 'image_0.png').write_bytes(b'0')
+    (tmp_path / 'metadata.json').write_text('{}')
+    uploader = BackgroundUploader(bucket_name, 'pipelined', tmp_path, num_threads=2)
+    uploader.submit(tmp_path)
+    for future in uploader._futures:
+        future.result()
+    assert list_keys('pipelined') == ['pipelined/test/image_0.png']
+    # written after the last submit, picked up by finish
+    (tmp_path / 'extra.txt').write_text('extra')
+    assert uploader.finish() == 3
+    assert list_keys('pipelined') == ['pipelined/extra.txt', 'pipelined/metadata.json', 'pipelined/test/image_0.png']
+
+def test_background_upload_skips_unchanged(tmp_path):
+    """Tests files submitted twice without changes are only uploaded once.
+    """
+    (tmp_path / 'a.txt').write_text('a')
+    uploader = BackgroundUploader(bucket_name, 'unchanged', tmp_path)
+    uploader.submit(tmp_path / 'a.txt')
+    uploader.submit(tmp_path)
+    assert uploader.finish() == 1
+
+def test_imageset_stager(tmp_path):
+    """Tests only missing files of the given images are fetched, skipping files not on S3.
+    """
+    bucket = boto3.resource('s3', region_name='us-east-1').Bucket(bucket_name)
+    for i in range(3):
+        bucket.put_object(Key=f'staged/image_{i}.png', Body=b'0')
+        bucket.put_object(Key=f'staged/meta_{i}.json', Body=b'{}')
+    imageset_path = tmp_path / 'staged'
+    imageset_path.mkdir()
+    (imageset_path / 'meta_0.json').write_text('{}')
+    stager = ImagesetStager(bucket_name, num_threads=2)
+    stager.fetch([(imageset_path, '0'), (imageset_path, '2')],
+                    [('image_', '.png'), ('meta_', '.json'), ('mask_', '.png')])
+    assert stager.num_fetched == 3
+    assert sorted(path.name for path in imageset_path.iterdir()) == \
+        ['image_0.png', 'image_2.png', 'meta_0.json', 'meta_2.json']
+
+def test_artifact_watcher(tmp_path):
+    """Tests only settled files are uploaded while watching and the rest on finish,
+    with excluded files never uploaded.
+    """
+    (tmp_path / 'logs').mkdir()
+    (tmp_path / 'logs' / 'events.log').write_text('0')
+    (tmp_path / 'logs' / 'weights.ckpt').write_bytes(b'0')
+    (tmp_path / 'model.pb').write_bytes(b'0')
+    watcher = ArtifactWatcher(bucket_name, 'extras/watched', tmp_path, interval=3600, exclude=['*.ckpt'])
+    watcher.add_exclude(tmp_path / 'model.pb')
+    watcher.poll()
+    assert watcher.uploader.num_uploaded == 0
+    watcher.poll()
+    for future in watcher.uploader._futures:
+        future.result()
+    assert list_keys('extras/watched') == ['extras/watched/logs/events.log']
+    (tmp_path / 'logs' / 'events.log').write_text('01')
+    (tmp_path / 'checkpoint').write_bytes(b'0')
+    assert watcher.finish(exclude=[tmp_path / 'model.pb']) == 3
+    assert list_keys('extras/watched') == ['extras/watched/checkpoint', 'extras/watched/logs/events.log']
+
+def test_upload_files_to_s3(tmp_path):
+    """Tests a batch of files, including a multipart one, is uploaded.
+    """
+    (tmp_path / 'model.pb').write_bytes(b'0' * (6 * 1024 * 1024))
+    (tmp_path / 'extra.txt').write_text('0')
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(aws, 'MULTIPART_THRESHOLD', 5 * 1024 * 1024)
+        mp.setattr(aws, 'MULTIPART_CHUNKSIZE', 5 * 1024 * 1024)
+        aws.upload_files_to_s3([(tmp_path / 'model.pb', 'batch/model.pb'), (tmp_path / 'extra.txt', 'batch/extra.txt')],
+                                bucket_name=bucket_name)
+    assert list_keys('batch') == ['batch/extra.txt', 'batch/model.pb']
+
+def test_upload_files_content_addressed(tmp_path, monkeypatch):
+    """Tests identical files are stored once and each key gets a pointer to its blob.
+    """
+    monkeypatch.setattr(local_cache, 'RAVENML_LOCAL_STORAGE_PATH', tmp_path / 'cache')
+    (tmp_path / 'backbone.pb').write_bytes(b'backbone')
+    (tmp_path / 'copy.pb').write_bytes(b'backbone')
+    (tmp_path / 'model.pb').write_bytes(b'model')
+    pointers = aws.upload_files_content_addressed([(tmp_path / 'backbone.pb', 'extras/a/backbone.pb'),
+                                                    (tmp_path / 'copy.pb', 'extras/a/copy.pb')], bucket_name=bucket_name)
+    assert len(list_keys('blobs/')) == 1
+    assert pointers['extras/a/backbone.pb'] == pointers['extras/a/copy.pb']
+    # a second run only uploads the new file
+    aws.upload_files_content_addressed([(tmp_path / 'backbone.pb', 'extras/b/backbone.pb'),
+                                        (tmp_path / 'model.pb', 'models/b.pb')], bucket_name=bucket_name)
+    assert len(list_keys('blobs/')) == 2
+    pointer = boto3.client('s3', region_name='us-east-1').get_object(Bucket=bucket_name, Key='models/b.pb' + aws.POINTER_SUFFIX)
+    blob_key = json.loads(pointer['Body'].read())['blob']
+    blob = boto3.client('s3', region_name='us-east-1').get_object(Bucket=bucket_name, Key=blob_key)
+    assert blob['Body'].read() == b'model'
+
+def test_download_file_content_addressed(tmp_path, monkeypatch):
+    """Tests pointers are resolved to their blob and plain keys are downloaded as is.
+    """
+    monkeypatch.setattr(local_cache, 'RAVENML_LOCAL_STORAGE_PATH', tmp_path / 'cache')
+    (tmp_path / 'final.ckpt').write_bytes(b'checkpoint')
+    aws.upload_files_content_addressed([(tmp_path / 'final.ckpt', 'extras/c/final.ckpt')], bucket_name=bucket_name)
+    path = aws.download_file_content_addressed('extras/c/final.ckpt', tmp_path / 'out' / 'final.ckpt',
+                                               bucket_name=bucket_name)
+    assert path.read_bytes() == b'checkpoint'
+
+    aws.upload_files_to_s3([(tmp_path / 'final.ckpt', 'extras/d/final.ckpt')], bucket_name=bucket_name)
+    path = aws.download_file_content_addressed('extras/d/final.ckpt', tmp_path / 'plain.ckpt', bucket_name=bucket_name)
+    assert path.read_bytes() == b'checkpoint'
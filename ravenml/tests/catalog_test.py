@@ -0,0 +1,88 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Tests the local metadata catalog.
+"""
+
+import pytest
+import json
+import boto3
+from moto import mock_s3
+from botocore.exceptions import ClientError
+from ravenml.utils.local_cache import RMLCache
+from ravenml.utils.catalog import MetadataCatalog
+
+### SETUP ###
+mock = mock_s3()
+bucket_name = 'test-catalog-bucket'
+
+def setup_module():
+    """ Sets up the module for testing.
+    """
+    mock.start()
+    bucket = boto3.resource('s3', region_name='us-east-1').create_bucket(Bucket=bucket_name)
+    bucket.put_object(Key='set_a/metadata.json', Body=json.dumps({'name': 'a'}))
+    bucket.put_object(Key='set_b/meta_0.json', Body=json.dumps({'pose': 0}))
+    bucket.put_object(Key='set_b/image_0.png', Body=b'0')
+
+def teardown_module():
+    """ Tears down the module after testing.
+    """
+    mock.stop()
+
+@pytest.fixture
+def catalog(tmp_path):
+    cache = RMLCache()
+    cache.path = tmp_path
+    return MetadataCatalog(bucket_name, cache, fallback_prefix='meta_')
+
+### TESTS ###
+def test_refresh(catalog, tmp_path):
+    """Tests every name is cataloged, falling back to image metadata, and written to the cache.
+    """
+    assert catalog.refresh() == {'set_a': {'name': 'a'}, 'set_b': {'pose': 0}}
+    assert json.load(open(tmp_path / 'set_a' / 'metadata.json')) == {'name': 'a'}
+
+def test_revalidation_only_downloads_changes(catalog, monkeypatch):
+    """Tests a sweep revalidates only metadata the bucket listing shows changed, and
+    single names are revalidated with conditional GETs.
+    """
+    catalog.refresh()
+    fetches = []
+    original_fetch = catalog._fetch
+    def fetch(key, etag=None):
+        result = original_fetch(key, etag)
+        fetches.append((key, etag is not None, result is not None and result[2] is not None))
+        return result
+    monkeypatch.setattr(catalog, '_fetch', fetch)
+    assert catalog.refresh() == {'set_a': {'name': 'a'}, 'set_b': {'pose': 0}}
+    assert fetches == []
+    assert catalog.get('set_b') == {'pose': 0}
+    assert ('set_b/meta_0.json', True, False) in fetches
+
+    boto3.resource('s3', region_name='us-east-1').Bucket(bucket_name).put_object(
+        Key='set_a/metadata.json', Body=json.dumps({'name': 'changed'}))
+    fetches.clear()
+    assert catalog.refresh()['set_a'] == {'name': 'changed'}
+    assert fetches == [('set_a/metadata.json', True, True)]
+    fetches.clear()
+    assert catalog.get('set_a') == {'name': 'changed'}
+    assert fetches == [('set_a/metadata.json', True, False)]
+
+def test_refresh_skips_unreadable(catalog, monkeypatch):
+    """Tests a name whose metadata cannot be read is skipped without failing the sweep.
+    """
+    original_fetch = catalog._fetch
+    def fetch(key, etag=None):
+        if key.startswith('set_a/'):
+            raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'GetObject')
+        return original_fetch(key, etag)
+    monkeypatch.setattr(catalog, '_fetch', fetch)
+    assert catalog.refresh() == {'set_a': None, 'set_b': {'pose': 0}}
+
+def test_get_missing(catalog):
+    """Tests names without metadata raise a KeyError.
+    """
+    with pytest.raises(KeyError):
+        catalog.get('missing_set')
@@ -8,6 +8,9 @@ when they are running inside a test.
 More info here: https://docs.pytest.org/en/2.7.3/plugins.html?highlight=re
 """
 
+import pytest
+from ravenml.data.interfaces import CreateInput
+
 def pytest_configure(config):
     import sys
 
@@ -18,3 +21,28 @@ def pytest_unconfigure(config):
     import sys
 
     del sys._called_from_test 
+
+@pytest.fixture
+def create_input(tmp_path):
+    """Builds the CreateInput of a local dataset build written to 'datasets' in the
+    test directory, with every prompt answered by its config.
+
+    Returns:
+        function: takes the imageset paths, dataset name and any further config fields
+    """
+    def make(imagesets: list = (), dataset_name: str = 'written', **config) -> CreateInput:
+        config = {
+            'local': True,
+            'imageset': [str(imageset) for imageset in imagesets],
+            'dataset_path': str(tmp_path / 'datasets'),
+            'dataset_name': dataset_name,
+            'metadata': {'created_by': 'tester', 'comments': 'test dataset'},
+            'plugin': {'test': True},
+            'seed': 0,
+            'upload': False,
+            'delete_local': False,
+            'overwrite_local': True,
+            **config
+        }
+        return CreateInput(config, 'test')
+    return make
@@ -0,0 +1,68 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Tests the persistent construction cache used for incremental dataset rebuilds.
+"""
+
+import pytest
+import json
+import ravenml.utils.local_cache as local_cache
+from pathlib import Path
+from ravenml.data.write_dataset import DefaultDatasetWriter
+
+### SETUP ###
+@pytest.fixture(autouse=True)
+def storage_path(tmp_path, monkeypatch):
+    """Keeps the construction cache inside the test directory."""
+    monkeypatch.setattr(local_cache, 'RAVENML_LOCAL_STORAGE_PATH', tmp_path / 'storage')
+
+class CountingWriter(DefaultDatasetWriter):
+    """Writer constructing each image_id's metadata, counting constructions."""
+    def construct(self, image_id):
+        self.constructed.append(image_id[1])
+        with open(image_id[0] / f'meta_{image_id[1]}.json', 'r') as f:
+            return json.load(f)
+
+@pytest.fixture
+def make_writer(create_input):
+    def make(imageset: Path, plugin_config: dict):
+        writer = CountingWriter(create_input([imageset], plugin=plugin_config, construction_cache=True))
+        writer.load_image_ids(('meta_', '.json'))
+        writer.constructed = []
+        return writer
+    return make
+
+### TESTS ###
+def test_construction_cache(tmp_path, make_writer):
+    """Tests unchanged images are reused from the cache, while changed metadata or
+    plugin config invalidates the affected entries.
+    """
+    imageset = tmp_path / 'imageset'
+    imageset.mkdir()
+    for i in range(3):
+        (imageset / f'meta_{i}.json').write_text(json.dumps({'tags': [str(i)]}))
+
+    writer = make_writer(imageset, {'size': 1})
+    writer.construct_all()
+    assert sorted(writer.constructed) == ['0', '1', '2']
+    assert (writer.construction_cache.hits, writer.construction_cache.misses) == (0, 3)
+
+    # a rebuild with nothing changed constructs nothing
+    writer = make_writer(imageset, {'size': 1})
+    writer.construct_all()
+    assert writer.constructed == []
+    assert writer.construction_cache.hits == 3
+    assert writer.obj_dict[(imageset, '1')] == {'tags': ['1']}
+
+    # changed metadata only invalidates its own image
+    (imageset / 'meta_1.json').write_text(json.dumps({'tags': ['changed']}))
+    writer = make_writer(imageset, {'size': 1})
+    writer.construct_all()
+    assert writer.constructed == ['1']
+    assert writer.obj_dict[(imageset, '1')] == {'tags': ['changed']}
+
+    # a changed plugin config invalidates every image
+    writer = make_writer(imageset, {'size': 2})
+    writer.construct_all()
+    assert sorted(writer.constructed) == ['0', '1', '2']
@@ -5,7 +5,6 @@ Date Created:   04/06/19
 Tests the ravenml data command group.
 """
 
-import pytest
 import boto3
 import os
 import click
@@ -17,6 +16,7 @@ from ravenml.data.commands import data as data_cmd_group
 from ravenml.utils.config import get_config
 from ravenml.utils.local_cache import RMLCache
 from ravenml.utils.dataset import dataset_cache
+from ravenml.utils.hashing import write_checksum_manifest
 
 # TODO: add imageset tests and tests for the -p and -f flags on list commands (not just -e)
 
@@ -92,3 +92,39 @@ def test_inspect_dataset_invalid_dataset_name():
     """
     result = runner.invoke(data_cmd_group, ['inspect-dataset', 'bad_dataset_name'])
     assert result.exit_code == click.exceptions.BadParameter.exit_code
+
+def test_verify_dataset():
+    """Tests the verify subcommand re-fetches corrupt and missing files.
+    """
+    # build a dataset in the cache, checksum it and upload it
+    dataset_path = dataset_cache.path / 'test_dataset_3'
+    os.makedirs(dataset_path / 'test', exist_ok=True)
+    copyfile(test_data_dir / Path('test_metadata_1.json'), dataset_path / 'metadata.json')
+    (dataset_path / 'test' / 'image_0.png').write_bytes(b'image 0')
+    (dataset_path / 'test' / 'image_1.png').write_bytes(b'image 1')
+    write_checksum_manifest(dataset_path)
+    bucket = boto3.resource('s3', region_name='us-east-1').Bucket(get_config()['dataset_bucket_name'])
+    for path in dataset_path.rglob('*'):
+        if path.is_file():
+            bucket.upload_file(str(path), 'test_dataset_3/' + path.relative_to(dataset_path).as_posix())
+
+    result = runner.invoke(data_cmd_group, ['verify', 'test_dataset_3'])
+    assert result.exit_code == 0
+    assert 'verified' in result.output
+
+    # truncate one file and delete another
+    (dataset_path / 'test' / 'image_0.png').write_bytes(b'image')
+    (dataset_path / 'test' / 'image_1.png').unlink()
+    result = runner.invoke(data_cmd_group, ['verify', 'test_dataset_3', '--no-fetch'])
+    assert 'test/image_0.png\ntest/image_1.png\n' in result.output
+    assert not (dataset_path / 'test' / 'image_1.png').exists()
+    result = runner.invoke(data_cmd_group, ['verify', 'test_dataset_3'])
+    assert result.exit_code == 0
+    assert (dataset_path / 'test' / 'image_0.png').read_bytes() == b'image 0'
+    assert (dataset_path / 'test' / 'image_1.png').read_bytes() == b'image 1'
+
+def test_verify_dataset_not_cached():
+    """Tests the verify subcommand with a dataset that is not cached.
+    """
+    result = runner.invoke(data_cmd_group, ['verify', 'bad_dataset_name'])
+    assert result.exit_code == click.exceptions.BadParameter.exit_code
@@ -0,0 +1,82 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Tests the ravenml data helpers used to split datasets.
+"""
+
+import pytest
+import numpy as np
+from ravenml.data.helpers import split_data, split_indices, assign_splits, assign_folds
+
+### TESTS ###
+def test_split_data_is_reproducible():
+    """Tests that the same seed always produces the same split.
+    """
+    objects = list(range(100))
+    assert split_data(objects, test_percent=.2, seed=7) == split_data(objects, test_percent=.2, seed=7)
+    assert objects == list(range(100))
+
+def test_split_indices_partition():
+    """Tests that test and dev indices partition all indices.
+    """
+    test, dev = split_indices(50, test_percent=.2, seed=1)
+    assert len(test) == 10
+    assert sorted(np.concatenate((test, dev)).tolist()) == list(range(50))
+
+def test_split_indices_stratified():
+    """Tests that every group contributes its share of the test set.
+    """
+    groups = ['a'] * 80 + ['b'] * 20
+    test, _ = split_indices(100, test_percent=.25, seed=3, groups=groups)
+    test_groups = [groups[i] for i in test]
+    assert test_groups.count('a') == 20
+    assert test_groups.count('b') == 5
+
+def test_split_indices_many_small_groups():
+    """Tests that small groups still add up to the overall test and validation sizes.
+    """
+    groups = [i % 300 for i in range(1000)]
+    test, _ = split_indices(1000, test_percent=.2, seed=0, groups=groups)
+    assert len(test) == 200
+    # no group gives up more than its share rounded up
+    test_sizes = np.bincount([groups[i] for i in test], minlength=300)
+    group_sizes = np.bincount(groups)
+    assert (test_sizes <= np.ceil(group_sizes * .2)).all()
+    assignments = assign_splits(1000, test_percent=.2, seed=0, groups=groups)
+    assert (assignments == 'test').sum() == 200
+    assert (assignments == 'validation').sum() == 160
+
+def test_assign_splits_counts():
+    """Tests the two level test/validation/train assignment.
+    """
+    assignments = assign_splits(100, test_percent=.2, seed=0)
+    assert (assignments == 'test').sum() == 20
+    assert (assignments == 'validation').sum() == 16
+    assert (assignments == 'train').sum() == 64
+
+def test_assign_folds_balanced():
+    """Tests that folds cover all objects with sizes differing by at most one.
+    """
+    folds = assign_folds(23, 5, seed=2)
+    sizes = np.bincount(folds, minlength=5)
+    assert sizes.sum() == 23
+    assert sizes.max() - sizes.min() <= 1
+
+def test_assign_folds_stratified_balanced():
+    """Tests that stratified folds are balanced within each group and overall, even
+    when every group leaves objects over.
+    """
+    groups = ['a'] * 7 + ['b'] * 7 + ['c'] * 7
+    folds = assign_folds(21, 5, seed=0, groups=groups)
+    sizes = np.bincount(folds, minlength=5)
+    assert sizes.max() - sizes.min() <= 1
+    for group in 'abc':
+        group_sizes = np.bincount(folds[np.array(groups) == group], minlength=5)
+        assert group_sizes.max() - group_sizes.min() <= 1
+
+def test_assign_folds_too_many():
+    """Tests that asking for more folds than objects fails.
+    """
+    with pytest.raises(Exception):
+        assign_folds(3, 5)
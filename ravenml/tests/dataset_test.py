@@ -0,0 +1,251 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Tests reading datasets through the ravenml Dataset interface.
+"""
+
+import pytest
+import os
+import click
+import json
+import time
+import shutil
+import threading
+from pathlib import Path
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from ravenml.data.interfaces import CreateInput, Dataset
+from ravenml.data.write_dataset import DefaultDatasetWriter
+from ravenml.utils.pack import is_pack_complete, PACK_DIR
+import ravenml.utils.dataset as dataset_utils
+
+### SETUP ###
+test_dir = Path(os.path.dirname(__file__))
+test_path = test_dir / '.testing_dataset'
+imageset_path = test_path / 'imageset'
+dataset_name = 'virtual_dataset'
+num_images = 20
+dataset_dir = test_path / 'datasets' / dataset_name
+
+def setup_module():
+    """ Sets up the module for testing by writing a small dataset with virtual splits.
+    """
+    os.makedirs(imageset_path)
+    for i in range(num_images):
+        (imageset_path / f'image_{i}.png').write_bytes(bytes([i]) * (i + 1))
+        (imageset_path / f'meta_{i}.json').write_text(json.dumps({'tags': ['a']}))
+
+    config = {'local': True, 'imageset': [str(imageset_path)], 'dataset_path': str(dataset_dir.parent),
+              'dataset_name': dataset_name, 'metadata': {'created_by': 'tester', 'comments': 'test dataset'},
+              'plugin': {'test': True}, 'kfolds': 2, 'seed': 0, 'virtual_splits': True,
+              'upload': False, 'delete_local': False}
+    writer = DefaultDatasetWriter(CreateInput(config, 'test'))
+    writer.load_image_ids(('meta_', '.json'))
+    writer.write_dataset([('image_', '.png'), ('meta_', '.json')])
+
+def teardown_module():
+    """ Tears down the module after testing.
+    """
+    shutil.rmtree(test_path)
+
+
+### TESTS ###
+def test_virtual_split_image_ids():
+    """Tests that the virtual splits partition all images.
+    """
+    dataset = Dataset(dataset_name, {}, dataset_dir)
+    image_ids = []
+    for split in ['test', 'train', 'validation']:
+        image_ids += dataset.get_split_image_ids(split)
+    assert sorted(image_ids) == sorted(('imageset', str(i)) for i in range(num_images))
+    assert not (dataset_dir / 'test').exists()
+
+def test_virtual_split_files():
+    """Tests that split image_ids resolve to the files stored once in the data directory.
+    """
+    dataset = Dataset(dataset_name, {}, dataset_dir)
+    files = dataset.get_split_files('test')
+    assert len(files) == 2 * len(dataset.get_split_image_ids('test'))
+    assert all(f.parent == dataset_dir / 'data' for f in files)
+
+def test_virtual_split_folds():
+    """Tests that folds are read back from their manifests.
+    """
+    dataset = Dataset(dataset_name, {}, dataset_dir)
+    assert dataset.get_num_folds() == 2
+    fold = dataset.get_split_image_ids('validation', fold=0) + dataset.get_split_image_ids('validation', fold=1)
+    dev = dataset.get_split_image_ids('train') + dataset.get_split_image_ids('validation')
+    assert sorted(fold) == sorted(dev)
+    with pytest.raises(ValueError):
+        dataset.get_fold(2)
+
+def test_file_index():
+    """Tests that the file index is built, persisted and used for lookups.
+    """
+    dataset = Dataset(dataset_name, {}, dataset_dir)
+    assert dataset.lookup_files('3') == [dataset_dir / 'data' / 'image_3.png',
+                                         dataset_dir / 'data' / 'meta_3.json']
+    assert dataset.count_files('test') + dataset.count_files('train') + dataset.count_files('validation') == 2 * num_images
+    assert sorted(dataset.list_files('test')) == sorted(dataset.get_split_files('test'))
+    assert (dataset_dir / 'file_index.json').exists()
+
+    # a new Dataset loads the stored index instead of scanning
+    reloaded = Dataset(dataset_name, {}, dataset_dir)
+    assert reloaded.file_index == dataset.file_index
+    assert reloaded.count_files() == dataset.count_files()
+
+def test_iter_examples():
+    """Tests that batches cover a split once, grouped by image_id, in a reproducible order.
+    """
+    dataset = Dataset(dataset_name, {}, dataset_dir)
+    batches = list(dataset.iter_examples('train', batch_size=3, shuffle_seed=1, num_threads=2, prefetch=1))
+    assert all(len(batch) == 3 for batch in batches[:-1])
+    examples = [example for batch in batches for example in batch]
+    assert sorted(image_id for image_id, _ in examples) == sorted(image_id for _, image_id in dataset.get_split_image_ids('train'))
+    for image_id, files in examples:
+        i = int(image_id)
+        assert files[f'data/image_{i}.png'] == bytes([i]) * (i + 1)
+        assert f'data/meta_{i}.json' in files
+    assert [example[0] for example in examples] == \
+        [example[0] for batch in dataset.iter_examples('train', batch_size=5, shuffle_seed=1) for example in batch]
+
+def test_iter_examples_mmap_and_early_stop():
+    """Tests that large files are memory mapped and iteration can stop early.
+    """
+    dataset = Dataset(dataset_name, {}, dataset_dir)
+    iterator = dataset.iter_examples('test', batch_size=1, mmap_threshold=2)
+    image_id, files = next(iterator)[0]
+    i = int(image_id)
+    assert bytes(files[f'data/image_{i}.png']) == bytes([i]) * (i + 1)
+    iterator.close()
+
+def test_iter_examples_close_while_full():
+    """Tests that closing the iterator early returns while the producer is blocked on a full queue.
+    """
+    dataset = Dataset(dataset_name, {}, dataset_dir)
+    iterator = dataset.iter_examples('test', batch_size=2, prefetch=1)
+    assert len(dataset.get_split_image_ids('test')) == 4
+    next(iterator)
+    # let the producer fill the queue and block on its next put
+    time.sleep(.3)
+    closer = threading.Thread(target=iterator.close, daemon=True)
+    closer.start()
+    closer.join(timeout=5)
+    assert not closer.is_alive()
+
+def test_pack(tmp_path):
+    """Tests that a packed dataset reads the same contents through memory mapped blobs.
+    """
+    shutil.copytree(dataset_dir, tmp_path / dataset_name)
+    dataset = Dataset(dataset_name, {}, tmp_path / dataset_name)
+    index = dataset.pack(max_blob_bytes=64, remove_files=True)
+    assert len(index['blobs']) > 1
+    assert dataset.is_packed
+    assert not (tmp_path / dataset_name / 'data' / 'image_3.png').exists()
+    # path based lookups still resolve files that only exist in the pack
+    unpacked = Dataset(dataset_name, {}, dataset_dir)
+    assert [path.relative_to(dataset.path) for path in dataset.get_split_files('test')] == \
+        [path.relative_to(unpacked.path) for path in unpacked.get_split_files('test')]
+    assert all(bytes(dataset.read_file(path.relative_to(dataset.path).as_posix())) == path2.read_bytes()
+                for path, path2 in zip(dataset.get_split_files('test'), unpacked.get_split_files('test')))
+    # manifests are left unpacked
+    assert dataset.get_split_image_ids('test') == Dataset(dataset_name, {}, dataset_dir).get_split_image_ids('test')
+
+    files = dataset.read_image_files('3')
+    assert isinstance(files['data/image_3.png'], memoryview)
+    assert files['data/image_3.png'] == bytes([3]) * 4
+    assert json.loads(bytes(files['data/meta_3.json'])) == {'tags': ['a']}
+    assert dataset.count_files() == Dataset(dataset_name, {}, dataset_dir).count_files()
+    batch = next(dataset.iter_examples('train', batch_size=2))
+    assert all(len(files) == 2 for _, files in batch)
+
+def test_ensure_packed_dataset(tmp_path, monkeypatch):
+    """Tests a packed dataset is only considered downloaded when every blob is complete.
+    """
+    shutil.copytree(dataset_dir, tmp_path / dataset_name)
+    Dataset(dataset_name, {}, tmp_path / dataset_name).pack(max_blob_bytes=64)
+    synced = []
+    monkeypatch.setattr(dataset_utils.dataset_cache, 'path', tmp_path)
+    monkeypatch.setattr(dataset_utils, 'get_config', lambda: {dataset_utils.BUCKET_FIELD: 'bucket'})
+    monkeypatch.setattr(dataset_utils, 'download_prefix', lambda bucket, name, cache: synced.append(name) or True)
+    assert is_pack_complete(tmp_path / dataset_name)
+    dataset_utils._ensure_dataset(dataset_name)
+    assert synced == []
+
+    # an interrupted sync can leave the index next to truncated or missing blobs
+    blob = tmp_path / dataset_name / PACK_DIR / 'blob-00001.bin'
+    blob.write_bytes(blob.read_bytes()[:-1])
+    assert not is_pack_complete(tmp_path / dataset_name)
+    dataset_utils._ensure_dataset(dataset_name)
+    blob.unlink()
+    assert not is_pack_complete(tmp_path / dataset_name)
+    dataset_utils._ensure_dataset(dataset_name)
+    assert synced == [dataset_name, dataset_name]
+
+def test_wait_ready():
+    """Tests that a dataset still downloading waits for the download before being read.
+    """
+    ready = Future()
+    dataset = Dataset(dataset_name, {}, dataset_dir, ready=ready)
+    with pytest.raises(FutureTimeoutError):
+        dataset.wait_ready(timeout=0)
+    ready.set_result(None)
+    assert dataset.get_split_image_ids('test') == Dataset(dataset_name, {}, dataset_dir).get_split_image_ids('test')
+
+    failed = Future()
+    failed.set_exception(ValueError(dataset_name))
+    with pytest.raises(click.exceptions.BadParameter):
+        Dataset(dataset_name, {}, dataset_dir, ready=failed).path
+
+def test_file_index_image_ids_with_separators(tmp_path, create_input):
+    """Tests that image_ids containing '_' and '.' are indexed under the right image_id.
+    """
+    image_ids = ['a_1', '2.5', 'b_c.d', '7']
+    imageset = tmp_path / 'imageset'
+    imageset.mkdir()
+    for image_id in image_ids:
+        (imageset / f'image_{image_id}.png').write_bytes(b'x')
+        (imageset / f'meta_{image_id}.json').write_text(json.dumps({'tags': ['a']}))
+    writer = DefaultDatasetWriter(create_input([imageset], 'separators', test_percent=.5, virtual_splits=True))
+    writer.load_image_ids(('meta_', '.json'))
+    writer.write_dataset([('image_', '.png'), ('meta_', '.json')])
+
+    dataset = Dataset('separators', {}, tmp_path / 'datasets' / 'separators')
+    for image_id in image_ids:
+        assert dataset.lookup_files(image_id) == [tmp_path / 'datasets' / 'separators' / 'data' / f'image_{image_id}.png',
+                                                  tmp_path / 'datasets' / 'separators' / 'data' / f'meta_{image_id}.json']
+    assert sum(dataset.count_files(split) for split in ['test', 'train', 'validation']) == 2 * len(image_ids)
+    examples = [image_id for split in ['test', 'train', 'validation']
+                    for batch in dataset.iter_examples(split) for image_id, _ in batch]
+    assert sorted(examples) == sorted(image_ids)
+
+def test_file_index_split_layout(tmp_path):
+    """Tests that files of a dataset without virtual splits are indexed under the split
+    they were written as, that shards belong to no image, and that numeric image_ids
+    only match whole parts of a name.
+    """
+    root = tmp_path / 'layout'
+    image_ids = [['imageset', str(i)] for i in range(3)]
+    files = ['test/image_0.png', 'test/meta_0.json', 'splits/complete/train/label_map.pbtxt',
+             'splits/complete/train/train-00000-of-00002/train.record-00000-of-00002',
+             'splits/complete/train/test-00001-of-00002/test.record-00001-of-00002',
+             'splits/complete/train/train-00000-of-00002/image_1.png']
+    for relative_path in files:
+        (root / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (root / relative_path).write_bytes(b'x')
+    (root / 'metadata.json').write_text('{}')
+
+    # without recorded prefix-suffix pairs only whole parts of a name match
+    index = {entry[0]: entry[2:] for entry in
+                Dataset('layout', {'image_ids': image_ids}, root).build_file_index()}
+    assert index['test/image_0.png'] == ['test', '0']
+    assert index['splits/complete/train/label_map.pbtxt'] == [None, None]
+    assert index['splits/complete/train/train-00000-of-00002/train.record-00000-of-00002'] == ['train', None]
+    assert index['splits/complete/train/test-00001-of-00002/test.record-00001-of-00002'] == ['validation', None]
+    assert index['splits/complete/train/train-00000-of-00002/image_1.png'] == ['train', None]
+
+    # with recorded pairs only those are matched
+    metadata = {'image_ids': image_ids, 'associated_files': [['image_', '.png']]}
+    index = {entry[0]: entry[2:] for entry in Dataset('layout', metadata, root).build_file_index()}
+    assert index['test/image_0.png'] == ['test', '0']
+    assert index['test/meta_0.json'] == ['test', None]
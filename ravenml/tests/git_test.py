@@ -0,0 +1,64 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Tests the ravenml git provenance utilities.
+"""
+
+import subprocess
+from pathlib import Path
+import ravenml.utils.git as git
+
+### SETUP ###
+def make_repo(path: Path):
+    subprocess.run(['git', 'init', '-q', str(path)], check=True)
+    (path / 'tracked.txt').write_text('one\n')
+    subprocess.run(['git', '-C', str(path), 'add', 'tracked.txt'], check=True)
+    subprocess.run(['git', '-C', str(path), '-c', 'user.name=test', '-c', 'user.email=test@test',
+        'commit', '-q', '-m', 'init'], check=True)
+
+### TESTS ###
+def test_collect_git_info(tmp_path):
+    """Tests git info collection for a repo with tracked and untracked changes.
+    """
+    make_repo(tmp_path)
+    (tmp_path / 'tracked.txt').write_text('two\n')
+    (tmp_path / 'untracked.txt').write_text('new\n')
+    info = git.collect_git_info(tmp_path, 'plugin')
+    assert len(info['plugin_git_sha']) == 40
+    assert '+two' in info['plugin_tracked_git_patch']
+    assert '+new' in info['plugin_untracked_git_patch']
+    # cwd is never changed
+    assert Path.cwd() != tmp_path
+
+def test_collect_git_info_cached(tmp_path):
+    """Tests git info is reused until HEAD or the index changes.
+    """
+    make_repo(tmp_path)
+    first = git.collect_git_info(tmp_path, 'ravenml')
+    key = git._cache_key(tmp_path)
+    assert key in git._git_info_cache
+    assert git.collect_git_info(tmp_path, 'plugin')['plugin_git_sha'] == first['ravenml_git_sha']
+    subprocess.run(['git', '-C', str(tmp_path), '-c', 'user.name=test', '-c', 'user.email=test@test',
+        'commit', '-q', '--allow-empty', '-m', 'second'], check=True)
+    assert git._cache_key(tmp_path) != key
+    assert git.collect_git_info(tmp_path, 'ravenml')['ravenml_git_sha'] != first['ravenml_git_sha']
+
+def test_encode_patch():
+    """Tests small patches are untouched and large patches are capped and compressed.
+    """
+    assert git.encode_patch('small') == 'small'
+    large = 'x' * (git.PATCH_MAX_BYTES + 10)
+    encoded = git.encode_patch(large)
+    assert encoded.startswith(git.COMPRESSED_PATCH_PREFIX)
+    assert len(encoded) < git.PATCH_COMPRESS_BYTES
+    decoded = git.decode_patch(encoded)
+    assert decoded.endswith(git.TRUNCATED_PATCH_MARKER)
+    assert len(decoded) == git.PATCH_MAX_BYTES + len(git.TRUNCATED_PATCH_MARKER)
+
+def test_find_module_dir():
+    """Tests the calling module's directory is found.
+    """
+    def caller():
+        return git.find_module_dir()
+    assert caller() == Path(__file__).resolve().parent
@@ -0,0 +1,54 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Tests content hashing and duplicate image detection.
+"""
+
+import pytest
+import json
+import ravenml.utils.local_cache as local_cache
+import ravenml.utils.hashing as hashing
+from pathlib import Path
+from ravenml.data.write_dataset import DefaultDatasetWriter
+
+### SETUP ###
+@pytest.fixture(autouse=True)
+def storage_path(tmp_path, monkeypatch):
+    """Keeps the hash index inside the test directory."""
+    monkeypatch.setattr(local_cache, 'RAVENML_LOCAL_STORAGE_PATH', tmp_path / 'storage')
+
+def make_imageset(path: Path, contents: list):
+    path.mkdir()
+    for i, content in enumerate(contents):
+        (path / f'image_{i}.png').write_bytes(content)
+        (path / f'meta_{i}.json').write_text(json.dumps({'imageset': path.name}))
+    return path
+
+### TESTS ###
+def test_hash_files_reuses_index(tmp_path, monkeypatch):
+    """Tests unchanged files are not hashed again and missing files hash to None.
+    """
+    (tmp_path / 'a').write_bytes(b'same')
+    (tmp_path / 'b').write_bytes(b'same')
+    digests = hashing.hash_files([tmp_path / 'a', tmp_path / 'b', tmp_path / 'missing'])
+    assert digests[0] == digests[1] and digests[2] is None
+
+    def fail(path):
+        raise AssertionError('file hashed again')
+    monkeypatch.setattr(hashing, 'hash_file', fail)
+    assert hashing.hash_files([tmp_path / 'a', tmp_path / 'b']) == digests[:2]
+
+@pytest.mark.parametrize('mode', ['drop', 'report'])
+def test_remove_duplicates(tmp_path, mode, create_input):
+    """Tests duplicate images across imagesets are dropped or reported, ignoring metadata files.
+    """
+    set_a = make_imageset(tmp_path / 'set_a', [b'0', b'1', b'2'])
+    set_b = make_imageset(tmp_path / 'set_b', [b'1', b'3'])
+    writer = DefaultDatasetWriter(create_input([set_a, set_b], dedup=mode))
+    writer.load_image_ids(('meta_', '.json'))
+
+    duplicates = writer.remove_duplicates([('image_', '.png'), ('meta_', '.json')])
+    assert duplicates == [((set_b, '0'), (set_a, '1'))]
+    assert writer.filter_metadata['duplicates']['duplicates'] == [['set_b', '0', 'set_a', '1']]
+    assert len(writer.image_ids) == (4 if mode == 'drop' else 5)
@@ -0,0 +1,54 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Tests the ravenml image_id table used while creating datasets.
+"""
+
+from pathlib import Path
+from ravenml.data.image_ids import ImageIdTable, MANIFEST_NAME, write_image_id_manifest, read_image_id_manifest
+
+### SETUP ###
+pairs = [(Path('/sets/b'), str(i)) for i in range(5)] + [(Path('/sets/a'), str(i)) for i in range(3)]
+
+### TESTS ###
+def test_table_behaves_like_pairs():
+    """Tests that the table iterates, indexes and measures like the list of pairs it replaces.
+    """
+    table = ImageIdTable.from_pairs(pairs)
+    assert len(table) == len(pairs)
+    assert sorted(table) == sorted(pairs)
+    assert table[0] == (Path('/sets/b'), '0')
+    assert ImageIdTable.from_pairs(table) is table
+
+def test_table_imageset_slices():
+    """Tests per-imageset counts, including imagesets without images.
+    """
+    table = ImageIdTable.from_pairs(pairs, imageset_paths=[Path('/sets/a'), Path('/sets/c')])
+    assert table.count('a') == 3
+    assert table.count('b') == 5
+    assert table.count('c') == 0
+    assert list(table[table.imageset_slice('a')]) == [(Path('/sets/a'), str(i)) for i in range(3)]
+
+def test_table_sample():
+    """Tests sampling a number of images from each imageset.
+    """
+    table = ImageIdTable.from_pairs(pairs)
+    sampled = table.sample({'a': 2, 'b': 1}, rng=0)
+    assert sampled.count('a') == 2
+    assert sampled.count('b') == 1
+    assert set(sampled).issubset(set(pairs))
+    assert list(sampled) == list(table.sample({'a': 2, 'b': 1}, rng=0))
+
+def test_table_to_pairs():
+    """Tests conversion to (imageset name, image_id) pairs stored in metadata.
+    """
+    table = ImageIdTable.from_pairs(pairs)
+    assert sorted(table.to_pairs()) == sorted((path.name, image_id) for path, image_id in pairs)
+
+def test_manifest_round_trip(tmp_path):
+    """Tests that the compressed image_id manifest reads back every pair.
+    """
+    table = ImageIdTable.from_pairs(pairs + [(Path('/sets/a'), 'image_0001'), (Path('/sets/a'), 'image_0002')])
+    write_image_id_manifest(tmp_path / MANIFEST_NAME, table)
+    assert read_image_id_manifest(tmp_path / MANIFEST_NAME) == sorted(table.to_pairs())
@@ -0,0 +1,78 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Tests the ravenml imageset utilities.
+"""
+
+import pytest
+import json
+import boto3
+from moto import mock_s3
+from click.testing import CliRunner
+from ravenml.data.commands import data as data_cmd_group
+import ravenml.utils.imageset as imageset
+
+### SETUP ###
+mock = mock_s3()
+runner = CliRunner()
+bucket_name = 'test-imageset-bucket'
+
+def setup_module():
+    """ Sets up the module for testing.
+    """
+    mock.start()
+    bucket = boto3.resource('s3', region_name='us-east-1').create_bucket(Bucket=bucket_name)
+    for i, tags in enumerate([['earth'], ['earth', 'sun'], []]):
+        bucket.put_object(Key=f'set_a/meta_{i}.json', Body=json.dumps({'tags': tags}))
+        bucket.put_object(Key=f'set_a/image_{i}.png', Body=b'00')
+    bucket.put_object(Key='set_a/mask_0.png', Body=b'0')
+    bucket.put_object(Key='set_b/image_0.png', Body=b'0')
+    bucket.put_object(Key='set_c/meta_0.json', Body=json.dumps({'tags': ['moon'], 'pose': 0}))
+
+def teardown_module():
+    """ Tears down the module after testing.
+    """
+    mock.stop()
+
+@pytest.fixture(autouse=True)
+def image_bucket(monkeypatch, tmp_path):
+    monkeypatch.setattr(imageset, 'get_config', lambda: {imageset.BUCKET_FIELD: bucket_name})
+    monkeypatch.setattr(imageset.imageset_cache, 'path', tmp_path)
+
+### TESTS ###
+def test_summarize_imageset(tmp_path):
+    """Tests counts are aggregated from image metadata files and uploaded on request.
+    """
+    result = runner.invoke(data_cmd_group, ['summarize-imageset', 'set_a', '-u'])
+    assert result.exit_code == 0
+    metadata = json.loads((tmp_path / 'set_a' / 'metadata.json').read_text())
+    assert metadata['num_images'] == 3
+    assert metadata['num_files'] == 7
+    assert metadata['total_bytes'] == 7 + sum(len(json.dumps({'tags': tags})) for tags in [['earth'], ['earth', 'sun'], []])
+    assert metadata['file_type_counts'] == {'meta_*.json': 3, 'image_*.png': 3, 'mask_*.png': 1}
+    assert metadata['tag_counts'] == {'earth': 2, 'sun': 1, 'untagged': 1}
+    uploaded = boto3.client('s3', region_name='us-east-1').get_object(Bucket=bucket_name, Key='set_a/metadata.json')
+    assert json.loads(uploaded['Body'].read())['num_images'] == 3
+
+def test_summarize_imageset_without_metadata():
+    """Tests imagesets without image metadata files cannot be summarized.
+    """
+    with pytest.raises(ValueError):
+        imageset.summarize_imageset('set_b')
+
+def test_local_summary_is_cataloged():
+    """Tests a summary that is not uploaded replaces the sample image metadata locally.
+    """
+    assert imageset.get_imageset_metadata('set_c') == {'tags': ['moon'], 'pose': 0}
+    imageset.summarize_imageset('set_c')
+    assert imageset.get_imageset_metadata('set_c')['tag_counts'] == {'moon': 1}
+    assert 'pose' not in imageset.get_imageset_metadata('set_c')
+
+def test_get_imageset_metadata_errors():
+    """Tests invalid names raise ValueError and imagesets without metadata files KeyError.
+    """
+    with pytest.raises(ValueError):
+        imageset.get_imageset_metadata('no_such_set')
+    with pytest.raises(KeyError):
+        imageset.get_imageset_metadata('set_b')
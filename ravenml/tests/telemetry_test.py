@@ -0,0 +1,59 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Tests the ravenml resource telemetry sampler.
+"""
+
+import sys
+import subprocess
+import ravenml.utils.telemetry as telemetry
+from ravenml.utils.telemetry import ResourceSampler, TELEMETRY_NAME, FIELDS
+
+### TESTS ###
+def test_resource_sampler(tmp_path):
+    """Tests samples are summarized and written as a time series.
+    """
+    sampler = ResourceSampler(interval=3600)
+    sum(range(10 ** 6))
+    sampler.sample()
+    summary = sampler.stop(tmp_path)
+    if not sampler.supported:
+        assert summary == {'unsupported': True, 'platform': sys.platform}
+        return
+    assert summary['num_samples'] == 2
+    lines = (tmp_path / TELEMETRY_NAME).read_text().splitlines()
+    assert lines[0] == ','.join(FIELDS)
+    assert len(lines) == 3
+    assert summary['rss_mb']['max'] > 0
+    assert 0 <= summary['cpu_percent']['mean'] <= 100
+
+def test_resource_sampler_child_processes():
+    """Tests the memory of child processes is included in the sampled RSS.
+    """
+    sampler = ResourceSampler(interval=3600)
+    if not sampler.supported:
+        return
+    sampler.sample()
+    child = subprocess.Popen([sys.executable, '-c',
+                              'import sys, time; data = bytearray(200 * 1024 ** 2); print(flush=True); time.sleep(30)'],
+                             stdout=subprocess.PIPE)
+    try:
+        child.stdout.readline()
+        sampler.sample()
+    finally:
+        child.kill()
+        child.wait()
+        child.stdout.close()
+    sampler.stop()
+    assert sampler.samples[1][FIELDS.index('rss_mb')] - sampler.samples[0][FIELDS.index('rss_mb')] > 150
+
+def test_resource_sampler_unsupported(tmp_path, monkeypatch):
+    """Tests nothing is sampled or written on platforms without /proc.
+    """
+    monkeypatch.setattr(telemetry.sys, 'platform', 'win32')
+    sampler = ResourceSampler(interval=3600)
+    sampler.sample()
+    assert sampler.stop(tmp_path) == {'unsupported': True, 'platform': 'win32'}
+    assert sampler.samples == []
+    assert not (tmp_path / TELEMETRY_NAME).exists()
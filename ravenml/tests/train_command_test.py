@@ -0,0 +1,91 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Tests the ravenml train command group.
+"""
+
+import pytest
+import json
+import yaml
+import click
+import boto3
+from moto import mock_s3
+from click.testing import CliRunner
+import ravenml.train.commands as train_commands
+import ravenml.train.interfaces as train_interfaces
+from ravenml.train.commands import train as train_cmd_group
+from ravenml.train.interfaces import TrainOutput
+from ravenml.train.options import pass_train
+from ravenml.data.interfaces import Dataset
+from ravenml.utils.aws import ArtifactWatcher
+
+### SETUP ###
+runner = CliRunner()
+
+@click.command()
+@pass_train
+def fake_plugin(ti):
+    with open(ti.artifact_path / 'model.pb', 'w') as f:
+        f.write(str(ti.plugin_config['learning_rate']))
+    return TrainOutput(ti.artifact_path / 'model.pb', [])
+
+@pytest.fixture
+def plugin(monkeypatch, tmp_path):
+    fake_dataset = lambda name, **kwargs: Dataset(name, {'name': name}, tmp_path / name)
+    monkeypatch.setattr(train_commands, 'get_dataset', fake_dataset)
+    monkeypatch.setattr(train_interfaces, 'get_dataset', fake_dataset)
+    monkeypatch.setitem(train_cmd_group.commands, 'fake-plugin', fake_plugin)
+    yield
+    train_cmd_group.commands.pop('fake-plugin', None)
+
+### TESTS ###
+def test_expand_grid():
+    """Tests every combination of grid values becomes a run.
+    """
+    runs = train_commands._expand_grid({'plugin.lr': [1, 2], 'plugin.batch': [8, 16, 32]})
+    assert len(runs) == 6
+    assert runs[0] == {'plugin.lr': 1, 'plugin.batch': 8}
+    assert runs[-1] == {'plugin.lr': 2, 'plugin.batch': 32}
+
+def test_sweep(plugin, tmp_path):
+    """Tests each run of a sweep gets its own artifact path and metadata.
+    """
+    config = {
+        'dataset': 'sweep_dataset',
+        'artifact_path': str(tmp_path / 'artifacts'),
+        'metadata': {'created_by': 'tester', 'comments': 'sweep'},
+        'plugin': {'learning_rate': 0},
+        'ec2_policy': 'keep'
+    }
+    (tmp_path / 'config.yaml').write_text(yaml.safe_dump(config))
+    (tmp_path / 'grid.yaml').write_text(yaml.safe_dump({'plugin.learning_rate': [0.1, 0.01]}))
+    result = runner.invoke(train_cmd_group, ['--config', str(tmp_path / 'config.yaml'), 'sweep', 'fake-plugin',
+                                                '-g', str(tmp_path / 'grid.yaml'), '-j', '2'])
+    assert result.exit_code == 0, result.output
+    for i, learning_rate in enumerate([0.1, 0.01]):
+        run_path = tmp_path / 'artifacts' / f'run_{i:03d}'
+        assert (run_path / 'model.pb').read_text() == str(learning_rate)
+        metadata = json.loads((run_path / 'metadata.json').read_text())
+        assert metadata['sweep'] == {'run': i, 'parameters': {'plugin.learning_rate': learning_rate}}
+    assert 'failed' not in result.output
+
+def test_upload_result_with_watcher(tmp_path, monkeypatch):
+    """Tests extra files the artifact watcher excluded are still uploaded, under the same
+    relative keys the watcher uses, while files it uploaded are not uploaded again.
+    """
+    uploaded = []
+    monkeypatch.setattr(train_commands, 'upload_files_to_s3', lambda files: uploaded.extend(files))
+    monkeypatch.setattr(train_commands, 'upload_dict_to_s3_as_json', lambda key, obj: uploaded.append((None, key)))
+    (tmp_path / 'logs').mkdir()
+    (tmp_path / 'logs' / 'events.log').write_text('0')
+    (tmp_path / 'final.ckpt').write_text('0')
+    (tmp_path / 'model.pb').write_text('0')
+    with mock_s3():
+        boto3.resource('s3', region_name='us-east-1').create_bucket(Bucket='models')
+        watcher = ArtifactWatcher('models', 'extras/run', tmp_path, interval=3600, exclude=['*.ckpt'])
+        result = TrainOutput(tmp_path / 'model.pb', [tmp_path / 'logs' / 'events.log', tmp_path / 'final.ckpt'])
+        train_commands._upload_result(result, {}, {'architecture': 'fake'}, 'run', watcher, artifact_path=tmp_path)
+        watched = sorted(obj.key for obj in boto3.resource('s3', region_name='us-east-1').Bucket('models').objects.all())
+    assert watched == ['extras/run/logs/events.log']
+    assert [key for _, key in uploaded] == ['models/fake_run.pb', 'extras/run/final.ckpt', 'models/metadata_run']
@@ -0,0 +1,208 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Tests writing datasets through the ravenml dataset writers.
+"""
+
+import pytest
+import json
+from pathlib import Path
+from contextlib import contextmanager
+from ravenml.data.write_dataset import DefaultDatasetWriter, StreamingDatasetWriter, dataset_stage
+
+### SETUP ###
+class RecordingUploader(object):
+    """Stands in for a BackgroundUploader, recording what is submitted."""
+    def __init__(self):
+        self.submitted = []
+        self.pauses = 0
+
+    def submit(self, path):
+        self.submitted.append(Path(path))
+
+    @contextmanager
+    def paused(self):
+        self.pauses += 1
+        yield
+
+def make_imageset(path: Path, num_images: int):
+    path.mkdir()
+    for i in range(num_images):
+        (path / f'image_{i}.png').write_bytes(bytes([i]))
+        (path / f'meta_{i}.json').write_text(json.dumps({'tags': ['a']}))
+    return path
+
+@pytest.fixture
+def make_writer(create_input):
+    def make(imageset: Path, writer_class=DefaultDatasetWriter, **config):
+        writer = writer_class(create_input([imageset], **config))
+        writer.load_image_ids(('meta_', '.json'))
+        return writer
+    return make
+
+class StagedWriter(DefaultDatasetWriter):
+    """Writer with two stages, the second failing while 'fail' is set."""
+    calls = []
+    fail = True
+
+    @dataset_stage(None)
+    def first(self):
+        StagedWriter.calls.append('first')
+        self.obj_dict = {'0': 'constructed'}
+        self.unpicklable = lambda: None
+        return 'first result'
+
+    @dataset_stage(None)
+    def second(self):
+        StagedWriter.calls.append('second')
+        if StagedWriter.fail:
+            raise RuntimeError('interrupted')
+        return self.obj_dict['0']
+
+class RecordStreamingWriter(StreamingDatasetWriter):
+    """Streaming writer appending each object to a record file per split."""
+    def construct(self, image_id):
+        self.constructed.append(image_id[1])
+        return image_id[1]
+
+    def open_split(self, path, split_type):
+        self.events.append(('open', split_type))
+
+    def write_object(self, obj, path, split_type):
+        with open(path / f'{split_type}.record', 'a') as f:
+            f.write(obj + '\n')
+
+    def close_split(self, path, split_type):
+        self.events.append(('close', split_type))
+
+class ShardedWriter(DefaultDatasetWriter):
+    """Writer that supports sharding, writing the objects of each call to a file."""
+    supports_sharding = True
+
+    def write_out_train_split(self, objects, path, split_type, *args, **kwargs):
+        (path / f'{split_type}.txt').write_text('\n'.join(objects))
+
+@pytest.fixture
+def make_staged_writer(create_input):
+    def make(resume: bool):
+        return StagedWriter(create_input(checkpoint=True, resume=resume))
+    return make
+
+### TESTS ###
+def test_publish_only_dataset_files(tmp_path, make_writer):
+    """Tests scratch copies are never published, while the written dataset is.
+    """
+    imageset = make_imageset(tmp_path / 'imageset', 5)
+    writer = make_writer(imageset, virtual_splits=True)
+    writer.uploader = RecordingUploader()
+    writer.temp_dir = tmp_path / 'temp'
+    writer.temp_dir.mkdir()
+    writer.copy_files(writer.image_ids, writer.temp_dir, [('image_', '.png')])
+    writer.publish(writer.temp_dir)
+    assert writer.uploader.submitted == []
+
+    writer.write_dataset([('image_', '.png'), ('meta_', '.json')])
+    dataset_dir = (writer.dataset_path / writer.dataset_name).resolve()
+    assert writer.uploader.submitted == [dataset_dir / 'data']
+
+def test_checkpoint_resume(make_staged_writer):
+    """Tests a build resumes after the stage that failed, restoring the state of the
+    completed stages instead of running them again.
+    """
+    StagedWriter.calls = []
+    StagedWriter.fail = True
+    writer = make_staged_writer(resume=False)
+    assert writer.first() == 'first result'
+    with pytest.raises(RuntimeError):
+        writer.second()
+    assert StagedWriter.calls == ['first', 'second']
+    assert sorted(path.name for path in writer.checkpoints.path.iterdir()) == ['checkpoint.pkl']
+
+    StagedWriter.calls = []
+    StagedWriter.fail = False
+    writer = make_staged_writer(resume=True)
+    assert writer.first() == 'first result'
+    assert writer.obj_dict == {'0': 'constructed'}
+    assert not hasattr(writer, 'unpicklable')
+    assert writer.second() == 'constructed'
+    assert StagedWriter.calls == ['second']
+
+    # without resuming, earlier checkpoints are cleared and every stage runs
+    StagedWriter.calls = []
+    writer = make_staged_writer(resume=False)
+    writer.first()
+    writer.second()
+    assert StagedWriter.calls == ['first', 'second']
+
+def test_streaming_writer(tmp_path, make_writer):
+    """Tests the streaming writer writes every dev object once, routed to its split,
+    copies the test set and never stores constructed objects.
+    """
+    imageset = make_imageset(tmp_path / 'imageset', 10)
+    writer = make_writer(imageset, RecordStreamingWriter)
+    writer.constructed = []
+    writer.events = []
+    writer.construct_all()
+    assert writer.constructed == []
+    writer.write_dataset([('image_', '.png'), ('meta_', '.json')])
+
+    dataset_dir = writer.dataset_path / writer.dataset_name
+    records = dataset_dir / 'splits' / 'complete' / 'train'
+    train = (records / 'train.record').read_text().split()
+    validation = (records / 'test.record').read_text().split()
+    test = sorted(path.name[len('image_'):-len('.png')] for path in (dataset_dir / 'test').glob('image_*.png'))
+    assert len(test) == 2
+    assert sorted(train + validation + test) == sorted(str(i) for i in range(10))
+    assert sorted(writer.constructed) == sorted(train + validation)
+    assert writer.events == [('open', 'train'), ('open', 'test'), ('close', 'train'), ('close', 'test')]
+    assert writer.obj_dict == {}
+
+def test_sharded_splits(create_input):
+    """Tests splits are written in contiguous shards by forked workers, each shard
+    published once it is written, and completed shards are skipped on resume.
+    """
+    writer = ShardedWriter(create_input(num_shards=3, num_workers=2, checkpoint=True))
+    writer.uploader = RecordingUploader()
+    path = writer.dataset_path / writer.dataset_name
+    splits = {'train': [str(i) for i in range(7)], 'test': ['7', '8']}
+    writer.write_out_sharded_splits(path, splits)
+
+    shards = sorted(shard.name for shard in path.iterdir())
+    assert shards == ['test-00000-of-00002', 'test-00001-of-00002',
+                      'train-00000-of-00003', 'train-00001-of-00003', 'train-00002-of-00003']
+    for split_type, objects in splits.items():
+        written = [(path / shard / f'{split_type}.txt').read_text().split('\n')
+                    for shard in shards if shard.startswith(split_type)]
+        assert [obj for shard in written for obj in shard] == objects
+    assert [len(shard) for shard in written] == [1, 1]
+    assert writer.uploader.pauses == 1
+    assert sorted(writer.uploader.submitted) == [path / shard for shard in shards]
+
+    # a resumed build only rewrites shards that did not complete
+    (path / 'train-00001-of-00003' / 'train.txt').unlink()
+    (writer.checkpoints.path / 'done' / 'train-00001-of-00003').unlink()
+    writer.uploader = RecordingUploader()
+    writer.write_out_sharded_splits(path, splits)
+    assert writer.uploader.submitted == [path / 'train-00001-of-00003']
+    assert (path / 'train-00001-of-00003' / 'train.txt').read_text() == '3\n4'
+
+def test_stage_performance(tmp_path, make_writer):
+    """Tests each stage records its timing, counts and bytes copied, and the metrics
+    are written into the dataset metadata.
+    """
+    imageset = make_imageset(tmp_path / 'imageset', 5)
+    writer = make_writer(imageset, virtual_splits=True)
+    writer.write_dataset([('image_', '.png'), ('meta_', '.json')])
+    writer.write_metadata()
+
+    assert [stage['stage'] for stage in writer.performance] == ['load_image_ids', 'write_dataset', 'write_metadata']
+    stage = writer.performance[1]
+    assert set(stage) == {'stage', 'wall_time_s', 'cpu_time_s', 'peak_rss_delta_mb', 'image_ids',
+                          'objects', 'objects_cached', 'bytes_copied'}
+    assert stage['wall_time_s'] >= 0 and stage['cpu_time_s'] >= 0
+    assert stage['image_ids'] == 5 and stage['objects'] == 0 and stage['objects_cached'] is None
+    assert stage['bytes_copied'] == sum(path.stat().st_size for path in imageset.iterdir())
+    assert writer.performance[2]['bytes_copied'] == 0
+    with open(writer.dataset_path / writer.dataset_name / 'metadata.json', 'r') as f:
+        assert json.load(f)['performance'] == writer.performance[:2]
@@ -7,19 +7,25 @@ Command group for training in ravenml.
 
 import click
 import json
-import shortuuid
 import boto3
 import yaml
-import inspect
+import copy
+import time
+import tempfile
+import itertools
+import multiprocessing
 import ravenml.utils.git as git
 from urllib.request import urlopen
 from urllib.error import URLError
 from pathlib import Path
 from ravenml.train.interfaces import TrainInput, TrainOutput
 from ravenml.utils.question import cli_spinner
-from ravenml.utils.aws import upload_file_to_s3, upload_dict_to_s3_as_json
+from ravenml.utils.aws import upload_files_to_s3, upload_files_content_addressed, upload_dict_to_s3_as_json, \
+    ArtifactWatcher
 from ravenml.utils.plugins import LazyPluginGroup
 from ravenml.utils.config import load_yaml_config
+from ravenml.utils.dataset import get_dataset
+from ravenml.utils.telemetry import TELEMETRY_NAME
 
 EC2_INSTANCE_ID_URL = 'http://169.254.169.254/latest/meta-data/instance-id'
 
@@ -41,7 +47,8 @@ def train(ctx: click.Context, config: str):
             when a user is calling a plugin command decorated with @pass_train
     """
     # check if config flag was passed, if not simply carry on to child command
-    if config:
+    # sweeps create a TrainInput per run instead
+    if config and ctx.invoked_subcommand != 'sweep':
         # attempt to load config
         # NOTE: this function will raise a click error if there is an issue loading config
         train_config = load_yaml_config(Path(config))
@@ -76,20 +83,20 @@ def process_result(ctx: click.Context, result: TrainOutput, config: str):
         
         # store git info for plugin
         # NOTE: this will fail for plugins not installed via source
-        plugin_repo_root = git.is_repo(result.plugin_dir)
-        git_info = {}
-        if plugin_repo_root:
-            git_info["plugin_git_sha"] = git.git_sha(plugin_repo_root)
-            # note running the patch commands in repo root will include patches for all plugins
-            git_info["plugin_tracked_git_patch"] = git.git_patch_tracked(plugin_repo_root)
-            git_info["plugin_untracked_git_patch"] = git.git_patch_untracked(plugin_repo_root)
-        else:
-            git_info = git.retrieve_from_pkg(result.plugin_dir)
-        ti.metadata.update(git_info)
+        ti.metadata.update(git.collect_git_info(result.plugin_dir, 'plugin'))
+
+        # record how the training used the machine, the time series goes up with the extras
+        if ti.resource_sampler is not None:
+            ti.metadata['telemetry'] = ti.resource_sampler.stop(ti.artifact_path)
+            telemetry_path = ti.artifact_path / TELEMETRY_NAME
+            if telemetry_path.exists() and telemetry_path not in [Path(fp) for fp in result.extra_files]:
+                result.extra_files = list(result.extra_files) + [telemetry_path]
 
         # upload if not in local mode, determined by user defined artifact_path field in config
         if not ti.config.get('artifact_path'):
-            uuid = cli_spinner('Uploading artifacts...', _upload_result, result, ti.metadata, ti.plugin_metadata)
+            uuid = cli_spinner('Uploading artifacts...', _upload_result, result, ti.metadata, ti.plugin_metadata,
+                                ti.uuid, ti.artifact_watcher, bool(ti.config.get('content_addressed_upload')),
+                                ti.artifact_path)
             click.echo(f'Artifact UUID: {uuid}')
         else:
             with open(ti.artifact_path / 'metadata.json', 'w') as f:
@@ -97,52 +104,226 @@ def process_result(ctx: click.Context, result: TrainOutput, config: str):
             click.echo(f'LOCAL MODE: Not uploading model to S3. Model is located at: {ti.artifact_path}')
             
         # stop, terminate, or do nothing to ec2 based on policy
-        ec2_policy = ti.config.get('ec2_policy')
-        # check if the policy is to stop or terminate
-        if ec2_policy == None or ec2_policy == 'stop' or ec2_policy == 'terminate':
-            policy_str = ec2_policy if ec2_policy else 'default'
-            click.echo(f'Checking for EC2 instance and applying policy "{policy_str}"...')
-            try:
-                # grab ec2 id
-                with urlopen(EC2_INSTANCE_ID_URL, timeout=5) as url:
-                    ec2_instance_id = url.read().decode('utf-8')
-                click.echo(f'EC2 Runtime detected.')
-                client = boto3.client('ec2')
-                # default is stop
-                if ec2_policy == None or ec2_policy == 'stop':
-                    click.echo("Stopping...")
-                    client.stop_instances(InstanceIds=[ec2_instance_id], DryRun=False)
-                else:
-                    click.echo("Terminating...")
-                    client.terminate_instances(InstanceIds=[ec2_instance_id], DryRun=False)
-            except URLError:
-                click.echo('No EC2 runtime detected. Doing nothing.')
-        else:
-            click.echo('Not checking for EC2 runtime since policy is to keep running.')
+        _apply_ec2_policy(ti.config.get('ec2_policy'))
     return result
 
+@train.command(help='Run a hyperparameter sweep of a training plugin on this host.')
+@click.argument('plugin_name')
+@click.option('-g', '--grid', 'grid_path', type=str, required=True,
+    help='Path to YAML file mapping dotted config keys (e.g. plugin.learning_rate) to lists of values.')
+@click.option('-j', '--jobs', type=int, default=1, show_default=True, help='Number of runs trained concurrently.')
+@click.pass_context
+def sweep(ctx: click.Context, plugin_name: str, grid_path: str, jobs: int):
+    """Trains a plugin once for every combination of values in a parameter grid, starting
+    from the base config given to the train command group. The dataset is synced, the
+    plugin imported and git info collected once, then each run is trained in its own
+    forked process with its own TrainInput, metadata (recording the run's parameters
+    under 'sweep'), artifact path and upload. The EC2 policy of the base config is
+    applied once, after every run finished.
+
+    Args:
+        ctx (Context): click context object
+        plugin_name (str): name of the training plugin command to sweep
+        grid_path (str): path to parameter grid YAML file
+        jobs (int): number of runs trained concurrently
+    """
+    config_path = ctx.parent.params.get('config')
+    if not config_path:
+        raise click.exceptions.UsageError('You must provide the --config option on `ravenml train` for a sweep.')
+    base_config = load_yaml_config(Path(config_path))
+    grid = load_yaml_config(Path(grid_path))
+    if not isinstance(grid, dict) or not all(isinstance(values, list) and values for values in grid.values()):
+        raise click.exceptions.BadParameter(grid_path, param=grid_path, param_hint='grid, must map config keys to lists of values. Grid')
+    # runs cannot prompt, they all write to the same terminal
+    metadata = base_config.get('metadata', {})
+    required = {'dataset': base_config.get('dataset'), 'metadata.created_by': metadata.get('created_by'),
+                'metadata.comments': metadata.get('comments')}
+    for field, value in required.items():
+        if not value:
+            raise click.exceptions.BadParameter(config_path, param=config_path, param_hint=f'config, no "{field}" field for a sweep. Config was')
+    if ctx.parent.command.get_command(ctx, plugin_name) is None:
+        raise click.exceptions.BadParameter(plugin_name, param=plugin_name, param_hint='plugin name, no such training plugin is installed')
+
+    # resolved once here, forked runs inherit the git info cache and the imported plugin
+    try:
+        cli_spinner(f'Downloading {base_config["dataset"]} from S3...', get_dataset, base_config['dataset'])
+    except ValueError:
+        hint = 'dataset name, no such dataset exists on S3'
+        raise click.exceptions.BadParameter(base_config['dataset'], param=base_config['dataset'], param_hint=hint)
+    git.collect_git_info(Path(__file__).resolve().parent.parent, 'ravenml')
+
+    runs = _expand_grid(grid)
+    click.echo(f'Sweeping {len(runs)} runs of {plugin_name}, {jobs} at a time.')
+    with tempfile.TemporaryDirectory() as config_dir:
+        tasks = []
+        for i, parameters in enumerate(runs):
+            run_config = copy.deepcopy(base_config)
+            for key, value in parameters.items():
+                _set_dotted(run_config, key, value)
+            run_config['metadata'] = dict(run_config.get('metadata', {}), sweep={'run': i, 'parameters': parameters})
+            run_config['sweep_run'] = i
+            run_config['dataset_synced'] = True
+            run_config['overwrite_local'] = True
+            # the base policy is applied once the whole sweep is done
+            run_config['ec2_policy'] = 'keep'
+            if base_config.get('artifact_path'):
+                run_config['artifact_path'] = str(Path(base_config['artifact_path']) / f'run_{i:03d}')
+            run_config_path = Path(config_dir) / f'run_{i:03d}.yaml'
+            with open(run_config_path, 'w') as f:
+                yaml.safe_dump(run_config, f)
+            tasks.append((i, plugin_name, str(run_config_path)))
+
+        if jobs <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            results = [_run_sweep_trial(task) for task in tasks]
+        else:
+            # a fresh process per run, so no state leaks between runs
+            with multiprocessing.get_context('fork').Pool(processes=min(jobs, len(tasks)), maxtasksperchild=1) as pool:
+                results = pool.map(_run_sweep_trial, tasks, chunksize=1)
+
+    click.echo(_format_sweep_table(runs, results))
+    _apply_ec2_policy(base_config.get('ec2_policy'))
+
 
 ### HELPERS ###
-def _upload_result(result: TrainOutput, metadata: dict, plugin_metadata: dict):
+def _apply_ec2_policy(ec2_policy: str):
+    """Stops, terminates, or does nothing to the EC2 instance this runs on, if any.
+
+    Args:
+        ec2_policy (str): 'stop' (or None) to stop, 'terminate' to terminate, anything
+            else keeps the instance running
+    """
+    # check if the policy is to stop or terminate
+    if ec2_policy == None or ec2_policy == 'stop' or ec2_policy == 'terminate':
+        policy_str = ec2_policy if ec2_policy else 'default'
+        click.echo(f'Checking for EC2 instance and applying policy "{policy_str}"...')
+        try:
+            # grab ec2 id
+            with urlopen(EC2_INSTANCE_ID_URL, timeout=5) as url:
+                ec2_instance_id = url.read().decode('utf-8')
+            click.echo(f'EC2 Runtime detected.')
+            client = boto3.client('ec2')
+            # default is stop
+            if ec2_policy == None or ec2_policy == 'stop':
+                click.echo("Stopping...")
+                client.stop_instances(InstanceIds=[ec2_instance_id], DryRun=False)
+            else:
+                click.echo("Terminating...")
+                client.terminate_instances(InstanceIds=[ec2_instance_id], DryRun=False)
+        except URLError:
+            click.echo('No EC2 runtime detected. Doing nothing.')
+    else:
+        click.echo('Not checking for EC2 runtime since policy is to keep running.')
+
+def _expand_grid(grid: dict) -> list:
+    """Expands a parameter grid into every combination of its values.
+
+    Args:
+        grid (dict): config keys mapped to lists of values
+
+    Returns:
+        list: dicts of config keys mapped to a single value, one per combination
+    """
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+def _set_dotted(config: dict, key: str, value):
+    """Sets a nested config field, creating intermediate sections as needed.
+
+    Args:
+        config (dict): config to modify
+        key (str): dotted path of field, e.g. 'plugin.learning_rate'
+        value: value to set
+    """
+    *sections, field = key.split('.')
+    for section in sections:
+        config = config.setdefault(section, {})
+    config[field] = value
+
+def _run_sweep_trial(task: tuple) -> tuple:
+    """Runs a single training of a sweep through the train command group, so it is
+    set up, processed and uploaded exactly like a standalone training.
+
+    Args:
+        task (tuple): index of run, name of plugin command and path to the run's config
+
+    Returns:
+        tuple: index of run, wall time in seconds and error message (None if successful)
+    """
+    index, plugin_name, config_path = task
+    start = time.perf_counter()
+    try:
+        train.main(args=['--config', config_path, plugin_name], standalone_mode=False)
+        error = None
+    except (Exception, SystemExit) as e:
+        error = str(e) or type(e).__name__
+    return index, time.perf_counter() - start, error
+
+def _format_sweep_table(runs: list, results: list) -> str:
+    """Formats the outcome of every run of a sweep as a table.
+
+    Args:
+        runs (list): parameters of each run
+        results (list): (index, wall time, error) of each run
+
+    Returns:
+        str: table with one row per run
+    """
+    rows = [['RUN', 'WALL (s)', 'STATUS', 'PARAMETERS']]
+    for index, wall_time, error in sorted(results):
+        parameters = ', '.join(f'{key}={value}' for key, value in runs[index].items())
+        rows.append([str(index), f'{wall_time:.2f}', 'ok' if error is None else f'failed: {error}', parameters])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows)
+
+
+def _upload_result(result: TrainOutput, metadata: dict, plugin_metadata: dict, uuid: str,
+                    artifact_watcher: ArtifactWatcher = None, content_addressed: bool = False,
+                    artifact_path: Path = None):
     """ Wraps upload procedure into single function for use with cli_spinner.
 
-    Generates a UUID for the model and uploads all artifacts.
+    Uploads the model and extra files under the UUID of the training in one concurrent
+    batch, then the metadata, which marks the upload as complete. Extra files inside the
+    artifact directory keep their path relative to it, 'extras/<uuid>/<relative path>',
+    the same keys the artifact watcher uploads to, other extra files are uploaded by name.
 
     Args:
         result (TrainOutput): TrainOutput object, to be uploaded
         metadata (dict): metadata associated with this run, to be uploaded
         plugin_metadata (dict): plugin metadata, used to access architecture of run
             for naming uploading model
+        uuid (str): uuid of the training
+        artifact_watcher (ArtifactWatcher, optional): watcher that uploaded artifacts
+            during training. Extra files it uploaded unchanged are not uploaded again,
+            excluded files are uploaded as usual.
+        content_addressed (bool, optional): whether the model and extra files are stored
+            once per content under 'blobs/' with pointer objects ('<key>.ref') at their
+            usual keys, so files identical to an earlier run are not uploaded again. The
+            pointers are also recorded in the metadata under 'artifacts'. Files uploaded
+            by the artifact watcher are not content-addressed.
+        artifact_path (Path, optional): artifact directory of the training
     
     Returns:
         str: uuid assigned to result on upload
     """
-    shortuuid.set_alphabet('23456789abcdefghijkmnopqrstuvwxyz')
-    uuid = shortuuid.uuid()
-    model_name = f'{plugin_metadata["architecture"]}_{uuid}.pb'
-    upload_file_to_s3('models', result.model_path, alternate_name=model_name)
+    extra_files = result.extra_files
+    if artifact_watcher is not None:
+        artifact_watcher.finish(exclude=[result.model_path])
+        extra_files = [fp for fp in extra_files if not artifact_watcher.uploader.was_submitted(fp)]
+        if artifact_path is None:
+            artifact_path = artifact_watcher.uploader.local_path
+
+    def extra_key(file_path):
+        file_path = Path(file_path).resolve()
+        if artifact_path is not None and Path(artifact_path).resolve() in file_path.parents:
+            return f'extras/{uuid}/{file_path.relative_to(Path(artifact_path).resolve()).as_posix()}'
+        return f'extras/{uuid}/{file_path.name}'
+
+    files = [(result.model_path, f'models/{plugin_metadata["architecture"]}_{uuid}.pb')]
+    files += [(fp, extra_key(fp)) for fp in extra_files]
+    if content_addressed:
+        metadata['artifacts'] = upload_files_content_addressed(files)
+    else:
+        upload_files_to_s3(files)
+    # metadata goes up last, so a model is never listed before all of its files are uploaded
     upload_dict_to_s3_as_json(f'models/metadata_{uuid}', metadata)
-    if result.extra_files != []:
-        for fp in result.extra_files:
-            upload_file_to_s3(f'extras/{uuid}', fp)
     return uuid
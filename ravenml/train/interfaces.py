@@ -7,15 +7,17 @@ Contains the classes for interfacing with training command group.
 import os
 import click
 import shutil
-import inspect
+import shortuuid
 import ravenml.utils.git as git
 from datetime import datetime
 from pathlib import Path
 from colorama import Fore
 from ravenml.utils.local_cache import RMLCache
+from ravenml.utils.config import get_config
+from ravenml.utils.aws import ArtifactWatcher
+from ravenml.utils.telemetry import ResourceSampler
 from ravenml.utils.question import cli_spinner, user_input, user_selects, user_confirms
 from ravenml.utils.dataset import get_dataset_names, get_dataset
-from ravenml.data.interfaces import Dataset
 
 class TrainInput(object):
     """Represents a training input. Contains all plugin-independent information
@@ -32,9 +34,11 @@ class TrainInput(object):
         plugin_cache (RMLCache): RMLCache for this plugin. Created at 
             ~/.ravenML/<plugin_name>
         artifact_path (Path): path to save artifacts. Points to temp/ inside
-            the root of plugin_cache if uploading to S3, otherwise points
-            to user defined local path.
-        dataset (Dataset): Dataset object for this training run.
+            the root of plugin_cache if uploading to S3 (temp_sweep_<run>/ for runs
+            of a sweep), otherwise points to user defined local path.
+        dataset (Dataset): Dataset object for this training run. It is downloaded in the
+            background while the training is set up, accessing its path or files waits
+            for the download to finish (see Dataset.wait_ready).
         metadata (dict): dictionary of metadata about this training.
             Automatically populated with common data, plugins add more as needed.
         plugin_metadata (dict): dictionary within full metadata dict where plugins
@@ -42,6 +46,15 @@ class TrainInput(object):
             attribute as it will break the relationship between plugin_metadata and metadata.
         plugin_config (dict): plugin section of config dict. Plugins look here
             for plugin-specific configuration.
+        uuid (str): unique id the artifacts of this training are uploaded under
+        artifact_watcher (ArtifactWatcher): uploads artifacts in the background while
+            training runs when uploading with 'watch_artifacts' set in the config
+            (polling every 'artifact_watch_interval' seconds, 30 by default), otherwise None.
+            Files matching the 'artifact_watch_exclude' globs are not uploaded during
+            training, plugins exclude the model with 'add_exclude' before writing it
+        resource_sampler (ResourceSampler): samples resource usage during the training when
+            'telemetry' is set in the config (every 'telemetry_interval' seconds, 5 by
+            default), otherwise None
     """
     def __init__(self, config:dict=None, plugin_name:str=None):
         """ Keyword args must be used for this class to work with the @pass_train pass decorator.
@@ -78,9 +91,11 @@ class TrainInput(object):
         ## Set up Artifact Path
         ap = config.get('artifact_path')
         if ap is None:
-            self.plugin_cache.ensure_clean_subpath('temp')
-            self.plugin_cache.ensure_subpath_exists('temp')
-            self.artifact_path = Path(self.plugin_cache.path / 'temp')
+            # concurrent runs of a sweep each need their own temp directory
+            temp_dir = 'temp' if config.get('sweep_run') is None else f'temp_sweep_{config["sweep_run"]}'
+            self.plugin_cache.ensure_clean_subpath(temp_dir)
+            self.plugin_cache.ensure_subpath_exists(temp_dir)
+            self.artifact_path = Path(self.plugin_cache.path / temp_dir)
         else:
             ap = Path(os.path.expanduser(ap))
             # check if local path contains data
@@ -102,14 +117,21 @@ class TrainInput(object):
         if dataset_name is None:
             dataset_options = cli_spinner('No dataset provided. Finding datasets on S3...', get_dataset_names)
             dataset_name = user_selects('Choose dataset:', dataset_options)
-        # download dataset and populate field
+        # start downloading dataset and populate field, the download continues while
+        # the user is prompted and the plugin sets up
         try:
-            self.dataset = cli_spinner(f'Downloading {dataset_name} from S3...', 
-                get_dataset, dataset_name)
+            self.dataset = cli_spinner(f'Finding {dataset_name} on S3...', 
+                get_dataset, dataset_name, background=True, sync=not config.get('dataset_synced'))
         except ValueError as e:
             hint = 'dataset name, no such dataset exists on S3'
             raise click.exceptions.BadParameter(dataset_name, param=dataset_name, param_hint=hint)
     
+        ## Set up Telemetry
+        # started early so the dataset download is sampled too
+        self.resource_sampler = None
+        if config.get('telemetry'):
+            self.resource_sampler = ResourceSampler(interval=config.get('telemetry_interval', 5))
+
         ## Set up Basic Metadata
         # TODO: add environment description, git hash, etc
         self.metadata = config.get('metadata', {})
@@ -127,19 +149,11 @@ class TrainInput(object):
         #   ravenml/ravenml/data/write_dataset (must go up 3 levels)
         # when in site-packages, file is at:
         #   ravenml/data/write_dataset (must go up 2 levels)
-        # start two levels up and do a check at 3 levels up
+        # start two levels up, collect_git_info searches upward for the repo root
         rml_dir = Path(__file__).resolve().parent.parent
-        git_info = {}
-        if git.is_repo(rml_dir.parent):
-            rml_dir = rml_dir.parent
-            git_info['ravenml_git_sha'] = git.git_sha(rml_dir)
-            git_info['ravenml_tracked_git_patch'] = git.git_patch_tracked(rml_dir)
-            git_info['ravenml_untracked_git_patch'] = git.git_patch_untracked(rml_dir)
-        else:
-            git_info = git.retrieve_from_pkg(rml_dir)
-        self.metadata.update(git_info)
-        # NOTE: plugin git data cannot be found yet, must wait until after plugin
-        # calls are on the stack for inspection. We add plugin git info when processing results 
+        self.metadata.update(git.collect_git_info(rml_dir, 'ravenml'))
+        # NOTE: plugin git data cannot be found yet, the plugin directory is only known
+        # once the plugin creates its TrainOutput. We add plugin git info when processing results
         # (see process_result callback in commands.py)
         
         ## Set up fields for plugin use
@@ -153,6 +167,16 @@ class TrainInput(object):
             raise click.exceptions.BadParameter(config, param=config, param_hint='config, no "plugin" field. Config was')
         else:
             self.plugin_config = config.get('plugin') 
+
+        ## Set up Artifact Upload
+        # the uuid is known before training so artifacts can be uploaded under it as they are written
+        shortuuid.set_alphabet('23456789abcdefghijkmnopqrstuvwxyz')
+        self.uuid = shortuuid.uuid()
+        self.artifact_watcher = None
+        if ap is None and config.get('watch_artifacts'):
+            self.artifact_watcher = ArtifactWatcher(get_config()['model_bucket_name'], f'extras/{self.uuid}',
+                                                    self.artifact_path, interval=config.get('artifact_watch_interval', 30),
+                                                    exclude=config.get('artifact_watch_exclude'))
             
 class TrainOutput(object):
     """Represents a training output. Plugin training command functions return this object
@@ -186,5 +210,5 @@ class TrainOutput(object):
         self.model_path = model_path
         self.extra_files = extra_files
         # file calling `init` must be inside plugin
-        self.plugin_dir = Path(inspect.getmodule(inspect.stack()[1][0]).__file__).resolve().parent
+        self.plugin_dir = git.find_module_dir()
     
\ No newline at end of file
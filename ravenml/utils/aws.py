@@ -1,10 +1,24 @@
 import os
 import boto3
 import json
+import fnmatch
+import threading
 import subprocess
 from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
 from ravenml.utils.config import get_config
 from ravenml.utils.local_cache import RMLCache
+from ravenml.utils.hashing import hash_file, hash_files
+from botocore.exceptions import ClientError
+
+# files larger than this are uploaded in multipart chunks of MULTIPART_CHUNKSIZE
+MULTIPART_THRESHOLD = 64 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+# prefix content-addressed blobs are stored under, and suffix of the pointers to them
+BLOB_PREFIX = 'blobs'
+POINTER_SUFFIX = '.ref'
 
 ### DOWNLOAD FUNCTIONS ###
 def list_top_level_bucket_prefixes(bucket_name: str):
@@ -21,15 +35,15 @@ def list_top_level_bucket_prefixes(bucket_name: str):
         list: prefix strings
     """
     S3 = boto3.resource('s3')
-    config = get_config()
-    bucket_contents = S3.meta.client.list_objects(Bucket=bucket_name, Delimiter='/')
+    # a single listing returns at most 1000 prefixes
+    paginator = S3.meta.client.get_paginator('list_objects_v2')
     contents = []
-    if bucket_contents.get('CommonPrefixes') is not None:
-        for obj in bucket_contents.get('CommonPrefixes'):
+    for page in paginator.paginate(Bucket=bucket_name, Delimiter='/'):
+        for obj in page.get('CommonPrefixes', []):
             contents.append(obj.get('Prefix')[:-1])
     return contents
     
-def download_prefix(bucket_name: str, prefix: str, cache: RMLCache, custom_path: str = None):
+def download_prefix(bucket_name: str, prefix: str, cache: RMLCache, custom_path: str = None, include: str = None):
     """Downloads all files with the specified prefix into the provided local cache.
 
     Args:
@@ -38,6 +52,8 @@ def download_prefix(bucket_name: str, prefix: str, cache: RMLCache, custom_path:
         cache (RMLCache): cache to download files to
         custom_path (str, optional): custom subpath in cache
             to download files to
+        include (str, optional): glob pattern, only files under the prefix
+            matching it are downloaded
     
     Returns:
         bool: T if successful, F if no objects found
@@ -49,11 +65,43 @@ def download_prefix(bucket_name: str, prefix: str, cache: RMLCache, custom_path:
         else:
             local_path = cache.path / prefix
 
-        subprocess.call(["aws", "s3", "sync", s3_uri, str(local_path), '--quiet'])
+        filters = ['--exclude', '*', '--include', include] if include else []
+        subprocess.call(["aws", "s3", "sync", s3_uri, str(local_path), '--quiet'] + filters)
         return True
     except:
         return False
 
+def download_file_content_addressed(key: str, file_path: Path, bucket_name: str = None) -> Path:
+    """Downloads a file uploaded with 'upload_files_content_addressed', resolving the
+    pointer at '<key>POINTER_SUFFIX' to the blob holding its contents. Keys without a
+    pointer are downloaded as is, so files uploaded under plain keys are read the same way.
+
+    Args:
+        key (str): key the file was uploaded under, without POINTER_SUFFIX
+        file_path (Path): local path to download the file to
+        bucket_name (str, optional): name of bucket, the model bucket if not provided
+
+    Returns:
+        Path: local path of the file
+
+    Raises:
+        ValueError: if the downloaded blob does not match the digest of its pointer
+    """
+    if bucket_name is None:
+        bucket_name = get_config()['model_bucket_name']
+    client = boto3.client('s3')
+    try:
+        pointer = json.loads(client.get_object(Bucket=bucket_name, Key=key + POINTER_SUFFIX)['Body'].read())
+    except ClientError as e:
+        if str(e.response.get('Error', {}).get('Code')) not in ['404', 'NoSuchKey', 'NotFound']:
+            raise
+        pointer = None
+    os.makedirs(Path(file_path).parent, exist_ok=True)
+    client.download_file(bucket_name, pointer['blob'] if pointer else key, str(file_path))
+    if pointer and hash_file(file_path) != pointer['digest']:
+        raise ValueError(key)
+    return Path(file_path)
+
 ### UPLOAD FUNCTIONS ###
 def upload_file_to_s3(prefix: str, file_path: Path, alternate_name=None):
     """Uploads file at given file path to model bucket on S3.
@@ -70,6 +118,82 @@ def upload_file_to_s3(prefix: str, file_path: Path, alternate_name=None):
                     else prefix + '/' + alternate_name
     model_bucket.upload_file(str(file_path), upload_path)
         
+def upload_files_to_s3(files: list, bucket_name: str = None, num_threads: int = 8):
+    """Uploads many files to S3 in one concurrent batch through a shared client.
+    Files larger than MULTIPART_THRESHOLD are uploaded in concurrent multipart chunks.
+
+    Args:
+        files (list): (file path, key) pairs to upload
+        bucket_name (str, optional): name of bucket, the model bucket if not provided
+        num_threads (int, optional): Defaults to 8. Number of files uploaded concurrently
+
+    Raises:
+        Exception: the first error raised by an upload
+    """
+    if bucket_name is None:
+        bucket_name = get_config()['model_bucket_name']
+    # boto3 clients, unlike resources, are safe to share between threads
+    client = boto3.client('s3')
+    transfer_config = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD, multipart_chunksize=MULTIPART_CHUNKSIZE)
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        futures = [executor.submit(client.upload_file, str(file_path), bucket_name, key, Config=transfer_config)
+                    for file_path, key in files]
+        for future in futures:
+            future.result()
+
+def upload_files_content_addressed(files: list, bucket_name: str = None, num_threads: int = 8) -> dict:
+    """Uploads many files to S3 under content-addressed keys, 'BLOB_PREFIX/<digest>', so
+    identical files are stored once no matter how many runs upload them. Blobs already on
+    S3 are not uploaded again. Each key given is written as a small JSON pointer object,
+    '<key>POINTER_SUFFIX', naming the blob holding its contents. Digests come from the
+    persistent hash index, so unchanged files are not hashed again either.
+
+    Args:
+        files (list): (file path, key) pairs to upload
+        bucket_name (str, optional): name of bucket, the model bucket if not provided
+        num_threads (int, optional): Defaults to 8. Number of concurrent requests
+
+    Returns:
+        dict: keys mapped to their pointer, with the 'blob' key, 'size' and 'digest' of the file
+
+    Raises:
+        Exception: the first error raised by an upload
+    """
+    if bucket_name is None:
+        bucket_name = get_config()['model_bucket_name']
+    # boto3 clients, unlike resources, are safe to share between threads
+    client = boto3.client('s3')
+    digests = hash_files([file_path for file_path, _ in files], num_threads=num_threads)
+    blobs = {}
+    for (file_path, _), digest in zip(files, digests):
+        if digest is None:
+            raise FileNotFoundError(file_path)
+        blobs.setdefault(digest, file_path)
+
+    def blob_exists(digest):
+        try:
+            client.head_object(Bucket=bucket_name, Key=f'{BLOB_PREFIX}/{digest}')
+            return True
+        except ClientError as e:
+            if str(e.response.get('Error', {}).get('Code')) in ['404', 'NoSuchKey', 'NotFound']:
+                return False
+            raise
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        exists = list(executor.map(blob_exists, blobs))
+    upload_files_to_s3([(file_path, f'{BLOB_PREFIX}/{digest}')
+                        for (digest, file_path), found in zip(blobs.items(), exists) if not found],
+                       bucket_name=bucket_name, num_threads=num_threads)
+
+    pointers = {key: {'blob': f'{BLOB_PREFIX}/{digest}', 'size': Path(file_path).stat().st_size, 'digest': digest}
+                for (file_path, key), digest in zip(files, digests)}
+    # pointers are written once every blob they point to is uploaded
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        futures = [executor.submit(client.put_object, Bucket=bucket_name, Key=key + POINTER_SUFFIX,
+                                   Body=json.dumps(pointer)) for key, pointer in pointers.items()]
+        for future in futures:
+            future.result()
+    return pointers
+
 def upload_dict_to_s3_as_json(s3_path: str, obj: dict):
     """Uploads given dictionary to model bucket on S3.
 
@@ -93,3 +217,259 @@ def upload_directory(bucket_name, prefix, local_path):
     
     s3_uri = 's3://' + bucket_name + '/' + prefix 
     subprocess.call(["aws", "s3", "sync", local_path, s3_uri, '--quiet'])
+
+class BackgroundUploader(object):
+    """Uploads files of a directory to S3 in background threads while the directory
+    is still being written. Files are submitted as they are finalised and uploaded
+    concurrently through a shared S3 client. The commit file (metadata.json) is never
+    uploaded in the background; 'finish' uploads it last once everything else is on S3,
+    so a prefix with a commit file is always complete.
+
+    Args:
+        bucket_name (str): the name of the S3 bucket to upload to
+        prefix (str): the name of the prefix to be uploaded to
+        local_path (Path): local path to directory being uploaded
+        num_threads (int, optional): number of concurrent uploads. Defaults to 8
+        commit_name (str, optional): name of the file uploaded last, relative to
+            local_path, or None to upload every file in the background. Defaults to 'metadata.json'
+
+    Attributes:
+        bucket_name (str): the name of the S3 bucket to upload to
+        prefix (str): the name of the prefix to be uploaded to
+        local_path (Path): local path to directory being uploaded
+        commit_name (str): name of the file uploaded last
+        num_uploaded (int): number of files uploaded so far
+    """
+
+    def __init__(self, bucket_name: str, prefix: str, local_path: Path, num_threads: int = 8,
+                    commit_name: str = 'metadata.json'):
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.local_path = Path(local_path)
+        self.commit_name = commit_name
+        self.num_uploaded = 0
+        # boto3 clients, unlike resources, are safe to share between threads
+        self._client = boto3.client('s3')
+        self._executor = ThreadPoolExecutor(max_workers=num_threads)
+        self._futures = []
+        # (size, mtime) of every file submitted, so unchanged files are not uploaded twice
+        self._submitted = {}
+        self._gate = threading.Condition()
+        self._active = 0
+        self._paused = False
+
+    def submit(self, path: Path):
+        """Queues a finalised file, or every file in a finalised directory, for upload.
+        Files already submitted are only queued again if they changed since.
+
+        Args:
+            path (Path): file or directory inside local_path
+        """
+        path = Path(path)
+        files = [path] if path.is_file() else [Path(root) / name
+            for root, _, names in os.walk(path) for name in names]
+        for file_path in files:
+            key = file_path.relative_to(self.local_path).as_posix()
+            if key == self.commit_name:
+                continue
+            stat = file_path.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._submitted.get(key) == signature:
+                continue
+            self._submitted[key] = signature
+            self._futures.append(self._executor.submit(self._upload, file_path, key))
+
+    def was_submitted(self, path: Path) -> bool:
+        """Checks if a file was submitted for upload, unchanged since.
+
+        Args:
+            path (Path): path to file
+
+        Returns:
+            bool: T if the file's current contents were submitted, F if not
+        """
+        path = Path(path).resolve()
+        try:
+            key = path.relative_to(self.local_path.resolve()).as_posix()
+            stat = path.stat()
+        except (ValueError, OSError):
+            return False
+        return self._submitted.get(key) == (stat.st_size, stat.st_mtime_ns)
+
+    @contextmanager
+    def paused(self):
+        """Context manager holding back new uploads and waiting for in-flight ones.
+        Used around forking worker processes, so no upload thread is mid-request
+        when the process is copied.
+        """
+        with self._gate:
+            self._paused = True
+            while self._active:
+                self._gate.wait()
+        try:
+            yield
+        finally:
+            with self._gate:
+                self._paused = False
+                self._gate.notify_all()
+
+    def finish(self, sweep: bool = True):
+        """Uploads any file not yet submitted, waits for every upload to complete and
+        then uploads the commit file.
+
+        Args:
+            sweep (bool, optional): Defaults to True. Whether to submit every file in
+                local_path first, otherwise only files already submitted are uploaded
+
+        Returns:
+            int: number of files uploaded
+
+        Raises:
+            Exception: the first error raised by a background upload
+        """
+        if sweep:
+            self.submit(self.local_path)
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self._executor.shutdown(wait=True)
+        if self.commit_name and (self.local_path / self.commit_name).exists():
+            self._upload(self.local_path / self.commit_name, self.commit_name)
+        return self.num_uploaded
+
+    def _upload(self, file_path: Path, key: str):
+        """Uploads a single file, waiting while uploads are paused.
+
+        Args:
+            file_path (Path): path to file
+            key (str): path of file relative to local_path
+        """
+        with self._gate:
+            while self._paused:
+                self._gate.wait()
+            self._active += 1
+        try:
+            self._client.upload_file(str(file_path), self.bucket_name, self.prefix + '/' + key)
+            with self._gate:
+                self.num_uploaded += 1
+        finally:
+            with self._gate:
+                self._active -= 1
+                self._gate.notify_all()
+
+class ArtifactWatcher(object):
+    """Uploads the artifacts of a training while it runs. The artifact directory is
+    polled in a background thread and files whose size and mtime did not change since
+    the previous poll (i.e. files that are not being written) are handed to a
+    BackgroundUploader, which skips files it already uploaded unchanged. When training
+    ends only the files that changed since the last poll are left to upload. Excluded
+    files, such as the model which is uploaded separately, are skipped by every poll.
+
+    Which files were uploaded is only known to this process, a new watcher on the same
+    directory uploads every file again.
+
+    Args:
+        bucket_name (str): the name of the S3 bucket to upload to
+        prefix (str): the name of the prefix to be uploaded to
+        local_path (Path): local path to artifact directory being watched
+        interval (float, optional): seconds between polls. Defaults to 30
+        exclude (list, optional): files that are not uploaded, see 'add_exclude'
+
+    Attributes:
+        uploader (BackgroundUploader): uploads the files found by the watcher
+        interval (float): seconds between polls
+        exclude (list): resolved paths and glob patterns of files that are not uploaded
+    """
+
+    def __init__(self, bucket_name: str, prefix: str, local_path: Path, interval: float = 30,
+                    exclude: list = None):
+        self.uploader = BackgroundUploader(bucket_name, prefix, local_path, commit_name=None)
+        self.interval = interval
+        self.exclude = []
+        for path in exclude or []:
+            self.add_exclude(path)
+        # (size, mtime) of every file at the previous poll
+        self._seen = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def add_exclude(self, path):
+        """Excludes files from upload from the next poll on, e.g. the model which is
+        uploaded separately. Plugins add the model path before writing the model.
+
+        Args:
+            path (str or Path): absolute path of a file, or a glob pattern matched against
+                paths relative to the artifact directory such as '*.pb'
+        """
+        self.exclude.append(self._exclude_pattern(path))
+
+    def poll(self, exclude: list = None, settled_only: bool = True):
+        """Submits the files of the artifact directory for upload.
+
+        Args:
+            exclude (list, optional): files that are not uploaded in this poll, in
+                addition to 'exclude', see 'add_exclude'
+            settled_only (bool, optional): Defaults to True. Whether to only submit
+                files that did not change since the previous poll
+        """
+        exclude = self.exclude + [self._exclude_pattern(path) for path in exclude or []]
+        local_path = Path(self.uploader.local_path)
+        seen = {}
+        for root, _, names in os.walk(self.uploader.local_path):
+            for name in names:
+                file_path = Path(root) / name
+                try:
+                    stat = file_path.stat()
+                except OSError:
+                    continue
+                seen[file_path] = (stat.st_size, stat.st_mtime_ns)
+                relative_path = file_path.relative_to(local_path).as_posix()
+                resolved_path = file_path.resolve().as_posix()
+                if any(pattern == resolved_path or fnmatch.fnmatchcase(relative_path, pattern)
+                        for pattern in exclude):
+                    continue
+                if not settled_only or self._seen.get(file_path) == seen[file_path]:
+                    self.uploader.submit(file_path)
+        self._seen = seen
+
+    def finish(self, exclude: list = None):
+        """Stops watching, uploads every file that is not yet uploaded or changed since
+        and waits for all uploads to complete.
+
+        Args:
+            exclude (list, optional): files that are not uploaded, e.g. the final model
+                which is uploaded separately, see 'add_exclude'
+
+        Returns:
+            int: number of files uploaded
+
+        Raises:
+            Exception: the first error raised by a background upload
+        """
+        for path in exclude or []:
+            self.add_exclude(path)
+        self._stop.set()
+        self._thread.join()
+        self.poll(settled_only=False)
+        return self.uploader.finish(sweep=False)
+
+    def _exclude_pattern(self, path) -> str:
+        """Turns a path or glob pattern into the form matched by 'poll'.
+
+        Args:
+            path (str or Path): absolute path of a file, or a glob pattern relative to
+                the artifact directory
+
+        Returns:
+            str: resolved posix path for absolute paths, otherwise the pattern
+        """
+        path = Path(path)
+        return path.resolve().as_posix() if path.is_absolute() else path.as_posix()
+
+    def _watch(self):
+        """Polls the artifact directory until the watcher is finished.
+        """
+        while not self._stop.wait(self.interval):
+            self.poll()
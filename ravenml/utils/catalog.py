@@ -0,0 +1,293 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Local SQLite catalog of the metadata of every dataset or imageset in a bucket,
+kept fresh with bucket listings and conditional GETs so unchanged metadata is
+never downloaded again.
+"""
+
+import json
+import sqlite3
+import boto3
+from botocore.exceptions import ClientError, BotoCoreError
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from ravenml.utils.local_cache import RMLCache
+from ravenml.utils.aws import list_top_level_bucket_prefixes
+
+# name of the catalog database inside the cache it catalogs
+CATALOG_NAME = 'catalog.sqlite'
+METADATA_NAME = 'metadata.json'
+# error codes S3 returns for a conditional GET of an unchanged object
+NOT_MODIFIED_CODES = ['304', 'NotModified']
+MISSING_CODES = ['404', 'NoSuchKey']
+# ETag of entries written locally rather than read from S3
+LOCAL_ETAG = 'local'
+
+
+class MetadataCatalog(object):
+    """Represents the local catalog of metadata for every top level prefix of a bucket
+    (i.e. every dataset or imageset). Each entry stores the key, ETag and LastModified
+    of the metadata object it was read from. A sweep of the whole bucket compares entries
+    with the ETag and LastModified of a single listing of the bucket, and revalidates
+    only those that changed with a conditional GET (If-None-Match), so only metadata
+    that changed on S3 is downloaded. Fresh metadata is
+    also written to '<cache>/<name>/metadata.json', where the rest of ravenml reads it.
+
+    Args:
+        bucket_name (str): name of bucket to catalog
+        cache (RMLCache): cache the catalog database and metadata files are stored in
+        fallback_prefix (str, optional): prefix of per-item metadata files (e.g. 'meta_'),
+            the first of which is cataloged for names without a metadata.json
+        num_threads (int, optional): Defaults to 16. Number of concurrent revalidations
+
+    Attributes:
+        bucket_name (str): name of bucket to catalog
+        cache (RMLCache): cache the catalog database and metadata files are stored in
+        fallback_prefix (str): prefix of per-item metadata files, or None
+        num_threads (int): number of concurrent revalidations
+    """
+
+    def __init__(self, bucket_name: str, cache: RMLCache, fallback_prefix: str = None, num_threads: int = 16):
+        self.bucket_name = bucket_name
+        self.cache = cache
+        self.fallback_prefix = fallback_prefix
+        self.num_threads = num_threads
+        # boto3 clients, unlike resources, are safe to share between threads
+        self._client = boto3.client('s3')
+
+    def list_names(self) -> list:
+        """Lists the names of all top level prefixes in the bucket.
+
+        Returns:
+            list: names
+        """
+        return list_top_level_bucket_prefixes(self.bucket_name)
+
+    def list_entries(self) -> dict:
+        """Lists every name in the bucket with the key, ETag and LastModified of the object
+        its metadata is read from, in one paginated listing of every key in the bucket.
+
+        Returns:
+            dict: names mapped to (key, etag, last modified), None for names without metadata
+        """
+        listed = {}
+        paginator = self._client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name):
+            for obj in page.get('Contents', []):
+                name, _, filename = obj['Key'].partition('/')
+                # objects at the top level belong to no name
+                if not filename:
+                    continue
+                listed.setdefault(name, None)
+                found = (obj['Key'], obj['ETag'], obj['LastModified'].isoformat())
+                # keys are listed in order, so the fallback is the first direct match
+                if filename == METADATA_NAME or (listed[name] is None and self.fallback_prefix and
+                                                 '/' not in filename and filename.startswith(self.fallback_prefix)):
+                    if listed[name] is None or listed[name][0] != f'{name}/{METADATA_NAME}':
+                        listed[name] = found
+        return listed
+
+    def get(self, name: str) -> dict:
+        """Gets the metadata of a single name, revalidated against S3.
+
+        Args:
+            name (str): name of dataset or imageset
+
+        Returns:
+            dict: metadata
+
+        Raises:
+            KeyError: if the name has no metadata on S3
+        """
+        metadata = self.refresh([name], prune=False)[name]
+        if metadata is None:
+            raise KeyError(name)
+        return metadata
+
+    def put(self, name: str, metadata: dict):
+        """Catalogs metadata built locally (e.g. an imageset summary) as the set-wide
+        metadata of a name. The entry is kept until a set-wide metadata.json appears on
+        S3, per-item fallback files never replace it.
+
+        Args:
+            name (str): name of dataset or imageset
+            metadata (dict): metadata
+        """
+        metadata = json.dumps(metadata, indent=2)
+        with self._connect() as db:
+            db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                        (name, f'{name}/{METADATA_NAME}', LOCAL_ETAG, None, metadata))
+        self._write_metadata_file(name, metadata)
+
+    def refresh(self, names: list = None, prune: bool = True) -> dict:
+        """Revalidates the catalog entries of many names in one concurrent sweep.
+        When refreshing every name, the bucket is listed once and only entries whose
+        metadata object changed since they were cataloged are revalidated. Entries of
+        names that are no longer in the bucket are removed when pruning. If S3 cannot be
+        reached, cataloged metadata is returned as is. Names whose metadata cannot be read
+        (e.g. access denied) are skipped, their entries are kept.
+
+        Args:
+            names (list, optional): names to refresh, every name in the bucket if None
+            prune (bool, optional): Defaults to True. Whether to remove entries of
+                names not in 'names'
+
+        Returns:
+            dict: names mapped to their metadata, None for names without metadata or
+                whose metadata could not be read
+        """
+        listed = None
+        if names is None:
+            listed = self.list_entries()
+            names = list(listed)
+        else:
+            names = list(names)
+        with self._connect() as db:
+            entries = {row[0]: row[1:] for row in
+                        db.execute('SELECT name, key, etag, last_modified, metadata FROM entries')}
+
+        skipped = set()
+        def revalidate(name):
+            entry = entries.get(name)
+            local = entry is not None and entry[1] == LOCAL_ETAG
+            if listed is not None:
+                if entry is not None and listed[name] == entry[:3]:
+                    return entry
+                # local metadata is only superseded by set-wide metadata on S3
+                if local and (listed[name] is None or listed[name][0] != entry[0]):
+                    return entry
+                if listed[name] is None and not local:
+                    return None
+            try:
+                fetched = self._revalidate(name, entry and (entry[0], entry[1], entry[3]))
+            except (ClientError, BotoCoreError):
+                skipped.add(name)
+                return None
+            # timestamps are kept as listed, so the next listing compares equal
+            if fetched is not None and listed is not None and listed[name] is not None \
+                    and listed[name][:2] == fetched[:2]:
+                fetched = (fetched[0], fetched[1], listed[name][2], fetched[3])
+            return fetched
+        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+            fetched = list(executor.map(revalidate, names))
+
+        result = {}
+        with self._connect() as db:
+            for name, entry in zip(names, fetched):
+                if name in skipped:
+                    result[name] = None
+                    continue
+                if entry is None:
+                    db.execute('DELETE FROM entries WHERE name = ?', (name,))
+                    result[name] = None
+                    continue
+                key, etag, last_modified, metadata = entry
+                cataloged = entries.get(name)
+                if cataloged is None or cataloged[:2] + cataloged[3:] != (key, etag, metadata):
+                    db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                                (name, key, etag, last_modified, metadata))
+                    self._write_metadata_file(name, metadata)
+                else:
+                    if last_modified is not None and cataloged[2] != last_modified:
+                        db.execute('UPDATE entries SET last_modified = ? WHERE name = ?', (last_modified, name))
+                    if not (self.cache.path / name / METADATA_NAME).exists():
+                        self._write_metadata_file(name, metadata)
+                result[name] = json.loads(metadata)
+            if prune and names:
+                db.execute(f'DELETE FROM entries WHERE name NOT IN ({",".join("?" * len(names))})', names)
+        return result
+
+    def _revalidate(self, name: str, entry: tuple):
+        """Revalidates a single entry, downloading its metadata only if it changed.
+
+        Args:
+            name (str): name of dataset or imageset
+            entry (tuple): cataloged (key, etag, metadata), None if not cataloged
+
+        Returns:
+            tuple: (key, etag, last modified, metadata json), None if the name has no metadata
+        """
+        local = entry is not None and entry[1] == LOCAL_ETAG
+        try:
+            key = f'{name}/{METADATA_NAME}'
+            # names cataloged from a fallback file keep checking for a metadata.json first
+            fetched = self._fetch(key, entry[1] if entry and entry[0] == key and not local else None)
+            if fetched is None and local:
+                # local metadata is only superseded by set-wide metadata on S3
+                return (entry[0], entry[1], None, entry[2])
+            if fetched is None and self.fallback_prefix:
+                response = self._client.list_objects_v2(Bucket=self.bucket_name, Delimiter='/',
+                                                        Prefix=f'{name}/{self.fallback_prefix}', MaxKeys=1)
+                if response.get('Contents'):
+                    key = response['Contents'][0]['Key']
+                    fetched = self._fetch(key, entry[1] if entry and entry[0] == key else None)
+        except (ClientError, BotoCoreError):
+            # offline or no access, fall back to the catalog
+            if entry is None:
+                raise
+            return (entry[0], entry[1], None, entry[2])
+        if fetched is None:
+            return None
+        etag, last_modified, body = fetched
+        if body is None:
+            return (entry[0], entry[1], last_modified, entry[2])
+        metadata = body.decode('utf-8')
+        # only valid metadata is cataloged
+        json.loads(metadata)
+        return (key, etag, last_modified, metadata)
+
+    def _fetch(self, key: str, etag: str = None):
+        """Gets an object if it does not match the given ETag.
+
+        Args:
+            key (str): key of object
+            etag (str, optional): ETag of the cataloged copy of the object
+
+        Returns:
+            tuple: (etag, last modified, body), body None if the object is unchanged,
+                or None if the object does not exist
+        """
+        kwargs = {'Bucket': self.bucket_name, 'Key': key}
+        if etag:
+            kwargs['IfNoneMatch'] = etag
+        try:
+            response = self._client.get_object(**kwargs)
+        except ClientError as e:
+            code = str(e.response.get('Error', {}).get('Code'))
+            if code in NOT_MODIFIED_CODES:
+                return etag, None, None
+            if code in MISSING_CODES:
+                return None
+            raise
+        return response['ETag'], response['LastModified'].isoformat(), response['Body'].read()
+
+    def _write_metadata_file(self, name: str, metadata: str):
+        """Writes metadata to where the rest of ravenml reads it.
+
+        Args:
+            name (str): name of dataset or imageset
+            metadata (str): metadata json
+        """
+        self.cache.ensure_subpath_exists(name)
+        with open(self.cache.path / name / METADATA_NAME, 'w') as f:
+            f.write(metadata)
+
+    @contextmanager
+    def _connect(self):
+        """Context manager opening the catalog database, creating it if necessary.
+        Changes are committed if the block succeeds.
+
+        Yields:
+            Connection: database connection
+        """
+        self.cache.ensure_exists()
+        db = sqlite3.connect(str(self.cache.path / CATALOG_NAME))
+        try:
+            with db:
+                db.execute('CREATE TABLE IF NOT EXISTS entries '
+                            '(name TEXT PRIMARY KEY, key TEXT, etag TEXT, last_modified TEXT, metadata TEXT)')
+                yield db
+        finally:
+            db.close()
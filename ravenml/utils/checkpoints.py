@@ -0,0 +1,171 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Handles completion checkpoints for long running, multi stage pipelines so
+an interrupted run can be resumed.
+"""
+
+import os
+import shutil
+import pickle
+from pathlib import Path
+
+
+# file holding the return value of every completed stage followed by the pipeline state
+CHECKPOINT_NAME = 'checkpoint.pkl'
+
+
+class StageCheckpoints(object):
+    """Represents the checkpoints of one pipeline run. Each completed stage
+    persists the pipeline state and its return value, and finer grained units
+    of work (e.g. shards) can be marked as done individually. Only the state
+    after the latest completed stage is kept, so large state is stored once.
+
+    Args:
+        path (Path): directory checkpoints are stored in
+        resume (bool): whether existing checkpoints should be used. If False,
+            any existing checkpoints are cleared.
+
+    Attributes:
+        path (Path): directory checkpoints are stored in
+    """
+
+    def __init__(self, path: Path, resume: bool=False):
+        self.path = path
+        # return value of each completed stage, loaded on first use
+        self._results = None
+        # state loaded to resume from, dropped once a stage is saved
+        self._state = None
+        # names of state entries that could not be pickled, left out of every save
+        self._unpicklable = set()
+        if not resume:
+            self.clear()
+
+    def is_complete(self, stage: str) -> bool:
+        """Checks if a stage has a completion checkpoint.
+
+        Args:
+            stage (str): name of stage
+
+        Returns:
+            bool: T if stage completed, F if not
+        """
+        return stage in self._load_results()
+
+    def save(self, stage: str, state: dict, result=None):
+        """Persists the completion checkpoint of a stage, replacing the state of the
+        previous stage. The checkpoint is pickled straight into a temporary file which
+        is then renamed, so an interruption never leaves a partial one.
+
+        Args:
+            stage (str): name of stage
+            state (dict): pipeline state after the stage completed, entries that
+                cannot be pickled are left out
+            result (object, optional): return value of the stage
+        """
+        os.makedirs(self.path, exist_ok=True)
+        results = dict(self._load_results())
+        results[stage] = result
+        state = {name: value for name, value in state.items() if name not in self._unpicklable}
+        temp_path = self.path / f'{CHECKPOINT_NAME}.tmp'
+        try:
+            _dump(temp_path, results, state)
+        except Exception:
+            # unpicklable entries are found once and left out of every later save
+            self._unpicklable.update(name for name, value in state.items() if not _is_picklable(value))
+            state = {name: value for name, value in state.items() if name not in self._unpicklable}
+            _dump(temp_path, results, state)
+        os.replace(temp_path, self.path / CHECKPOINT_NAME)
+        self._results = results
+        self._state = None
+
+    def load(self, stage: str) -> tuple:
+        """Loads the completion checkpoint of a stage.
+
+        Args:
+            stage (str): name of stage
+
+        Returns:
+            tuple: pipeline state after the latest completed stage, and the return
+                value of this stage
+        """
+        if self._state is None:
+            with open(self.path / CHECKPOINT_NAME, 'rb') as f:
+                # the stage results come first
+                pickle.load(f)
+                self._state = pickle.load(f)
+        return self._state, self._load_results()[stage]
+
+    def mark_done(self, unit: str):
+        """Marks a unit of work inside a stage as done.
+
+        Args:
+            unit (str): name of unit of work, unique within the run
+        """
+        os.makedirs(self.path / 'done', exist_ok=True)
+        (self.path / 'done' / unit).touch()
+
+    def is_done(self, unit: str) -> bool:
+        """Checks if a unit of work inside a stage was marked as done.
+
+        Args:
+            unit (str): name of unit of work
+
+        Returns:
+            bool: T if done, F if not
+        """
+        return (self.path / 'done' / unit).exists()
+
+    def clear(self):
+        """Removes all checkpoints of the run.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+        self._results = None
+        self._state = None
+
+    def _load_results(self) -> dict:
+        """Loads the return value of every completed stage, without the state.
+
+        Returns:
+            dict: return value of each completed stage
+        """
+        if self._results is None:
+            try:
+                with open(self.path / CHECKPOINT_NAME, 'rb') as f:
+                    self._results = pickle.load(f)
+            except FileNotFoundError:
+                self._results = {}
+        return self._results
+
+class _Discard(object):
+    """File-like object that discards everything written to it."""
+    def write(self, data):
+        return len(data)
+
+def _dump(path: Path, results: dict, state: dict):
+    """Pickles stage results and state into a file, one after the other.
+
+    Args:
+        path (Path): file to write
+        results (dict): return value of each completed stage
+        state (dict): pipeline state
+    """
+    with open(path, 'wb') as f:
+        pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def _is_picklable(obj) -> bool:
+    """Checks if an object can be pickled, without keeping the pickle.
+
+    Args:
+        obj (object): object to check
+
+    Returns:
+        bool: T if picklable, F if not
+    """
+    try:
+        pickle.dump(obj, _Discard(), protocol=pickle.HIGHEST_PROTOCOL)
+        return True
+    except Exception:
+        return False
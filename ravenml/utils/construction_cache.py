@@ -0,0 +1,116 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Persistent cache of objects constructed by dataset writers, so rebuilding a
+dataset only reconstructs images that are new or have changed.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+from pathlib import Path
+from ravenml.utils.local_cache import RMLCache
+
+
+class ConstructionCache(object):
+    """Represents a persistent cache of constructed per-image objects. Entries
+    are keyed by image id, a hash of the image's source metadata file and a hash
+    of the plugin config, so changing either invalidates only the affected entries.
+    Whatever a plugin constructs is cached, so plugins constructing serialized
+    outputs (e.g. encoded records) have those reused as well.
+
+    Args:
+        plugin_name (str): name of the plugin constructing objects, each plugin
+            gets its own cache
+        plugin_config (dict): plugin section of the create config
+
+    Attributes:
+        cache (RMLCache): cache objects are stored in
+        config_hash (str): hash of the plugin config
+        hits (int): number of objects found in the cache
+        misses (int): number of objects not found in the cache
+    """
+
+    def __init__(self, plugin_name: str, plugin_config: dict):
+        self.cache = RMLCache(Path('construction_cache') / plugin_name)
+        self.config_hash = hash_config(plugin_config)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, imageset: str, image_id: str, metadata_path: Path=None) -> str:
+        """Computes the cache key of an image.
+
+        Args:
+            imageset (str): name of imageset the image belongs to
+            image_id (str): id of image
+            metadata_path (Path, optional): path to the image's source metadata file
+
+        Returns:
+            str: cache key
+        """
+        key = hashlib.sha256()
+        for part in [imageset, image_id, self.config_hash]:
+            key.update(part.encode('utf-8'))
+            key.update(b'\0')
+        if metadata_path is not None:
+            with open(metadata_path, 'rb') as f:
+                key.update(hashlib.sha256(f.read()).digest())
+        return key.hexdigest()
+
+    def get(self, key: str) -> tuple:
+        """Gets a cached object.
+
+        Args:
+            key (str): cache key
+
+        Returns:
+            tuple: whether the object was found, and the object itself (None if not found)
+        """
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                obj = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, obj
+
+    def put(self, key: str, obj):
+        """Caches an object. The entry is written to a temporary file first so
+        an interrupted build never leaves a partial entry behind.
+
+        Args:
+            key (str): cache key
+            obj (object): object to cache, must be picklable
+        """
+        entry_path = self._entry_path(key)
+        os.makedirs(entry_path.parent, exist_ok=True)
+        temp_path = entry_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(temp_path, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, entry_path)
+
+    def _entry_path(self, key: str) -> Path:
+        """Gets the path of a cache entry, entries are spread over subdirectories
+        to keep directory sizes manageable.
+
+        Args:
+            key (str): cache key
+
+        Returns:
+            Path: path to entry
+        """
+        return self.cache.path / key[:2] / f'{key}.pkl'
+
+def hash_config(config: dict) -> str:
+    """Hashes a config dict independent of key order.
+
+    Args:
+        config (dict): config to hash
+
+    Returns:
+        str: hash of config
+    """
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()
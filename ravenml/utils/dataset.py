@@ -5,14 +5,19 @@ Date Created:   03/13/2019
 Utility module for managing Jigsaw created datasets.
 """
 
+import os
 import json
 import boto3
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from ravenml.utils.local_cache import RMLCache
 from ravenml.utils.config import get_config
 from ravenml.utils.aws import list_top_level_bucket_prefixes, download_prefix
 from ravenml.data.interfaces import Dataset
+from ravenml.utils.hashing import CHECKSUM_MANIFEST_NAME, verify_checksum_manifest
+from ravenml.utils.pack import is_pack_complete
+from ravenml.utils.catalog import MetadataCatalog
 
 dataset_cache = RMLCache('datasets')
 # name of dataset bucket field inside config dict
@@ -29,30 +34,86 @@ def get_dataset_names() -> list:
     return list_top_level_bucket_prefixes(config[BUCKET_FIELD])
 
 def get_dataset_metadata(name: str, no_check=False) -> dict:
-    """Retrieves dataset metadata. Downloads from S3 if necessary.
+    """Retrieves dataset metadata through the local metadata catalog, which downloads
+    it from S3 only if it changed since it was last cataloged.
 
     Args:
         name (str): string name of dataset
-        no_check (bool, optional): whether to verify metadata existence
+        no_check (bool, optional): whether to skip revalidating metadata and read
+            the local copy as is
 
     Returns:
         dict: dataset metadata
         
     Raises:
-        ValueError: if given dataset name is invalid (re raised)
+        ValueError: if given dataset name is invalid
     """
     if not no_check:
         try:
-            _ensure_metadata(name)
-        except ValueError:
-            raise
+            return _get_catalog().get(name)
+        except KeyError as e:
+            raise ValueError(name) from e
     return json.load(open(dataset_cache.path / Path(name) / 'metadata.json'))
 
-def get_dataset(name: str) -> Dataset:
+def get_datasets_metadata(names: list = None) -> dict:
+    """Retrieves the metadata of many datasets in one revalidation sweep of the local
+    metadata catalog, downloading only metadata that changed since it was last cataloged.
+
+    Args:
+        names (list, optional): string names of datasets, every dataset if None
+
+    Returns:
+        dict: dataset names mapped to their metadata, None for datasets without metadata
+    """
+    return _get_catalog().refresh(names, prune=names is None)
+
+def verify_dataset(name: str) -> list:
+    """Checks the locally cached copy of a dataset against its checksum manifest.
+    The manifest is downloaded from S3 if it is not cached.
+
+    Args:
+        name (str): string name of dataset
+
+    Returns:
+        list: paths, relative to the dataset root, of files that are missing or corrupt
+
+    Raises:
+        ValueError: if the dataset is not cached locally or has no checksum manifest
+    """
+    if not dataset_cache.subpath_exists(Path(name) / 'metadata.json'):
+        raise ValueError(name)
+    return verify_checksum_manifest(_ensure_file(name, CHECKSUM_MANIFEST_NAME).parent)
+
+def fetch_dataset_files(name: str, files: list, num_threads: int = 16):
+    """Downloads individual files of a dataset into the local cache, replacing
+    any local copies.
+
+    Args:
+        name (str): string name of dataset
+        files (list): paths of files relative to the dataset root
+        num_threads (int, optional): Defaults to 16. Number of concurrent downloads.
+    """
+    config = get_config()
+    # boto3 clients, unlike resources, are safe to share between threads
+    client = boto3.client('s3')
+    def fetch(relative_path):
+        local_path = dataset_cache.path / name / relative_path
+        os.makedirs(local_path.parent, exist_ok=True)
+        client.download_file(config[BUCKET_FIELD], f'{name}/{relative_path}', str(local_path))
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        list(executor.map(fetch, files))
+
+def get_dataset(name: str, background: bool = False, sync: bool = True) -> Dataset:
     """Retrives a dataset. Downloads from S3 if necessary.
 
     Args:
         name (str): string name of dataset
+        background (bool, optional): Defaults to False. Whether to return as soon as the
+            dataset's metadata is available and download the dataset in a background
+            thread. The returned dataset's 'path' and file access wait for the download,
+            see 'Dataset.wait_ready'.
+        sync (bool, optional): Defaults to True. Whether to sync the dataset with S3, otherwise
+            the local copy is used as is, e.g. when it was just synced by another process
     
     Returns:
         Dataset: dataset itself
@@ -61,6 +122,18 @@ def get_dataset(name: str) -> Dataset:
         ValueError: if dataset name is invalid (re raised)
     """
     try:
+        if not sync:
+            try:
+                return Dataset(name, get_dataset_metadata(name, no_check=True), dataset_cache.path / Path(name))
+            except FileNotFoundError as e:
+                raise ValueError(name) from e
+        if background:
+            metadata = get_dataset_metadata(name)
+            executor = ThreadPoolExecutor(max_workers=1)
+            ready = executor.submit(_ensure_dataset, name)
+            # the thread exits once the download is done
+            executor.shutdown(wait=False)
+            return Dataset(name, metadata, dataset_cache.path / Path(name), ready=ready)
         _ensure_dataset(name)
         return Dataset(name, get_dataset_metadata(name, no_check=True), dataset_cache.path / Path(name))
     except ValueError:
@@ -68,27 +141,37 @@ def get_dataset(name: str) -> Dataset:
  
 
 ### PRIVATE HELPERS ###
-def _ensure_metadata(name: str):
-    """Ensure dataset metadata exists.
+def _get_catalog() -> MetadataCatalog:
+    """Gets the metadata catalog of the dataset bucket, stored in the dataset cache.
+
+    Returns:
+        MetadataCatalog: dataset metadata catalog
+    """
+    return MetadataCatalog(get_config()[BUCKET_FIELD], dataset_cache)
+
+def _ensure_file(name: str, filename: str) -> Path:
+    """Ensures a single file of a dataset exists, without downloading the whole dataset.
 
     Args:
         name (str): name of dataset
-        
+        filename (str): path of file relative to the dataset root
+
+    Returns:
+        Path: local path of file
+
     Raises:
-        ValueError: if dataset name is invalid and metadata cannot be downloaded.
+        ValueError: if the file cannot be downloaded
     """
-    S3 = boto3.resource('s3')
-    config = get_config()
-    DATASET_BUCKET = S3.Bucket(config['dataset_bucket_name'])
-    metadata_path = Path(name) / 'metadata.json'
-    if not dataset_cache.subpath_exists(metadata_path):
+    local_path = dataset_cache.path / name / filename
+    if not local_path.exists():
         dataset_cache.ensure_subpath_exists(name)
-        metadata_key = f'{name}/metadata.json'
-        metadata_absolute_path = dataset_cache.path / metadata_path
+        S3 = boto3.resource('s3')
+        config = get_config()
         try:
-            DATASET_BUCKET.download_file(metadata_key, str(metadata_absolute_path))
+            S3.Bucket(config[BUCKET_FIELD]).download_file(f'{name}/{filename}', str(local_path))
         except ClientError as e:
             raise ValueError(name) from e
+    return local_path
 
 def _ensure_dataset(name: str):
     """Ensures dataset exists.
@@ -99,6 +182,11 @@ def _ensure_dataset(name: str):
     Raises:
         ValueError: if dataset name is invalid (no matching objects in S3 bucket)
     """
+    # the packed files of a complete pack may have been removed, which a sync would
+    # download again. The blobs are checked, not just the index, as a sync downloads
+    # objects in any order and may have been interrupted
+    if is_pack_complete(dataset_cache.path / name):
+        return
     config = get_config()
     if not download_prefix(config[BUCKET_FIELD], name, dataset_cache):
         raise ValueError(name)
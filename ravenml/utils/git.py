@@ -5,20 +5,35 @@ Data Created:   11/09/2020
 Utility functions for grabbing git information to place into metadata.
 """
 
-import subprocess
+import sys
+import gzip
 import json
-from os import chdir, listdir
+import base64
+import subprocess
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# seconds any single git command may run before it is abandoned
+GIT_TIMEOUT = 10
+# patches larger than this are gzipped and base64 encoded in metadata
+PATCH_COMPRESS_BYTES = 64 * 1024
+# patches larger than this are truncated before compression
+PATCH_MAX_BYTES = 4 * 1024 * 1024
+COMPRESSED_PATCH_PREFIX = 'gzip+base64:'
+TRUNCATED_PATCH_MARKER = '\n[patch truncated by ravenml]\n'
+
+# git info collected in this process, keyed by repo root, HEAD and index mtime
+_git_info_cache = {}
 
 def is_repo(path: Path):
     """ Checks if the given path is in a github repository by detecting a .git directory.
-    
+
     Starting at the given path, the tree is traversed recursively until the .git is found,
     or the root of the file tree is reached.
 
     Args:
         path (Path): path to a directory
-    
+
     Returns:
         str: path to root of the repository, None otherwise
     """
@@ -30,96 +45,168 @@ def is_repo(path: Path):
         parent_path = path.parent
     return None
 
+def collect_git_info(path: Path, prefix: str) -> dict:
+    """ Collects the git provenance of the code at the given path for metadata.
+
+    If the path is in a git repository, the HEAD SHA and patches for tracked and
+    untracked files are collected by running git in parallel in the repo root. Results
+    are cached for the life of the process, keyed by the repo root, HEAD and the
+    mtime of the index, so repeated calls for the same repo (e.g. ravenml and a plugin
+    installed from the same checkout) run git once. Otherwise, git info is retrieved
+    from the installed package with 'retrieve_from_pkg'.
+
+    This function catches all exceptions to make it safe to call at the end of
+    dataset creation or model training.
+
+    Args:
+        path (Path): path to a directory inside the code to collect info for
+        prefix (str): prefix of the metadata keys, i.e. 'ravenml' or 'plugin'
+
+    Returns:
+        dict: git info with keys '<prefix>_git_sha', '<prefix>_tracked_git_patch' and
+            '<prefix>_untracked_git_patch', or the info retrieved from the package
+    """
+    repo_root = is_repo(path)
+    if not repo_root:
+        return retrieve_from_pkg(path)
+    key = _cache_key(repo_root)
+    info = _git_info_cache.get(key) if key else None
+    if info is None:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            sha = executor.submit(git_sha, repo_root)
+            tracked = executor.submit(git_patch_tracked, repo_root)
+            untracked = executor.submit(git_patch_untracked, repo_root)
+            info = {
+                'git_sha': sha.result(),
+                'tracked_git_patch': encode_patch(tracked.result()),
+                'untracked_git_patch': encode_patch(untracked.result())
+            }
+        if key:
+            _git_info_cache[key] = info
+    return {f'{prefix}_{field}': value for field, value in info.items()}
+
+def find_module_dir(obj=None, depth: int = 1) -> Path:
+    """ Finds the directory of the module defining an object or calling a function.
+    Frames are walked directly rather than with inspect.stack, which reads source
+    for every frame.
+
+    Args:
+        obj (object, optional): object whose class module is located. If its class is
+            defined inside ravenml, the first caller outside ravenml is used instead
+        depth (int, optional): number of frames above the caller of this function to
+            locate when 'obj' is None. Defaults to 1, the caller's caller
+
+    Returns:
+        Path: directory of the module
+    """
+    if obj is not None:
+        module = sys.modules.get(type(obj).__module__)
+        module_file = getattr(module, '__file__', None)
+        if module_file and not type(obj).__module__.startswith('ravenml.'):
+            return Path(module_file).resolve().parent
+        # skip frames inside ravenml to reach the plugin code driving the object
+        frame = sys._getframe(1)
+        while frame.f_back and frame.f_globals.get('__name__', '').startswith('ravenml.'):
+            frame = frame.f_back
+    else:
+        frame = sys._getframe(depth + 1)
+    return Path(frame.f_globals.get('__file__', Path.cwd() / '__main__')).resolve().parent
+
+def encode_patch(patch: str) -> str:
+    """ Caps the size of a patch and compresses it if it is large.
+
+    Args:
+        patch (str): patch to encode
+
+    Returns:
+        str: patch unchanged if small, otherwise the (possibly truncated) patch
+            gzipped, base64 encoded and prefixed with COMPRESSED_PATCH_PREFIX
+    """
+    raw = patch.encode('utf-8')
+    if len(raw) <= PATCH_COMPRESS_BYTES:
+        return patch
+    if len(raw) > PATCH_MAX_BYTES:
+        raw = raw[:PATCH_MAX_BYTES] + TRUNCATED_PATCH_MARKER.encode('utf-8')
+    return COMPRESSED_PATCH_PREFIX + base64.b64encode(gzip.compress(raw)).decode('ascii')
+
+def decode_patch(patch: str) -> str:
+    """ Restores a patch encoded by 'encode_patch'.
+
+    Args:
+        patch (str): patch as stored in metadata
+
+    Returns:
+        str: plain text patch
+    """
+    if not patch.startswith(COMPRESSED_PATCH_PREFIX):
+        return patch
+    raw = gzip.decompress(base64.b64decode(patch[len(COMPRESSED_PATCH_PREFIX):]))
+    return raw.decode('utf-8', errors='replace')
+
 def git_sha(path: Path) -> str:
-    """ Find SHA hash of the current HEAD in the repository. 
+    """ Find SHA hash of the current HEAD in the repository.
 
     This function catches all exceptions to make it safe to call at the end of
     dataset creation or model training.
 
     Args:
         path (Path): path to a directory inside a git repo
-    
+
     Returns:
         str: SHA hash of current HEAD, or error message if unable to execute cmd
     """
-    # store cwd and change to path
-    cwd = Path.cwd()
-    chdir(path)
-    # execute command 
-    rev_check = "git rev-parse HEAD"
     try:
-        out = subprocess.check_output(rev_check.split()).strip().decode('utf-8')
+        return _run_git(path, 'rev-parse', 'HEAD').strip()
     except Exception as e:
-        out = str(e)
-    # restore cwd
-    chdir(cwd)
-    return out
+        return str(e)
 
 def git_patch_tracked(path: Path) -> str:
     """ Generate a patchfile of the diff for all tracked files in the repo
 
     This function catches all exceptions to make it safe to call at the end of
     dataset creation or model training
-    
+
     Args:
         path (Path): path to a directory inside a git repo. Unless you have a reason
             not to, this should be the root of the repo for maximum coverage
-    
+
     Returns:
         str: patchfile for tracked files, or error message if unable to excecute cmd
     """
-    # store cwd and change to path
-    cwd = Path.cwd()
-    chdir(path)
-    # execute command
-    tracked_patch = "git --no-pager diff -u ."
     try:
-        out = subprocess.check_output(tracked_patch.split()).decode('utf-8')
+        return _run_git(path, '--no-pager', 'diff', '-u', '.')
     except Exception as e:
-        out = str(e)
-    # restore cwd
-    chdir(cwd)
-    return out
-    
+        return str(e)
+
 def git_patch_untracked(path: Path) -> str:
     """ Generate a patchfile of the diff for all untracked files in the repo
-    
+
     This function catches all exceptions to make it safe to call at the end of
     dataset creation or model training
-    
+
     Args:
         path (Path): path to a directory inside a git repo. Unless you have a reason
             not to, this should be the root of the repo for maximum coverage
-    
+
     Returns:
         str: patchfile for untracked files, or error message if unable to execute cmd
     """
-    # store cwd and change to path
-    cwd = Path.cwd()
-    chdir(path)
-    # execute command
-    git_ls = "git ls-files --others --exclude-standard"
-    xargs = "xargs -n 1 git --no-pager diff /dev/null"
-    # getting untracked files is a piped operation and thus cannot be done
-    # with a simple subprocess.check_output call
     try:
-        untracked_files = subprocess.check_output(git_ls.split()).decode('utf-8')
-        if len(untracked_files) == 0: 
-            chdir(cwd)
-            return ''
-        p = subprocess.Popen(xargs.split(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, 
-                                stderr=subprocess.PIPE)
-        try:
-            untracked_patch, err = p.communicate(input=untracked_files.encode(), timeout=5)
-        except TimeoutExpired:
-            p.kill()
-            _, err = p.communicate()
+        untracked_files = _run_git(path, 'ls-files', '-z', '--others', '--exclude-standard').split('\0')
+        patches = []
+        size = 0
+        for untracked_file in filter(None, untracked_files):
+            # git diff --no-index exits with 1 when files differ, which is always the case here
+            patch = _run_git(path, '--no-pager', 'diff', '--no-index', '--', '/dev/null',
+                untracked_file, ok_codes=(0, 1))
+            patches.append(patch)
+            size += len(patch)
+            # anything past the cap is truncated by encode_patch anyway
+            if size > PATCH_MAX_BYTES:
+                break
+        return ''.join(patches)
     except Exception as e:
-        # encode so return line works
-        err = str(e).encode(encoding='UTF-8')
-    # restore cwd
-    chdir(cwd)
-    return untracked_patch.decode('utf-8') if len(err) == 0 else err.decode('utf-8')
+        return str(e)
 
 def retrieve_from_pkg(path: Path):
     """ Retrieves git information from the installed package location if possible.
@@ -143,4 +230,49 @@ def retrieve_from_pkg(path: Path):
         path = parent_path
         parent_path = path.parent
     return {}
-    
\ No newline at end of file
+
+def _run_git(path: Path, *args, ok_codes=(0,)) -> str:
+    """ Runs a git command in the given directory without changing the process cwd.
+
+    Args:
+        path (Path): directory to run git in
+        *args: arguments to git
+        ok_codes (tuple, optional): exit codes considered successful
+
+    Returns:
+        str: stdout of the command
+
+    Raises:
+        subprocess.CalledProcessError: if git exits with a code not in ok_codes
+        subprocess.TimeoutExpired: if git runs longer than GIT_TIMEOUT
+    """
+    cmd = ['git'] + list(args)
+    proc = subprocess.run(cmd, cwd=str(path), stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, timeout=GIT_TIMEOUT)
+    if proc.returncode not in ok_codes:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, proc.stdout, proc.stderr)
+    return proc.stdout.decode('utf-8', errors='replace')
+
+def _cache_key(repo_root: Path):
+    """ Builds the cache key for a repo from its HEAD and index mtime, read directly
+    from the .git directory.
+
+    Args:
+        repo_root (Path): root of the repo
+
+    Returns:
+        tuple: cache key, or None if the repo layout is not understood (e.g. worktrees)
+    """
+    git_dir = repo_root / '.git'
+    try:
+        head = (git_dir / 'HEAD').read_text().strip()
+        if head.startswith('ref: '):
+            ref_path = git_dir / head[len('ref: '):]
+            # packed refs have no loose file, fall back to the packed-refs mtime
+            ref_file = ref_path if ref_path.exists() else git_dir / 'packed-refs'
+            head = (head, ref_file.read_text().strip() if ref_path.exists() else ref_file.stat().st_mtime)
+        index = git_dir / 'index'
+        index_mtime = index.stat().st_mtime_ns if index.exists() else None
+    except OSError:
+        return None
+    return (str(repo_root.resolve()), head, index_mtime)
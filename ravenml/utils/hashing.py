@@ -0,0 +1,226 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Content hashing of local files, with a persistent index so unchanged files
+are never hashed twice, and checksum manifests for verifying local copies.
+"""
+
+import os
+import json
+import mmap
+import zlib
+import hashlib
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from ravenml.utils.local_cache import RMLCache
+
+# bytes read at a time while hashing
+CHUNK_SIZE = 1024 * 1024
+# name of the checksum manifest written into the root of a dataset
+CHECKSUM_MANIFEST_NAME = 'checksums.json'
+
+
+class HashIndex(object):
+    """Represents the persistent content hashes of files in a single directory.
+    An entry is reused as long as the file's size and mtime are unchanged.
+
+    Args:
+        directory (Path): directory whose files are indexed
+
+    Attributes:
+        directory (Path): directory whose files are indexed
+        index_path (Path): file the index is stored in
+        entries (dict): file name keys with [size, mtime_ns, digest] values
+        dirty (bool): whether entries changed since the index was loaded
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory).resolve()
+        cache = RMLCache('hash_index')
+        name = hashlib.sha1(str(self.directory).encode('utf-8')).hexdigest()
+        self.index_path = cache.path / f'{name}.json'
+        self.dirty = False
+        try:
+            with open(self.index_path, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, path: Path, stat: os.stat_result):
+        """Gets the indexed digest of a file, if it has not changed.
+
+        Args:
+            path (Path): file in the indexed directory
+            stat (stat_result): current stat of the file
+
+        Returns:
+            str: hex digest, None if not indexed or changed
+        """
+        entry = self.entries.get(path.name)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        return None
+
+    def put(self, path: Path, stat: os.stat_result, digest: str):
+        """Indexes the digest of a file.
+
+        Args:
+            path (Path): file in the indexed directory
+            stat (stat_result): stat of the file when it was hashed
+            digest (str): hex digest of the file
+        """
+        self.entries[path.name] = [stat.st_size, stat.st_mtime_ns, digest]
+        self.dirty = True
+
+    def save(self):
+        """Writes the index if it changed. The index is written to a temporary
+        file first so an interrupted write never corrupts it.
+        """
+        if not self.dirty:
+            return
+        os.makedirs(self.index_path.parent, exist_ok=True)
+        temp_path = self.index_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.index_path)
+        self.dirty = False
+
+
+def hash_file(path: Path) -> str:
+    """Computes the BLAKE2b content hash of a file.
+
+    Args:
+        path (Path): file to hash
+
+    Returns:
+        str: hex digest
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_files(paths: list, num_threads: int = 16) -> list:
+    """Computes content hashes of many files concurrently. Digests found in the
+    persistent hash index of each file's directory are reused, and new digests
+    are added to it.
+
+    Args:
+        paths (list): Paths of files to hash
+        num_threads (int, optional): Defaults to 16. Number of threads hashing
+            concurrently.
+
+    Returns:
+        list: hex digest of each path, in order, None for paths that are not files
+    """
+    indexes = {}
+    digests = [None] * len(paths)
+    pending = []
+    for i, path in enumerate(paths):
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        index = indexes.get(path.parent)
+        if index is None:
+            index = indexes[path.parent] = HashIndex(path.parent)
+        digests[i] = index.get(path, stat)
+        if digests[i] is None:
+            pending.append((i, path, stat, index))
+
+    # hashing releases the GIL, so threads hash in parallel
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        for (i, path, stat, index), digest in zip(pending, executor.map(lambda item: hash_file(item[1]), pending)):
+            digests[i] = digest
+            index.put(path, stat, digest)
+    for index in indexes.values():
+        index.save()
+    return digests
+
+def checksum_file(path: Path) -> str:
+    """Computes the CRC32 checksum of a file. The file is memory-mapped and hashed
+    in chunks of the mapping, so no copies of the file are made in Python.
+
+    Args:
+        path (Path): file to checksum
+
+    Returns:
+        str: CRC32 as 8 hex digits
+    """
+    crc = 0
+    with open(path, 'rb') as f:
+        # empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for start in range(0, len(view), CHUNK_SIZE):
+                        crc = zlib.crc32(view[start:start + CHUNK_SIZE], crc)
+                finally:
+                    view.release()
+    return f'{crc:08x}'
+
+def write_checksum_manifest(directory: Path, num_threads: int = 16) -> dict:
+    """Writes the size and CRC32 checksum of every file in a directory to
+    CHECKSUM_MANIFEST_NAME in its root. Files are checksummed concurrently.
+
+    Args:
+        directory (Path): directory to write the manifest for
+        num_threads (int, optional): Defaults to 16. Number of threads
+            checksumming concurrently.
+
+    Returns:
+        dict: the manifest, with relative file path keys and [size, checksum] values
+            under 'files'
+    """
+    directory = Path(directory)
+    paths = [Path(root) / name for root, _, names in os.walk(directory) for name in names]
+    paths = [path for path in paths if path != directory / CHECKSUM_MANIFEST_NAME]
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        checksums = list(executor.map(checksum_file, paths))
+    manifest = {
+        'algorithm': 'crc32',
+        'files': {path.relative_to(directory).as_posix(): [path.stat().st_size, checksum]
+                    for path, checksum in zip(paths, checksums)}
+    }
+    with open(directory / CHECKSUM_MANIFEST_NAME, 'w') as f:
+        json.dump(manifest, f)
+    return manifest
+
+def verify_checksum_manifest(directory: Path, num_threads: int = 16) -> list:
+    """Checks the files of a directory against its checksum manifest. Files whose
+    size differs are reported without being read, the rest are checksummed concurrently.
+
+    Args:
+        directory (Path): directory containing a manifest written by 'write_checksum_manifest'
+        num_threads (int, optional): Defaults to 16. Number of threads
+            checksumming concurrently.
+
+    Returns:
+        list: relative paths of files that are missing or corrupt, sorted
+
+    Raises:
+        FileNotFoundError: if the directory has no checksum manifest
+    """
+    directory = Path(directory)
+    with open(directory / CHECKSUM_MANIFEST_NAME, 'r') as f:
+        files = json.load(f)['files']
+    bad = []
+    candidates = []
+    for relative_path, (size, checksum) in files.items():
+        path = directory / relative_path
+        try:
+            if path.stat().st_size != size:
+                bad.append(relative_path)
+                continue
+        except OSError:
+            bad.append(relative_path)
+            continue
+        candidates.append((relative_path, checksum))
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        actual = executor.map(lambda item: checksum_file(directory / item[0]), candidates)
+        bad += [relative_path for (relative_path, checksum), result in zip(candidates, actual) if result != checksum]
+    return sorted(bad)
@@ -5,13 +5,18 @@ Date Created:   03/13/2019
 Utility module for managing Jigsaw created datasets.
 """
 
+import os
 import json
 import boto3
 from pathlib import Path
+from datetime import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 from ravenml.utils.local_cache import RMLCache
 from ravenml.utils.config import get_config
 from ravenml.utils.aws import list_top_level_bucket_prefixes
+from ravenml.utils.catalog import MetadataCatalog
 
 imageset_cache = RMLCache('imagesets')
 # name of config field
@@ -28,27 +33,169 @@ def get_imageset_names() -> list:
     return list_top_level_bucket_prefixes(config[BUCKET_FIELD])
 
 def get_imageset_metadata(name: str, no_check=False) -> dict:
-    """Retrieves imageset metadata. Downloads from S3 if necessary.
+    """Retrieves imageset metadata through the local metadata catalog, which downloads
+    it from S3 only if it changed since it was last cataloged.
+    NOTE: not all imagesets have imageset wide metadata files. In that case, the
+    first image metadata file is cataloged and its fields are reported instead.
 
     Args:
         name (str): string name of imageset
-        no_check (bool, optional): whether to verify metadata existence
+        no_check (bool, optional): whether to skip revalidating metadata and read
+            the local copy as is
 
     Returns:
         dict: imageset metadata
         
     Raises:
         ValueError: if given imageset name is invalid
+        KeyError: if the imageset does not contain any metadata files
     """
     if not no_check:
         try:
-            _ensure_metadata(name)
+            return _get_catalog().get(name)
         except ClientError as e:
             raise ValueError(name) from e
-        except StopIteration as e:
-            raise KeyError(name) from e
+        except KeyError:
+            # names without metadata files are only valid if the imageset exists
+            response = boto3.client('s3').list_objects_v2(Bucket=get_config()[BUCKET_FIELD],
+                                                          Prefix=f'{name}/', MaxKeys=1)
+            if not response.get('Contents'):
+                raise ValueError(name)
+            raise
     return json.load(open(imageset_cache.path / Path(name) / 'metadata.json'))
 
+def get_imagesets_metadata(names: list = None) -> dict:
+    """Retrieves the metadata of many imagesets in one revalidation sweep of the local
+    metadata catalog, downloading only metadata that changed since it was last cataloged.
+
+    Args:
+        names (list, optional): string names of imagesets, every imageset if None
+
+    Returns:
+        dict: imageset names mapped to their metadata, None for imagesets without metadata
+    """
+    return _get_catalog().refresh(names, prune=names is None)
+
+def summarize_imageset(name: str, metadata_prefix: str = 'meta_', upload: bool = False,
+                        num_threads: int = 32) -> dict:
+    """Builds set-wide metadata for an imageset from its image metadata files, without
+    downloading any images. Objects are listed once to count images, files by type and
+    bytes, and only the metadata files are read, concurrently, to count tags. Summary
+    fields are merged into any existing set-wide metadata, and the result is cataloged
+    locally (so 'get_imageset_metadata' returns it) and written to the imageset cache
+    as metadata.json.
+
+    Args:
+        name (str): string name of imageset
+        metadata_prefix (str, optional): Defaults to 'meta_'. Prefix of image metadata files
+        upload (bool, optional): Defaults to False. Whether to also upload the set-wide
+            metadata to S3, where it replaces the sample image metadata shown for the imageset
+        num_threads (int, optional): Defaults to 32. Number of concurrent metadata reads
+
+    Returns:
+        dict: set-wide metadata
+
+    Raises:
+        ValueError: if the imageset has no image metadata files
+    """
+    bucket_name = get_config()[BUCKET_FIELD]
+    # boto3 clients, unlike resources, are safe to share between threads
+    client = boto3.client('s3')
+    file_types = Counter()
+    metadata_keys = []
+    num_bytes = 0
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=f'{name}/'):
+        for obj in page.get('Contents', []):
+            filename = obj['Key'][len(name) + 1:]
+            # only files of images, named '<prefix><image_id><suffix>', are summarized
+            if '/' in filename or filename == 'metadata.json':
+                continue
+            stem, suffix = os.path.splitext(filename)
+            file_types[f'{stem[:stem.rfind("_") + 1]}*{suffix}'] += 1
+            num_bytes += obj['Size']
+            if filename.startswith(metadata_prefix) and suffix == '.json':
+                metadata_keys.append(obj['Key'])
+    if len(metadata_keys) == 0:
+        raise ValueError(name)
+
+    # tags are read the same way 'read_json_metadata' reads them when creating datasets
+    def read_tags(key):
+        data = json.loads(client.get_object(Bucket=bucket_name, Key=key)['Body'].read())
+        return data.get('tags') or ['untagged']
+    tags = Counter()
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        for image_tags in executor.map(read_tags, metadata_keys):
+            tags.update(image_tags)
+
+    try:
+        metadata = json.loads(client.get_object(Bucket=bucket_name, Key=f'{name}/metadata.json')['Body'].read())
+    except ClientError as e:
+        if str(e.response.get('Error', {}).get('Code')) not in ['404', 'NoSuchKey']:
+            raise
+        metadata = {}
+    metadata.update({
+        'imageset_name': name,
+        'num_images': len(metadata_keys),
+        'num_files': sum(file_types.values()),
+        'total_bytes': num_bytes,
+        'file_type_counts': dict(file_types.most_common()),
+        'tag_counts': dict(tags.most_common()),
+        'summarized_at': datetime.utcnow().isoformat() + 'Z'
+    })
+    _get_catalog().put(name, metadata)
+    if upload:
+        client.put_object(Bucket=bucket_name, Key=f'{name}/metadata.json', Body=json.dumps(metadata, indent=2))
+    return metadata
+
+class ImagesetStager(object):
+    """Fetches individual files of imagesets that were only partially downloaded,
+    e.g. only their metadata files, so images can be filtered on their metadata
+    first and only the files of selected images are ever downloaded.
+
+    Args:
+        bucket_name (str): name of image bucket
+        num_threads (int, optional): Defaults to 16. Number of concurrent downloads
+
+    Attributes:
+        bucket_name (str): name of image bucket
+        num_threads (int): number of concurrent downloads
+        num_fetched (int): number of files downloaded so far
+    """
+
+    def __init__(self, bucket_name: str, num_threads: int = 16):
+        self.bucket_name = bucket_name
+        self.num_threads = num_threads
+        self.num_fetched = 0
+
+    def fetch(self, image_ids, associated_files: list):
+        """Downloads the associated files of images that are not present locally.
+        Files that do not exist on S3 are skipped, as they are when copying.
+
+        Args:
+            image_ids (list): tuples with paths to a local imageset directory, named
+                after the imageset, paired with an image id in that imageset
+            associated_files (list): prefix-suffix pairs of files to fetch
+        """
+        file_types = set(associated_files)
+        paths = [imageset_path / f'{prefix}{image_id}{suffix}'
+                    for imageset_path, image_id in image_ids for prefix, suffix in file_types]
+        paths = [path for path in paths if not path.exists()]
+        if len(paths) == 0:
+            return
+        # boto3 clients, unlike resources, are safe to share between threads
+        client = boto3.client('s3')
+        def fetch_file(path):
+            try:
+                client.download_file(self.bucket_name, f'{path.parent.name}/{path.name}', str(path))
+                return 1
+            except ClientError as e:
+                if str(e.response.get('Error', {}).get('Code')) in ['404', 'NoSuchKey']:
+                    return 0
+                raise
+        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+            self.num_fetched += sum(executor.map(fetch_file, paths))
+
 # NOTE: this function is left here as a template for the eventual "get_imageset" function
 # not implemented yet because we may find a better way to get image sets than actually downloading them locally
 # def get_dataset(name: str) -> Dataset:
@@ -71,45 +218,15 @@ def get_imageset_metadata(name: str, no_check=False) -> dict:
  
 
 ### PRIVATE HELPERS ###
-def _ensure_metadata(name: str):
-    """Ensure imageset metadata exists.
-    NOTE: This function works around the fact that we don't have
-    imageset wide metadata files for all imagesets. In that case, it
-    picks a random metadata file and reports the fields contained within.
+def _get_catalog() -> MetadataCatalog:
+    """Gets the metadata catalog of the image bucket, stored in the imageset cache.
+    Imagesets without set-wide metadata are cataloged from their first image
+    metadata file.
 
-    Args:
-        name (str): name of imageset
-        
-    Raises:
-        ClientError: If the given imageset name does not exist in the S3 bucket.
-        StopIteration: If the given imageset does not have any metadata files named according to the standard scheme.
+    Returns:
+        MetadataCatalog: imageset metadata catalog
     """
-    S3 = boto3.resource('s3')
-    config = get_config()
-    image_bucket = S3.Bucket(config[BUCKET_FIELD])
-    cache_metadata_path = Path(name) / 'metadata.json'      # relative path inside the cache where metadata will go
-    if not imageset_cache.subpath_exists(cache_metadata_path):
-        imageset_cache.ensure_subpath_exists(name)
-        # attempt to download set-wide metadata.json
-        imageset_bucket_metadata_key = f'{name}/metadata.json'
-        metadata_download_absolute_path = imageset_cache.path / cache_metadata_path
-        try:
-            # attempt to grab imageset-wide metadata
-            image_bucket.download_file(imageset_bucket_metadata_key, str(metadata_download_absolute_path))
-        except ClientError as e:
-            # fallback to grabbing a single image metadata file (better than nothing)
-            prefix = f'{name}/meta_'
-            # get all items in bucket with this prefix, but limit results to 1
-            image_metadata_key_collection = image_bucket.objects.filter(Delimiter='/', Prefix=prefix).limit(1)
-            # filter() returns a collection iterable, which we must convert to an iterator (generator) and call next on
-            try:
-                image_metadata_key = next(iter(image_metadata_key_collection)).key
-                image_bucket.download_file(image_metadata_key, str(metadata_download_absolute_path))
-            # explicitly reraise these errors for verbosity
-            except ClientError as e:
-                raise
-            except StopIteration as e:
-                raise
+    return MetadataCatalog(get_config()[BUCKET_FIELD], imageset_cache, fallback_prefix='meta_')
 
 # NOTE: this function is left here as a template for the eventual "ensure_imageset" function
 # not implemented yet because we may find a better way to get image sets than actually downloading them locally
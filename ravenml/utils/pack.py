@@ -0,0 +1,178 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Packs the files of a directory into a few large blob files with an offset
+index, so many small files can be read through memory maps instead of being
+opened one at a time.
+"""
+
+import os
+import json
+import mmap
+import shutil
+from pathlib import Path
+
+# directory packed blobs and their index are stored in, relative to the packed directory
+PACK_DIR = 'packed'
+PACK_INDEX_NAME = 'pack_index.json'
+# default maximum size of a single blob
+DEFAULT_BLOB_BYTES = 1024 ** 3
+
+
+def pack_directory(directory: Path, max_blob_bytes: int = DEFAULT_BLOB_BYTES, remove_files: bool = False,
+                    exclude: list = None) -> dict:
+    """Packs every file of a directory into blobs under 'PACK_DIR', written back to back.
+    A new blob is started whenever the next file would grow the current one past
+    'max_blob_bytes' (files larger than that get a blob of their own). The offset
+    index is written last, so a directory with an index is always completely packed.
+
+    Args:
+        directory (Path): directory to pack
+        max_blob_bytes (int, optional): Defaults to 1GB. Maximum size of a blob
+        remove_files (bool, optional): Defaults to False. Whether to remove files
+            once they are packed
+        exclude (list, optional): paths relative to directory that are left unpacked,
+            e.g. metadata files that must stay readable on their own
+
+    Returns:
+        dict: pack index, with blob file names under 'blobs' and relative file path
+            keys mapped to [blob index, offset, length] under 'files'
+    """
+    directory = Path(directory)
+    pack_path = directory / PACK_DIR
+    exclude = set(exclude or [])
+    # repacking replaces any previous pack
+    if pack_path.exists():
+        shutil.rmtree(pack_path)
+    os.makedirs(pack_path)
+
+    paths = []
+    for root, dirs, names in os.walk(directory):
+        dirs.sort()
+        if Path(root) == directory and PACK_DIR in dirs:
+            dirs.remove(PACK_DIR)
+        for name in sorted(names):
+            relative_path = (Path(root) / name).relative_to(directory).as_posix()
+            if relative_path not in exclude:
+                paths.append(relative_path)
+
+    index = {'blobs': [], 'files': {}}
+    blob = None
+    blob_size = 0
+    try:
+        for relative_path in paths:
+            size = os.path.getsize(directory / relative_path)
+            if blob is None or (blob_size > 0 and blob_size + size > max_blob_bytes):
+                if blob is not None:
+                    blob.close()
+                index['blobs'].append(f'blob-{len(index["blobs"]):05d}.bin')
+                blob = open(pack_path / index['blobs'][-1], 'wb')
+                blob_size = 0
+            with open(directory / relative_path, 'rb') as f:
+                shutil.copyfileobj(f, blob)
+            index['files'][relative_path] = [len(index['blobs']) - 1, blob_size, size]
+            blob_size += size
+    finally:
+        if blob is not None:
+            blob.close()
+
+    with open(pack_path / PACK_INDEX_NAME, 'w') as f:
+        json.dump(index, f)
+    if remove_files:
+        for relative_path in paths:
+            os.remove(directory / relative_path)
+        _remove_empty_dirs(directory)
+    return index
+
+
+def is_pack_complete(directory: Path) -> bool:
+    """Checks that a directory holds a complete pack, i.e. that its index can be read
+    and every blob has the size the index implies. Blobs are written back to back, so a
+    blob ends with its last file. Catches packs whose blobs were truncated or never
+    arrived, e.g. after an interrupted download that fetched the index first.
+
+    Args:
+        directory (Path): packed directory
+
+    Returns:
+        bool: T if every blob of the pack is complete, F if not or if not packed
+    """
+    pack_path = Path(directory) / PACK_DIR
+    try:
+        with open(pack_path / PACK_INDEX_NAME, 'r') as f:
+            index = json.load(f)
+        sizes = [0] * len(index['blobs'])
+        for blob_index, offset, length in index['files'].values():
+            sizes[blob_index] = max(sizes[blob_index], offset + length)
+        return all(os.path.getsize(pack_path / blob) == size for blob, size in zip(index['blobs'], sizes))
+    except (OSError, ValueError, KeyError, IndexError, TypeError):
+        return False
+
+
+class PackReader(object):
+    """Reads files out of a directory packed by 'pack_directory'. Blobs are memory-mapped
+    the first time a file in them is read, and files are returned as memoryview slices
+    of the mapping, so no data is copied.
+
+    Args:
+        directory (Path): packed directory
+
+    Attributes:
+        directory (Path): packed directory
+        index (dict): pack index, see 'pack_directory'
+
+    Raises:
+        FileNotFoundError: if the directory is not packed
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        with open(self.directory / PACK_DIR / PACK_INDEX_NAME, 'r') as f:
+            self.index = json.load(f)
+        self._blobs = [None] * len(self.index['blobs'])
+
+    def __contains__(self, relative_path: str) -> bool:
+        return relative_path in self.index['files']
+
+    def size(self, relative_path: str) -> int:
+        """Gets the size of a packed file.
+
+        Args:
+            relative_path (str): path of file relative to the packed directory
+
+        Returns:
+            int: size of file in bytes
+        """
+        return self.index['files'][relative_path][2]
+
+    def read(self, relative_path: str) -> memoryview:
+        """Reads a packed file without copying it.
+
+        Args:
+            relative_path (str): path of file relative to the packed directory
+
+        Returns:
+            memoryview: read-only view of the file's contents
+
+        Raises:
+            KeyError: if the file is not packed
+        """
+        blob_index, offset, length = self.index['files'][relative_path]
+        if length == 0:
+            return memoryview(b'')
+        blob = self._blobs[blob_index]
+        if blob is None:
+            with open(self.directory / PACK_DIR / self.index['blobs'][blob_index], 'rb') as f:
+                blob = self._blobs[blob_index] = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return blob[offset:offset + length]
+
+def _remove_empty_dirs(directory: Path):
+    """Removes every empty directory below a directory.
+
+    Args:
+        directory (Path): directory to clean up
+    """
+    for root, dirs, names in os.walk(directory, topdown=False):
+        if Path(root) != directory and not os.listdir(root):
+            os.rmdir(root)
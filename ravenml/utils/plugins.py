@@ -23,7 +23,8 @@ class LazyPluginGroup(click.Group):
 
     def get_command(self, ctx, cmd_name):
         command = self.commands.get(cmd_name)
-        if command is not None and cmd_name not in self._loaded:
+        # commands added directly to the group are not entry points
+        if command is not None and not isinstance(command, click.Command) and cmd_name not in self._loaded:
             self.commands[cmd_name] = command.load()
         return super().get_command(ctx, cmd_name)
 
@@ -0,0 +1,202 @@
+"""
+Author(s):      Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   10/18/2026
+
+Samples how a training run uses the machine (CPU, memory, disk and network)
+in a background thread, so runs can be told apart as CPU or I/O bound.
+"""
+
+import os
+import sys
+import time
+import threading
+from pathlib import Path
+
+# name of the time series written into the artifact directory
+TELEMETRY_NAME = 'telemetry.csv'
+# sampled fields, in time series column order
+FIELDS = ['time_s', 'cpu_percent', 'rss_mb', 'disk_read_mb_s', 'disk_write_mb_s', 'net_rx_mb_s', 'net_tx_mb_s']
+
+
+class ResourceSampler(object):
+    """Samples resource usage at a fixed interval in a background thread. CPU utilisation
+    and network throughput are machine wide. RSS and disk throughput are summed over this
+    process and its descendants (e.g. data loading workers), the disk I/O of a descendant
+    that exits between two samples is not counted for that interval. Counters are read
+    from /proc, so sampling is only supported on Linux, elsewhere nothing is sampled and
+    the summary is marked 'unsupported'.
+
+    Args:
+        interval (float, optional): seconds between samples. Defaults to 5
+
+    Attributes:
+        interval (float): seconds between samples
+        supported (bool): whether resource usage can be sampled on this platform
+        samples (list): one list of FIELDS values per sample
+    """
+
+    def __init__(self, interval: float = 5):
+        self.interval = interval
+        self.supported = sys.platform.startswith('linux') and os.path.isdir('/proc')
+        self.samples = []
+        self._start = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = None
+        if self.supported:
+            self._last = self._read_counters()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def sample(self):
+        """Records a sample of the usage since the previous sample.
+        """
+        if not self.supported:
+            return
+        counters = self._read_counters()
+        elapsed = counters['time'] - self._last['time']
+        if elapsed <= 0:
+            return
+
+        def rate(name, scale=1024 ** 2):
+            if counters[name] is None or self._last[name] is None:
+                return None
+            return (counters[name] - self._last[name]) / scale / elapsed
+
+        def tree_rate(name, scale=1024 ** 2):
+            deltas = []
+            for pid, values in counters['processes'].items():
+                # processes started since the previous sample count from zero
+                previous = self._last['processes'][pid][name] if pid in self._last['processes'] else 0
+                if values[name] is not None and previous is not None:
+                    deltas.append(values[name] - previous)
+            return sum(deltas) / scale / elapsed if deltas else None
+
+        cpu_percent = None
+        if counters['cpu'] is not None and self._last['cpu'] is not None:
+            busy = counters['cpu'][0] - self._last['cpu'][0]
+            total = counters['cpu'][1] - self._last['cpu'][1]
+            cpu_percent = 100 * busy / total if total > 0 else 0.0
+        rss = [values['rss'] for values in counters['processes'].values() if values['rss'] is not None]
+        self.samples.append([counters['time'] - self._start, cpu_percent, sum(rss) if rss else None,
+                             tree_rate('disk_read'), tree_rate('disk_write'), rate('net_rx'), rate('net_tx')])
+        self._last = counters
+
+    def stop(self, artifact_path: Path = None) -> dict:
+        """Stops sampling, optionally writing the time series to TELEMETRY_NAME.
+
+        Args:
+            artifact_path (Path, optional): directory to write the time series to,
+                nothing is written if sampling is unsupported
+
+        Returns:
+            dict: summary of the run, with the mean and max of each sampled field, or
+                'unsupported' and the platform if sampling is unsupported
+        """
+        if not self.supported:
+            return {'unsupported': True, 'platform': sys.platform}
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        if artifact_path is not None:
+            with open(Path(artifact_path) / TELEMETRY_NAME, 'w') as f:
+                f.write(','.join(FIELDS) + '\n')
+                for row in self.samples:
+                    f.write(','.join('' if value is None else f'{value:.3f}' for value in row) + '\n')
+        summary = {
+            'interval_s': self.interval,
+            'num_samples': len(self.samples),
+            'duration_s': round(time.perf_counter() - self._start, 3)
+        }
+        for i, field in enumerate(FIELDS[1:], start=1):
+            values = [row[i] for row in self.samples if row[i] is not None]
+            summary[field] = {'mean': round(sum(values) / len(values), 3), 'max': round(max(values), 3)} \
+                                if values else None
+        return summary
+
+    def _run(self):
+        """Samples until the sampler is stopped.
+        """
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def _read_counters(self) -> dict:
+        """Reads the current value of every counter.
+
+        Returns:
+            dict: counters, with the counters of each process of the tree under
+                'processes'. None for counters that could not be read
+        """
+        counters = {'time': time.perf_counter(), 'cpu': None, 'net_rx': None, 'net_tx': None,
+                    'processes': {pid: _read_process_counters(pid) for pid in _process_tree(os.getpid())}}
+        try:
+            with open('/proc/stat', 'r') as f:
+                # user nice system idle iowait irq softirq steal, idle and iowait are not busy
+                ticks = [int(value) for value in f.readline().split()[1:9]]
+            counters['cpu'] = (sum(ticks) - ticks[3] - ticks[4], sum(ticks))
+        except (OSError, ValueError, IndexError):
+            pass
+        try:
+            rx = tx = 0
+            with open('/proc/net/dev', 'r') as f:
+                # the first two lines are headers
+                for line in f.readlines()[2:]:
+                    interface, values = line.split(':', 1)
+                    if interface.strip() != 'lo':
+                        values = values.split()
+                        rx += int(values[0])
+                        tx += int(values[8])
+            counters['net_rx'], counters['net_tx'] = rx, tx
+        except (OSError, ValueError, IndexError):
+            pass
+        return counters
+
+def _process_tree(pid: int) -> list:
+    """Finds a process and all of its living descendants.
+
+    Args:
+        pid (int): id of the root process
+
+    Returns:
+        list: ids of the process and its descendants
+    """
+    children = {}
+    for entry in os.scandir('/proc'):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry.name}/stat', 'r') as f:
+                # the parent id follows the command name, which may contain spaces
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(parent, []).append(int(entry.name))
+    tree = [pid]
+    for parent in tree:
+        tree.extend(children.get(parent, []))
+    return tree
+
+def _read_process_counters(pid: int) -> dict:
+    """Reads the memory and disk counters of a single process.
+
+    Args:
+        pid (int): id of the process
+
+    Returns:
+        dict: RSS (MB) and bytes read from and written to disk, None if unreadable
+    """
+    counters = {'rss': None, 'disk_read': None, 'disk_write': None}
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    counters['rss'] = int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        with open(f'/proc/{pid}/io', 'r') as f:
+            io = dict(line.split(':') for line in f if ':' in line)
+        counters['disk_read'] = int(io['read_bytes'])
+        counters['disk_write'] = int(io['write_bytes'])
+    except (OSError, ValueError, KeyError):
+        pass
+    return counters
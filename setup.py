@@ -49,6 +49,7 @@ setup(
         'halo>=0.0.26',
         'colorama>=0.3.9',
         'pyaml>=19.4.1',
+        'numpy>=1.17',
     ],
     tests_require=[
         'pytest',